@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+    bilingual
+    ~~~~~~~~~
+
+    Build the English and the Chinese manual concurrently::
+
+        python bilingual.py                  # html into build/ and build_zh/
+        python bilingual.py -b latex -j 8
+        make bilingual
+
+    Sphinx applies the translations while it reads a document (the ``Locale``
+    transform runs before the doctree is pickled), so the two languages
+    cannot share one set of doctrees. What they can share is done once here
+    and the rest runs side by side:
+
+    * the ``.po`` catalogs of ``source/locale`` are compiled up front, only
+      those newer than their ``.mo``, and the builds get
+      ``gettext_auto_build = 0`` so neither recompiles them (nor races the
+      other writing the same ``.mo``);
+    * both ``sphinx-build`` processes start together, each with its own
+      doctree directory so every later run is incremental, and the cores are
+      split between them;
+    * their output is interleaved line by line with a ``[en]``/``[zh_CN]``
+      prefix.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing import Pool
+
+__all__ = ['compile_catalogs', 'build_command', 'build']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCEDIR = os.path.join(HERE, 'source')
+LOCALEDIR = os.path.join(SOURCEDIR, 'locale')
+
+
+def _compile(po):
+    from babel.messages.mofile import write_mo
+    from babel.messages.pofile import read_po
+    mo = po[:-3] + '.mo'
+    with open(po, 'rb') as f:
+        catalog = read_po(f)
+    tmp = mo + '.tmp'
+    with open(tmp, 'wb') as f:
+        write_mo(f, catalog)
+    os.replace(tmp, mo)
+    return mo
+
+
+def compile_catalogs(localedir=LOCALEDIR, language=None, jobs=None):
+    """Compile the ``.po`` files newer than their ``.mo``, return the
+    compiled ones."""
+    stale = []
+    for root, dirs, files in os.walk(localedir):
+        if language and os.path.relpath(root, localedir).split(
+                os.sep)[0] != language:
+            continue
+        for name in files:
+            if not name.endswith('.po'):
+                continue
+            po = os.path.join(root, name)
+            mo = po[:-3] + '.mo'
+            if (not os.path.exists(mo)
+                    or os.path.getmtime(mo) < os.path.getmtime(po)):
+                stale.append(po)
+    if not stale:
+        return []
+    pool = Pool(min(jobs or os.cpu_count() or 1, len(stale)))
+    try:
+        return pool.map(_compile, sorted(stale))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def build_command(builder, outdir, language=None, jobs=1, sphinxbuild=None,
+                  options=()):
+    """``sphinx-build`` command of one language with its own doctrees."""
+    command = (sphinxbuild or ['sphinx-build']) + [
+        '-b', builder,
+        '-d', os.path.join(outdir, 'doctrees'),
+        '-j', str(jobs),
+        '-D', 'gettext_auto_build=0',
+    ]
+    if language:
+        command += ['-D', 'language=%s' % language]
+    return command + list(options) + [SOURCEDIR,
+                                      os.path.join(outdir, builder)]
+
+
+def _relay(name, stream, lock):
+    for line in iter(stream.readline, b''):
+        with lock:
+            sys.stdout.write('[%s] %s'
+                             % (name, line.decode('utf-8', 'replace')))
+            sys.stdout.flush()
+    stream.close()
+
+
+def build(commands):
+    """Run ``{name: command}`` concurrently, return ``{name: returncode}``."""
+    lock = threading.Lock()
+    running = []
+    for name, command in commands.items():
+        process = subprocess.Popen(command, cwd=HERE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        relay = threading.Thread(target=_relay,
+                                 args=(name, process.stdout, lock))
+        relay.start()
+        running.append((name, process, relay))
+    codes = {}
+    try:
+        for name, process, relay in running:
+            codes[name] = process.wait()
+            relay.join()
+    except KeyboardInterrupt:
+        for name, process, relay in running:
+            process.terminate()
+        raise
+    return codes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[4])
+    parser.add_argument('-b', dest='builder', default='html',
+                        help='sphinx builder (default: html)')
+    parser.add_argument('-j', dest='jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='cores shared by the two builds')
+    parser.add_argument('--builddir', default=os.path.join(HERE, 'build'))
+    parser.add_argument('--builddir-zh',
+                        default=os.path.join(HERE, 'build_zh'))
+    parser.add_argument('--language', default='zh_CN',
+                        help='language of the translated build')
+    parser.add_argument('--sphinxbuild', default='sphinx-build',
+                        help='sphinx-build command (default: sphinx-build)')
+    parser.add_argument('options', nargs='*',
+                        help='extra sphinx-build options, after "--"')
+    opts = parser.parse_args(argv)
+
+    compiled = compile_catalogs(language=opts.language, jobs=opts.jobs)
+    if compiled:
+        print('compiled %d catalog(s)' % len(compiled))
+    half = max(1, opts.jobs // 2)
+    sphinxbuild = opts.sphinxbuild.split()
+    commands = {
+        'en': build_command(opts.builder, opts.builddir, None, half,
+                            sphinxbuild, opts.options),
+        opts.language: build_command(opts.builder, opts.builddir_zh,
+                                     opts.language, max(1, opts.jobs - half),
+                                     sphinxbuild, opts.options),
+    }
+    codes = build(commands)
+    for name, code in codes.items():
+        if code:
+            print('%s build failed (exit status %d)' % (name, code))
+    return 1 if any(codes.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+    checkrefs
+    ~~~~~~~~~
+
+    Check the references of the whole tutorial tree without building it::
+
+        python checkrefs.py              # exit status 1 on broken references
+        python checkrefs.py -j 8 -q      # errors only, for a pre-commit hook
+
+    The files of the repository are indexed once (a set of paths, plus the
+    extensions of every stem for ``figure:: name.*``), then every ``.rst`` of
+    ``sphinx/source`` and every ``README.md`` is scanned in a pool of workers
+    for
+
+    * ``image``/``figure`` (also as substitutions, ``.. |name| image::``),
+      ``include``/``literalinclude`` and ``:download:`` paths, relative to
+      the document or, with a leading ``/``, to ``sphinx/source``;
+    * ``:ref:``/``:numref:`` labels, defined by ``.. _label:`` or a ``:name:``
+      option anywhere in the documentation, and ``:doc:`` documents;
+    * images of the READMEs, ``![alt](path)`` and ``<img src="path">``.
+
+    Remote URLs are not checked, nothing goes to the network. Duplicate labels
+    are reported as warnings.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import os
+import posixpath
+import re
+import sys
+from collections import defaultdict
+from multiprocessing import Pool
+from urllib.parse import unquote
+
+__all__ = ['FileIndex', 'scan', 'check']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SOURCEDIR = 'sphinx/source'
+EXCLUDE = ('.git', 'build', 'build_zh', '__pycache__', '.npycache',
+           'regenerate', 'node_modules')
+# labels sphinx defines itself
+STD_LABELS = ('genindex', 'modindex', 'search')
+
+_DIRECTIVE = re.compile(
+    r'^\s*\.\.\s+(?:\|[^|]+\|\s+)?(image|figure|include|literalinclude)::'
+    r'\s*(\S.*?)\s*$')
+_LABEL = re.compile(r'^\s*\.\.\s+_(`[^`]+`|.+?):(?:\s+(\S.*?))?\s*$')
+_NAME = re.compile(r'^\s+:name:\s*(\S.*?)\s*$')
+_ROLE = re.compile(r':(ref|numref|doc|download):`([^`]+)`')
+_MD_IMAGE = re.compile(r'!\[[^\]]*\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)')
+_HTML_IMAGE = re.compile(r'<img\b[^>]*\bsrc\s*=\s*["\']([^"\']+)["\']', re.I)
+
+
+def _normalize_label(label):
+    return ' '.join(label.strip('`').split()).lower()
+
+
+def _remote(target):
+    return '://' in target or target.startswith(('mailto:', 'data:', '#'))
+
+
+class FileIndex(object):
+    """All the files of the repository, indexed once."""
+
+    def __init__(self, root=ROOT):
+        self.root = root
+        self.files = set()
+        self.stems = defaultdict(set)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if name not in EXCLUDE]
+            rel = os.path.relpath(dirpath, root).replace(os.sep, '/')
+            for name in filenames:
+                path = name if rel == '.' else rel + '/' + name
+                self.files.add(path)
+                stem, ext = posixpath.splitext(path)
+                self.stems[stem].add(ext)
+
+    def exists(self, path):
+        if path.endswith('.*'):
+            return bool(self.stems.get(path[:-2]))
+        return path in self.files
+
+
+def scan(path):
+    """References and labels of one file, in a worker of the pool.
+
+    Returns ``(path, refs, labels)``: ``refs`` as ``(line, kind, target)``
+    and ``labels`` as ``(line, label)``.
+    """
+    refs = []
+    labels = []
+    with open(os.path.join(ROOT, path), encoding='utf-8-sig',
+              errors='replace') as f:
+        lines = f.read().splitlines()
+    if path.endswith('.md'):
+        for number, line in enumerate(lines, 1):
+            for pattern in (_MD_IMAGE, _HTML_IMAGE):
+                for target in pattern.findall(line):
+                    refs.append((number, 'image', target))
+        return path, refs, labels
+    for number, line in enumerate(lines, 1):
+        match = _DIRECTIVE.match(line)
+        if match:
+            refs.append((number, match.group(1), match.group(2)))
+        match = _LABEL.match(line)
+        # ".. _name: https://..." is a hyperlink target, not a label
+        if match and not match.group(2):
+            labels.append((number, _normalize_label(match.group(1))))
+        match = _NAME.match(line)
+        if match:
+            labels.append((number, _normalize_label(match.group(1))))
+        for role, text in _ROLE.findall(line):
+            # "title <target>" or "target"
+            target = re.search(r'<([^<>]+)>\s*$', text)
+            refs.append((number, role,
+                         target.group(1) if target else text.strip()))
+    return path, refs, labels
+
+
+def _resolve(document, target, markdown=False):
+    """Repository path of a file referenced from ``document``."""
+    target = target.split('#')[0].split('?')[0]
+    if markdown:
+        target = unquote(target)
+    if target.startswith('/'):
+        return posixpath.normpath(SOURCEDIR + target)
+    return posixpath.normpath(
+        posixpath.join(posixpath.dirname(document), target))
+
+
+def check(index, results):
+    """Broken references as ``(path, line, message)``, duplicate labels as
+    warnings."""
+    errors = []
+    warnings = []
+    defined = {}
+    for path, refs, labels in results:
+        for number, label in labels:
+            if label in defined:
+                warnings.append((path, number, 'duplicate label %r, also at '
+                                 '%s:%d' % ((label,) + defined[label])))
+            else:
+                defined[label] = (path, number)
+    for path, refs, labels in results:
+        markdown = path.endswith('.md')
+        for number, kind, target in refs:
+            if _remote(target):
+                continue
+            if kind in ('ref', 'numref'):
+                label = _normalize_label(target)
+                if label not in defined and label not in STD_LABELS:
+                    errors.append((path, number,
+                                   'undefined label %r' % target))
+                continue
+            if kind == 'doc':
+                document = _resolve(path, target) + '.rst'
+                if not index.exists(document):
+                    errors.append((path, number,
+                                   'unknown document %r' % target))
+                continue
+            if not index.exists(_resolve(path, target, markdown)):
+                errors.append((path, number,
+                               '%s not found: %s' % (kind, target)))
+    return sorted(errors), sorted(warnings)
+
+
+def documents(index):
+    """The files to scan: the sources of the manual and the READMEs."""
+    return sorted(path for path in index.files
+                  if (path.startswith(SOURCEDIR + '/')
+                      and path.endswith(('.rst', '.rst_'))
+                      and '/_themes/' not in path)
+                  or posixpath.basename(path) == 'README.md')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[4])
+    parser.add_argument('-j', dest='jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='worker processes')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='errors only, no warnings and summary')
+    opts = parser.parse_args(argv)
+
+    index = FileIndex()
+    paths = documents(index)
+    pool = Pool(opts.jobs)
+    try:
+        results = pool.map(scan, paths, chunksize=16)
+    finally:
+        pool.close()
+        pool.join()
+    errors, warnings = check(index, results)
+    if not opts.quiet:
+        for path, number, message in warnings:
+            print('%s:%d: warning: %s' % (path, number, message))
+    for path, number, message in errors:
+        print('%s:%d: error: %s' % (path, number, message))
+    if not opts.quiet:
+        print('%d files, %d references, %d errors, %d warnings'
+              % (len(paths), sum(len(refs) for path, refs, labels in results),
+                 len(errors), len(warnings)))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
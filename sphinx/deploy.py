@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+    deploy
+    ~~~~~~
+
+    Prepare the HTML build for the static host::
+
+        python deploy.py                 # build/html -> build/deploy
+        python deploy.py -j 8 build_zh/html build_zh/deploy
+        make deploy
+
+    * the assets of ``_static`` and ``_images`` (style sheets, scripts, fonts,
+      images) get a copy named after their content,
+      ``style.css`` -> ``style.3f9c2a1b7e.css``, which can be cached forever.
+      The original name stays for the scripts that build URLs at run time
+      (the search shards, the vtk.js scenes);
+    * ``src``/``href``/``srcset``/``poster`` of the pages and ``url()`` of the
+      style sheets are rewritten to the hashed names, the pages in a streaming
+      pass, line by line;
+    * every text file gets ``.gz`` and, with the ``brotli`` module, ``.br``
+      siblings, compressed in a pool of workers.
+
+    The content hash of every output is kept in ``<deploy>/.deploy.json``:
+    outputs whose hash is unchanged since the last run are neither rewritten
+    nor compressed again, and files gone from the build are removed.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+from multiprocessing import Pool
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+__all__ = ['hash_assets', 'rewrite_html', 'rewrite_css', 'deploy']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = '.deploy.json'
+ASSET_DIRS = ('_static/', '_images/')
+HASHED = ('.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico',
+          '.woff', '.woff2', '.ttf', '.eot', '.otf')
+COMPRESSED = ('.html', '.css', '.js', '.svg', '.json', '.xml', '.txt',
+              '.ttf', '.eot', '.otf', '.ico', '.map')
+SKIP = ('.buildinfo', 'objects.inv.tmp')
+HASH_LENGTH = 10
+
+_HTML_URL = re.compile(
+    r'''(\b(?:src|href|srcset|poster)\s*=\s*)(["'])(.*?)\2''', re.I)
+_CSS_URL = re.compile(r'''(url\(\s*)(["']?)([^"')]+)\2(\s*\))''')
+
+# rel path of an asset -> rel path of its hashed copy, per worker
+_assets = {}
+
+
+def _digest(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def hashed_name(rel, digest):
+    root, ext = posixpath.splitext(rel)
+    return '%s.%s%s' % (root, digest[:HASH_LENGTH], ext)
+
+
+def rewrite_url(url, base, assets):
+    """``url`` seen from directory ``base`` pointing at the hashed copy."""
+    if (not url or url.startswith(('#', '/', 'data:')) or '//' in url
+            or ':' in url.split('/')[0]):
+        return url
+    path, suffix = re.match(r'([^?#]*)(.*)', url, re.S).groups()
+    target = assets.get(posixpath.normpath(posixpath.join(base, path)))
+    if target is None:
+        return url
+    name = posixpath.basename(path)
+    return path[:len(path) - len(name)] + posixpath.basename(target) + suffix
+
+
+def _rewrite_srcset(value, base, assets):
+    candidates = []
+    for candidate in value.split(','):
+        parts = candidate.strip().split(None, 1)
+        if parts:
+            parts[0] = rewrite_url(parts[0], base, assets)
+            candidates.append(' '.join(parts))
+    return ', '.join(candidates)
+
+
+def rewrite_html_line(line, base, assets):
+    def replace(match):
+        value = match.group(3)
+        if match.group(1).lower().startswith('srcset'):
+            value = _rewrite_srcset(value, base, assets)
+        else:
+            value = rewrite_url(value, base, assets)
+        return match.group(1) + match.group(2) + value + match.group(2)
+    return _HTML_URL.sub(replace, line)
+
+
+def rewrite_css(text, base, assets):
+    return _CSS_URL.sub(lambda m: m.group(1) + m.group(2)
+                        + rewrite_url(m.group(3), base, assets)
+                        + m.group(2) + m.group(4), text)
+
+
+def rewrite_html(src, dst, base, assets):
+    """Stream ``src`` to ``dst`` with the asset URLs rewritten, return the
+    digest of the output."""
+    md5 = hashlib.md5()
+    with open(src, 'r', encoding='utf-8', errors='surrogateescape',
+              newline='') as fin, \
+            open(dst, 'w', encoding='utf-8', errors='surrogateescape',
+                 newline='') as fout:
+        for line in fin:
+            line = rewrite_html_line(line, base, assets)
+            md5.update(line.encode('utf-8', 'surrogateescape'))
+            fout.write(line)
+    return md5.hexdigest()
+
+
+def hash_assets(htmldir, files, jobs=None):
+    """``{rel: hashed rel}`` of the assets, style sheets hashed after their
+    ``url()`` references are rewritten."""
+    leaves = [rel for rel in files if rel.startswith(ASSET_DIRS)
+              and rel.endswith(HASHED) and not rel.endswith('.css')]
+    pool = Pool(jobs)
+    try:
+        digests = pool.map(_file_digest,
+                           [os.path.join(htmldir, rel) for rel in leaves])
+    finally:
+        pool.close()
+        pool.join()
+    assets = dict((rel, hashed_name(rel, digest))
+                  for rel, digest in zip(leaves, digests))
+    styles = {}
+    for rel in files:
+        if rel.startswith(ASSET_DIRS) and rel.endswith('.css'):
+            text = _read(os.path.join(htmldir, rel)).decode(
+                'utf-8', 'surrogateescape')
+            data = rewrite_css(text, posixpath.dirname(rel), assets).encode(
+                'utf-8', 'surrogateescape')
+            styles[rel] = data
+            assets[rel] = hashed_name(rel, _digest(data))
+    return assets, styles
+
+
+def _file_digest(path):
+    return _digest(_read(path))
+
+
+def _init_worker(assets):
+    _assets.update(assets)
+
+
+def _compress(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path + '.gz', 'wb') as f:
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9,
+                           mtime=0, filename='') as gz:
+            gz.write(data)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data))
+
+
+def _outputs(path):
+    outputs = [path]
+    if path.endswith(COMPRESSED):
+        outputs.append(path + '.gz')
+        if brotli is not None:
+            outputs.append(path + '.br')
+    return outputs
+
+
+def process(item):
+    """Write one output and its compressed siblings unless its digest is
+    ``known``, in a worker of the pool."""
+    kind, src, dst, rel, data, known = item
+    if not os.path.isdir(os.path.dirname(dst)):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if kind == 'html':
+        tmp = dst + '.tmp'
+        digest = rewrite_html(src, tmp, posixpath.dirname(rel), _assets)
+        if digest == known and all(map(os.path.exists, _outputs(dst))):
+            os.remove(tmp)
+            return rel, digest, False
+        os.replace(tmp, dst)
+    else:
+        if data is None:
+            data = _read(src)
+        digest = _digest(data)
+        if digest == known and all(map(os.path.exists, _outputs(dst))):
+            return rel, digest, False
+        tmp = dst + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, dst)
+    if dst.endswith(COMPRESSED):
+        _compress(dst)
+    return rel, digest, True
+
+
+def _walk(root):
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in filenames:
+            if name not in SKIP:
+                rel = os.path.relpath(os.path.join(dirpath, name), root)
+                files.append(rel.replace(os.sep, '/'))
+    return sorted(files)
+
+
+def deploy(htmldir, outdir, jobs=None):
+    """Mirror ``htmldir`` into ``outdir`` with hashed, compressed assets,
+    return ``(outputs, written)``."""
+    manifest_file = os.path.join(outdir, MANIFEST)
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        manifest = {}
+    files = _walk(htmldir)
+    assets, styles = hash_assets(htmldir, files, jobs)
+    items = []
+    for rel in files:
+        src = os.path.join(htmldir, rel)
+        kind = 'html' if rel.endswith('.html') else 'file'
+        targets = [rel]
+        if rel in assets:
+            targets.append(assets[rel])
+        for target in targets:
+            items.append((kind, src, os.path.join(outdir, target), target,
+                          styles.get(rel), manifest.get(target)))
+    written = 0
+    current = {}
+    pool = Pool(jobs, initializer=_init_worker, initargs=(assets,))
+    try:
+        for rel, digest, changed in pool.imap_unordered(process, items,
+                                                        chunksize=8):
+            current[rel] = digest
+            written += changed
+    finally:
+        pool.close()
+        pool.join()
+    for rel in set(manifest) - set(current):
+        for path in _outputs(os.path.join(outdir, rel)):
+            if os.path.exists(path):
+                os.remove(path)
+    tmp = manifest_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(current, f, indent=0, sort_keys=True)
+    os.replace(tmp, manifest_file)
+    return len(current), written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[4])
+    parser.add_argument('htmldir', nargs='?',
+                        default=os.path.join(HERE, 'build', 'html'))
+    parser.add_argument('outdir', nargs='?',
+                        default=os.path.join(HERE, 'build', 'deploy'))
+    parser.add_argument('-j', dest='jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='worker processes')
+    opts = parser.parse_args(argv)
+
+    if not os.path.isdir(opts.htmldir):
+        print('%s: no such directory, build the html first' % opts.htmldir)
+        return 1
+    if brotli is None:
+        print('brotli is not installed, writing .gz only')
+    outputs, written = deploy(opts.htmldir, opts.outdir, opts.jobs)
+    print('%s: %d files, %d written' % (opts.outdir, outputs, written))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,125 +5,165 @@ import matplotlib.pyplot as plt
 from matplotlib.ticker import MultipleLocator
 import numpy as np
 import os
-from console_progressbar import ProgressBar
-from colored import fg, bg, attr
-C_GREEN=fg('green')
-C_RED=fg('red')
-C_BLUE=fg('blue')
-C_DEFAULT=attr('reset')
 
 
 import sciPyFoam.postProcessing.cuttingPlane as pc
+import vtkpolydata as vtp
+import surfacelod
+import glyphs
+import timeinterp
+import telemetry
 import sciPyFoam.figure as scifig
 
 # config font
-mpl.rcParams['font.family'] = 'Arial'
-mpl.rcParams['mathtext.fontset'] = 'cm'
-scifig.usePaperStyle(mpl,fontsize=12)
-cmap='Spectral_r'
-levels=60
-# data path
-model='singlepass_twolimb'
-caseDir='../../../../cookbooks/'+model
-postProcessDataPath=caseDir+'/postProcessing/surfaces/'
+def paper_style():
+    mpl.rcParams['font.family'] = 'Arial'
+    mpl.rcParams['mathtext.fontset'] = 'cm'
+    scifig.usePaperStyle(mpl,fontsize=12)
 
-times=os.listdir(postProcessDataPath)
-timeDirs=[]
-for t in times:
-    if(os.path.isdir(postProcessDataPath+t)):
-        timeDirs.append(t)
-    else:
-        print(t,'is not a directory')
-times=np.array(timeDirs,dtype=int)
-times=np.sort(times)
+# figure of the movie: axes, ticks, labels and colorbar, the field itself is
+# drawn per frame (also used by batchanimation.py)
+def field_figure(triangles,T,figwidth=24,major_tick=0.5,minor_tick=0.1,xlabel='x (km)',ylabel='Depth (km)',cbar_tick=100,clabel='Temperature ($^{\circ}$C)'):
+    ax_field, ax_cb, CSf, cb,vmin,vmax=pc.plotField(None,triangles, T,figwidth=figwidth)
+    fig=plt.gcf()
+    ax_field.xaxis.set_major_locator(MultipleLocator(major_tick))
+    ax_field.xaxis.set_minor_locator(MultipleLocator(minor_tick))
+    ax_field.yaxis.set_major_locator(MultipleLocator(major_tick))
+    ax_field.yaxis.set_minor_locator(MultipleLocator(minor_tick))
+    ax_field.set_xlabel(xlabel)
+    ax_field.set_ylabel(ylabel)
+    cb.set_ticks(MultipleLocator(cbar_tick))
+    cb.set_label(clabel)
+    plt.tight_layout(pad=0)
+    # init plot
+    for coll in CSf.collections:
+        coll.remove()
+    return fig,ax_field,vmin,vmax
 
-datapath=postProcessDataPath+str(times[-1])
-filename=datapath+'/'
-name_fmt=lambda  name : name + '_zNormal.vtk'
-# read data
-triangles,T=pc.Read_VTK_POLYDATA(datapath,'T',name_fmt=name_fmt,coord2km=True,depthPositive=True)
-triangles,U=pc.Read_VTK_POLYDATA(datapath,'U',name_fmt=name_fmt,coord2km=True,depthPositive=True)
-U_norm = np.sqrt(U[:,0]**2 + U[:,1]**2)
-# plot
-ax_field, ax_cb, CSf, cb,vmin,vmax=pc.plotField(None,triangles, T,figwidth=24)
-fig=plt.gcf()
-ax_field.xaxis.set_major_locator(MultipleLocator(0.5))
-ax_field.xaxis.set_minor_locator(MultipleLocator(0.1))
-ax_field.yaxis.set_major_locator(MultipleLocator(0.5))
-ax_field.yaxis.set_minor_locator(MultipleLocator(0.1))
-ax_field.set_xlabel('x (km)')
-ax_field.set_ylabel('Depth (km)')
-cb.set_ticks(MultipleLocator(100))
-cb.set_label('Temperature ($^{\circ}$C)')
-plt.tight_layout(pad=0)
-# init plot
-for coll in CSf.collections: 
-        ax_field.collections.remove(coll) 
-datapath=postProcessDataPath+str(times[-1])
-filename=datapath+'/'
-triangles,T=pc.Read_VTK_POLYDATA(datapath,'T',name_fmt=name_fmt,coord2km=True,depthPositive=True)
-# p=[ax_field.tricontourf(triangles,T,levels=levels,cmap=cmap,vmin=vmin,vmax=vmax)]
-p=[ax_field.tripcolor(triangles,T,shading='gouraud',cmap=cmap,vmin=vmin,vmax=vmax)]
-# quiver=[ax_field.quiver(triangles.x,triangles.y, U[:,0]/U_norm, U[:,1]/U_norm, units='xy', scale=20, headwidth=0.1, headlength=0.1)]
-x_text=0.02
-y_text=0.98
-color_text='w'
-if('singlepass' == model):
-    x_text=0.45
-    color_text='k'
-elif('singlepass2' == model):
-    x_text=0.25
-    color_text='k'
-elif('singlepass_twolimb' == model):
-    x_text=0.25
-    color_text='k'
-text=[ax_field.text(x_text,y_text,str('%.1f years' % (times[-1]/86400/365)),color=color_text,fontsize=14,fontweight='bold',ha='left',va='top',transform=ax_field.transAxes)]
-# progressbar
-pb = ProgressBar(total=len(times),prefix=C_BLUE+'Progress: '+C_DEFAULT, suffix=' Completed'+C_DEFAULT, decimals=3, length=50, fill=C_GREEN+'#', zfill=C_DEFAULT+'-')
+if __name__ == '__main__':
+    paper_style()
+    cmap='Spectral_r'
+    levels=60
+    dpi_out=400
+    show_glyphs=True # velocity arrows, one per 30 output pixels
+    resample_frames=0 # >0: number of frames at uniform times, interpolated between the written times
+    # data path
+    model='singlepass_twolimb'
+    caseDir='../../../../cookbooks/'+model
+    postProcessDataPath=caseDir+'/postProcessing/surfaces/'
 
-def update(i):
-    time=times[i]
-    p[0].remove()
-    text[0].remove()
-    datapath=postProcessDataPath+str(time)
-    filename=datapath+'/'
-    triangles,T=pc.Read_VTK_POLYDATA(datapath,'T',name_fmt=name_fmt,coord2km=True,depthPositive=True)
-    # p[0]=ax_field.tricontourf(triangles,T,levels=levels,cmap=cmap,vmin=vmin,vmax=vmax)
-    p[0]=ax_field.tripcolor(triangles,T,shading='gouraud',cmap=cmap,vmin=vmin,vmax=vmax)
-    text[0]=ax_field.text(x_text,y_text,str('%.1f years' % (time/86400/365)),color=color_text,fontsize=14,fontweight='bold',ha='left',va='top',transform=ax_field.transAxes)
-    if(time==times[-1]):
-        plt.savefig('T_'+model+'.pdf')
-    pb.print_progress_bar(i+1)
+    times=os.listdir(postProcessDataPath)
+    timeDirs=[]
+    for t in times:
+        if(os.path.isdir(postProcessDataPath+t)):
+            timeDirs.append(t)
+        else:
+            print(t,'is not a directory')
+    times=np.array(timeDirs,dtype=int)
+    times=np.sort(times)
 
-# 根据不同的movie格式设置相应的writter
-def animationWriter(fmt='mp4'):
-    if(fmt_movie=='mp4'):
-        Writer = animation.writers['ffmpeg']
-        writer = Writer(fps=15, metadata=dict(artist='Zhikui Guo, et al., 2020, GMD',title='Cookbook of HydrothermalFoam tools',copyright='Zhikui Guo, 2018',comment='HydrothermalFoam open source tools for hydrothermal modeling'), bitrate=1800)
-    elif(fmt_movie=='avi'):
-        Writer = animation.writers['avconv']
-        writer = Writer(fps=15, metadata=dict(artist='Zhikui Guo, et al., 2020, GMD',title='Cookbook of HydrothermalFoam tools',copyright='Zhikui Guo, 2018',comment='HydrothermalFoam open source tools for hydrothermal modeling'), bitrate=1800)
-    elif(fmt_movie=='gif'):
-        writer='imagemagick'
+    datapath=postProcessDataPath+str(times[-1])
+    filename=datapath+'/'
+    name_fmt=lambda  name : name + '_zNormal.vtk'
+    # read data
+    triangles,fields=vtp.Read_VTK_POLYDATA(datapath,['T','U'],name_fmt=name_fmt,coord2km=True,depthPositive=True)
+    T,U=fields['T'],fields['U']
+    # plot
+    fig,ax_field,vmin,vmax=field_figure(triangles,T)
+    datapath=postProcessDataPath+str(times[-1])
+    filename=datapath+'/'
+    triangles,fields=vtp.Read_VTK_POLYDATA(datapath,['T','U'],name_fmt=name_fmt,coord2km=True,depthPositive=True)
+    T,U=fields['T'],fields['U']
+    # p=[ax_field.tricontourf(triangles,T,levels=levels,cmap=cmap,vmin=vmin,vmax=vmax)]
+    # level of detail matching the output resolution, the same for all frames
+    lod=surfacelod.select(triangles,ax_field,dpi=dpi_out)
+    p=[ax_field.tripcolor(lod.triangulation,lod.remap(T),shading='gouraud',cmap=cmap,vmin=vmin,vmax=vmax)]
+    # glyph positions are binned once, every frame only updates the arrows
+    arrows=glyphs.GlyphLayer(ax_field,triangles,spacing=30,dpi=dpi_out,depthPositive=True,scale=20) if show_glyphs else None
+    if(arrows is not None):
+        arrows.update(U)
+    x_text=0.02
+    y_text=0.98
+    color_text='w'
+    if('singlepass' == model):
+        x_text=0.45
+        color_text='k'
+    elif('singlepass2' == model):
+        x_text=0.25
+        color_text='k'
+    elif('singlepass_twolimb' == model):
+        x_text=0.25
+        color_text='k'
+    text=[ax_field.text(x_text,y_text,str('%.1f years' % (times[-1]/86400/365)),color=color_text,fontsize=14,fontweight='bold',ha='left',va='top',transform=ax_field.transAxes)]
+    # frames: one per written time, or uniformly spaced times interpolated
+    # from the two neighbouring writes (only those two are kept in memory)
+    def read_fields(k):
+        triangles,fields=vtp.Read_VTK_POLYDATA(postProcessDataPath+str(times[k]),['T','U'],name_fmt=name_fmt,coord2km=True,depthPositive=True)
+        return fields
+    if(resample_frames>0):
+        frame_times=timeinterp.uniform_times(times,resample_frames)
+        frames=timeinterp.Interpolator(times,read_fields)
     else:
-        print('暂不支持此movie格式(mp4,gif): ',fmt_movie)
-        exit(0)
-    return writer
-# animation
-# 动画参数
-interval = 1 #in seconds  
-dpi_out=400
-issave=True
-repeat=False
-fmt_movie='mp4'
-fname_movie='results_'+model
-writer=animationWriter(fmt_movie)
-ani = FuncAnimation(fig, update, len(times),blit=False, interval=interval*1e3,repeat=repeat)
+        frame_times=times
+    # per-frame timing of every render stage, printed live and logged at the end
+    log=telemetry.FrameTelemetry(len(frame_times),'animation_'+model+'.telemetry.json')
 
-# 保存为gif或者显示
-if(issave==True):
-    ani.save(fname_movie+'.'+fmt_movie, dpi=dpi_out, writer=writer)
-else:
-    plt.savefig('T_'+model+'.pdf')
-    # plt.show()
+    def update(i):
+        log.begin(i)
+        time=frame_times[i]
+        p[0].remove()
+        text[0].remove()
+        with log.stage('read'):
+            if(resample_frames>0):
+                fields=frames.at(time)
+            else:
+                fields=read_fields(i)
+        T,U=fields['T'],fields['U']
+        # p[0]=ax_field.tricontourf(triangles,T,levels=levels,cmap=cmap,vmin=vmin,vmax=vmax)
+        with log.stage('lod'):
+            lod=surfacelod.select(triangles,ax_field,dpi=dpi_out) # cached per geometry
+            T_lod=lod.remap(T)
+        with log.stage('artists'):
+            p[0]=ax_field.tripcolor(lod.triangulation,T_lod,shading='gouraud',cmap=cmap,vmin=vmin,vmax=vmax)
+            if(arrows is not None):
+                arrows.update(U)
+            text[0]=ax_field.text(x_text,y_text,str('%.1f years' % (time/86400/365)),color=color_text,fontsize=14,fontweight='bold',ha='left',va='top',transform=ax_field.transAxes)
+        if(i==len(frame_times)-1):
+            with log.stage('savefig'):
+                plt.savefig('T_'+model+'.pdf')
+
+    # 根据不同的movie格式设置相应的writter
+    def animationWriter(fmt='mp4'):
+        if(fmt_movie=='mp4'):
+            Writer = animation.writers['ffmpeg']
+            writer = Writer(fps=15, metadata=dict(artist='Zhikui Guo, et al., 2020, GMD',title='Cookbook of HydrothermalFoam tools',copyright='Zhikui Guo, 2018',comment='HydrothermalFoam open source tools for hydrothermal modeling'), bitrate=1800)
+        elif(fmt_movie=='avi'):
+            Writer = animation.writers['avconv']
+            writer = Writer(fps=15, metadata=dict(artist='Zhikui Guo, et al., 2020, GMD',title='Cookbook of HydrothermalFoam tools',copyright='Zhikui Guo, 2018',comment='HydrothermalFoam open source tools for hydrothermal modeling'), bitrate=1800)
+        elif(fmt_movie=='gif'):
+            writer=animation.writers['imagemagick'](fps=15)
+        else:
+            print('暂不支持此movie格式(mp4,gif): ',fmt_movie)
+            exit(0)
+        return writer
+    # animation
+    # 动画参数
+    interval = 1 #in seconds  
+    issave=True
+    repeat=False
+    fmt_movie='mp4'
+    fname_movie='results_'+model
+    writer=animationWriter(fmt_movie)
+    # encode: grabbing a frame and piping it to the encoder, without the drawing
+    writer.grab_frame=log.wrap('encode',writer.grab_frame)
+    fig.draw=log.wrap('draw',fig.draw)
+    ani = FuncAnimation(fig, update, len(frame_times),blit=False, interval=interval*1e3,repeat=repeat)
+
+    # 保存为gif或者显示
+    if(issave==True):
+        ani.save(fname_movie+'.'+fmt_movie, dpi=dpi_out, writer=writer)
+        log.close()
+    else:
+        plt.savefig('T_'+model+'.pdf')
+        # plt.show()
 
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+    batchanimation
+    ~~~~~~~~~~~~~~
+
+    Movies of several cases in one run, driven by a config file.
+
+    ``animation.py`` renders one hard-coded model per run. Here the cases,
+    fields and styles are listed in a JSON file (see ``animations.json``) and
+    all cases share one process pool. Each case gets a share of the workers
+    proportional to its cost (the size of the surface files to read) and its
+    frames are split in that many contiguous work items, so a worker sets up
+    the figure, triangulation and level of detail of a case once for a whole
+    run of frames instead of once per frame. Items are scheduled largest
+    first, so the big cases start early and the small ones fill the remaining
+    cores until the last movie is done. Frames are written as PNG and each
+    movie is encoded with ffmpeg as soon as its last frame is finished, while
+    the pool keeps rendering the other cases.
+
+    With ``"frames": N`` in a case, the movie has N frames at uniformly spaced
+    times interpolated between the written ones (see :mod:`timeinterp`); the
+    frames of a work item are in time order, so a worker streams the time
+    directories one after the other and keeps only two of them in memory.
+
+    The figure itself is set up by :func:`animation.field_figure`, the same
+    code as the single-case movie.
+
+    Usage::
+
+        python batchanimation.py animations.json -j 8
+        python batchanimation.py animations.json --case singlepass2
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import subprocess
+import sys
+from multiprocessing import Pool
+
+import matplotlib
+matplotlib.use('Agg')
+
+import glyphs
+import surfacelod
+import timeinterp
+import vtkpolydata as vtp
+
+DEFAULTS = {
+    'field': 'T',
+    'vector': 'U',
+    'surface': 'zNormal',
+    'cmap': 'Spectral_r',
+    'figwidth': 24,
+    'dpi': 400,
+    'fps': 15,
+    'frames': 0,
+    'bitrate': 1800,
+    'format': 'mp4',
+    'glyphs': False,
+    'glyph_spacing': 30,
+    'glyph_scale': 20,
+    'coord2km': True,
+    'depthPositive': True,
+    'xlabel': 'x (km)',
+    'ylabel': 'Depth (km)',
+    'clabel': 'Temperature ($^{\\circ}$C)',
+    'major_tick': 0.5,
+    'minor_tick': 0.1,
+    'cbar_tick': 100,
+    'text': {'x': 0.02, 'y': 0.98, 'color': 'w', 'fontsize': 14},
+    'time_scale': 86400 * 365,
+    'time_format': '%.1f years',
+    'metadata': {
+        'artist': 'Zhikui Guo, et al., 2020, GMD',
+        'title': 'Cookbook of HydrothermalFoam tools',
+        'copyright': 'Zhikui Guo, 2018',
+        'comment': 'HydrothermalFoam open source tools for hydrothermal '
+                   'modeling',
+    },
+}
+
+
+def load_config(filename):
+    """Read the config file and return the case dicts, defaults merged in.
+
+    Relative ``caseDir`` are resolved against the directory of the file.
+    """
+    with open(filename) as f:
+        config = json.load(f)
+    basedir = os.path.dirname(os.path.abspath(filename))
+    defaults = copy.deepcopy(DEFAULTS)
+    _merge(defaults, config.get('defaults', {}))
+    cases = []
+    for entry in config['cases']:
+        case = copy.deepcopy(defaults)
+        _merge(case, entry)
+        case.setdefault('name', os.path.basename(
+            os.path.normpath(case['caseDir'])))
+        case['caseDir'] = os.path.join(basedir, case['caseDir'])
+        cases.append(case)
+    return cases
+
+
+def _merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def surfaces_dir(case):
+    return os.path.join(case['caseDir'], 'postProcessing', 'surfaces')
+
+
+def name_fmt(case):
+    surface = case['surface']
+    return lambda name: '%s_%s.vtk' % (name, surface)
+
+
+def case_times(case):
+    """Time directories of the surfaces of a case, sorted by time."""
+    path = surfaces_dir(case)
+    times = []
+    for name in os.listdir(path):
+        if os.path.isdir(os.path.join(path, name)):
+            try:
+                times.append((float(name), name))
+            except ValueError:
+                print(name, 'is not a time directory')
+    return [name for _, name in sorted(times)]
+
+
+def case_fields(case):
+    return [case['field']] + ([case['vector']] if case['glyphs'] else [])
+
+
+def frame_size(case, time):
+    """Cost estimate of a frame: bytes of the surface files to read."""
+    fmt = name_fmt(case)
+    path = os.path.join(surfaces_dir(case), time)
+    return sum(os.path.getsize(os.path.join(path, fmt(name)))
+               for name in case_fields(case)
+               if os.path.exists(os.path.join(path, fmt(name))))
+
+
+def frames_dir(outdir, case):
+    return os.path.join(outdir, case['name'] + '_frames')
+
+
+class CaseFigure(object):
+    """Figure of one case, set up once per worker and reused for frames."""
+
+    def __init__(self, case, last_time):
+        import animation
+        animation.paper_style()
+
+        self.case = case
+        self.times = case_times(case)
+        self.interpolator = timeinterp.Interpolator(
+            [float(time) for time in self.times],
+            lambda k: self.read(self.times[k]).fields)
+        surface = self.read(last_time)
+        self.triangulation = surface.triangulation
+        self.fig, self.ax, self.vmin, self.vmax = animation.field_figure(
+            surface.triangulation, surface.fields[case['field']],
+            figwidth=case['figwidth'], major_tick=case['major_tick'],
+            minor_tick=case['minor_tick'], xlabel=case['xlabel'],
+            ylabel=case['ylabel'], cbar_tick=case['cbar_tick'],
+            clabel=case['clabel'])
+        self.arrows = None
+        if case['glyphs']:
+            self.arrows = glyphs.GlyphLayer(
+                self.ax, surface.triangulation, spacing=case['glyph_spacing'],
+                dpi=case['dpi'], depthPositive=case['depthPositive'],
+                scale=case['glyph_scale'])
+        self.artists = []
+
+    def read(self, time):
+        case = self.case
+        return vtp.read_surface(
+            os.path.join(surfaces_dir(case), time), case_fields(case),
+            name_fmt=name_fmt(case), coord2km=case['coord2km'],
+            depthPositive=case['depthPositive'])
+
+    def render(self, time, k, weight, filename):
+        """Render the fields interpolated between writes ``k`` and ``k+1``."""
+        case = self.case
+        for artist in self.artists:
+            artist.remove()
+        fields = self.interpolator.fields(k, weight)
+        lod = surfacelod.select(self.triangulation, self.ax, dpi=case['dpi'])
+        field = lod.remap(fields[case['field']])
+        text = case['text']
+        self.artists = [
+            self.ax.tripcolor(lod.triangulation, field, shading='gouraud',
+                              cmap=case['cmap'], vmin=self.vmin,
+                              vmax=self.vmax),
+            self.ax.text(text['x'], text['y'],
+                         case['time_format'] % (time / case['time_scale']),
+                         color=text['color'], fontsize=text['fontsize'],
+                         fontweight='bold', ha='left', va='top',
+                         transform=self.ax.transAxes),
+        ]
+        if self.arrows is not None:
+            self.arrows.update(fields[case['vector']])
+        self.fig.savefig(filename, dpi=case['dpi'])
+
+
+# per worker process: case name -> CaseFigure
+_cases = {}
+_figures = {}
+
+
+def _init_worker(cases):
+    _cases.update((case['name'], case) for case in cases)
+
+
+def render_frames(item):
+    """Render the frames of one work item, in a worker of the pool."""
+    size, name, frames, nframes, last_time, outdir = item
+    case = _cases[name]
+    figure = _figures.get(name)
+    if figure is None:
+        figure = _figures[name] = CaseFigure(case, last_time)
+    for index, time, k, weight in frames:
+        filename = os.path.join(frames_dir(outdir, case), '%05d.png' % index)
+        figure.render(time, k, weight, filename)
+        if index == nframes - 1:
+            figure.fig.savefig(os.path.join(
+                outdir, '%s_%s.pdf' % (case['field'], name)))
+    return name, len(frames)
+
+
+def encode(case, outdir):
+    """Start ffmpeg on the frames of a case, return the process."""
+    ffmpeg = shutil.which('ffmpeg')
+    movie = os.path.join(outdir, 'results_%s.%s' % (case['name'],
+                                                    case['format']))
+    if ffmpeg is None:
+        print('ffmpeg not found, frames of %s kept in %s'
+              % (case['name'], frames_dir(outdir, case)))
+        return None
+    cmd = [ffmpeg, '-y', '-loglevel', 'error',
+           '-framerate', str(case['fps']),
+           '-i', os.path.join(frames_dir(outdir, case), '%05d.png')]
+    for key, value in case['metadata'].items():
+        cmd += ['-metadata', '%s=%s' % (key, value)]
+    if case['format'] != 'gif':
+        cmd += ['-b:v', '%dk' % case['bitrate'], '-pix_fmt', 'yuv420p',
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    cmd.append(movie)
+    print('encoding', movie)
+    return subprocess.Popen(cmd)
+
+
+def case_frames(case, times):
+    """Frames of a case grouped in work items.
+
+    Returns lists of ``(index, time, k, weight)``: one frame per written time,
+    or with ``frames`` the resampled frames between writes ``k`` and ``k+1``.
+    """
+    values = [float(time) for time in times]
+    if case['frames'] <= 0:
+        return [[(index, value, index, 0.0)]
+                for index, value in enumerate(values)]
+    targets = timeinterp.uniform_times(values, case['frames'])
+    ks, weights = timeinterp.brackets(values, targets)
+    groups = {}
+    for index, (time, k, weight) in enumerate(zip(targets, ks, weights)):
+        groups.setdefault(int(k), []).append(
+            (index, float(time), int(k), float(weight)))
+    return [groups[k] for k in sorted(groups)]
+
+
+def split(sizes, count):
+    """Cut ``sizes`` in ``count`` contiguous runs of about the same total.
+
+    Returns the ``(start, stop)`` of every non-empty run.
+    """
+    total = float(sum(sizes))
+    bounds = [0]
+    cumulative = 0
+    for index, size in enumerate(sizes):
+        cumulative += size
+        if len(bounds) < count and cumulative >= total * len(bounds) / count:
+            bounds.append(index + 1)
+    if bounds[-1] != len(sizes):
+        bounds.append(len(sizes))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def schedule(cases, outdir, jobs=None):
+    """All work items, the largest first.
+
+    The frames of a case are split in as many contiguous items as its share
+    of the ``jobs`` workers, so each worker sets up a case about once.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    plans = []
+    for case in cases:
+        times = case_times(case)
+        if not times:
+            print('no surfaces in', surfaces_dir(case))
+            continue
+        groups = case_frames(case, times)
+        sizes = []
+        for frames in groups:
+            k = frames[0][2]
+            reads = times[k:k + 2] if len(frames) > 1 or frames[0][3] \
+                else times[k:k + 1]
+            sizes.append(sum(frame_size(case, time) for time in reads)
+                         + len(frames) * frame_size(case, times[k]))
+        plans.append((case, times, groups, sizes))
+    total = sum(sum(sizes) for _, _, _, sizes in plans) or 1
+    items = []
+    for case, times, groups, sizes in plans:
+        nframes = sum(len(frames) for frames in groups)
+        count = min(len(groups),
+                    max(1, int(round(jobs * sum(sizes) / float(total)))))
+        for start, stop in split(sizes, count):
+            frames = [frame for group in groups[start:stop]
+                      for frame in group]
+            items.append((sum(sizes[start:stop]), case['name'], frames,
+                          nframes, times[-1], outdir))
+    items.sort(key=lambda item: -item[0])
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render the movies of several cases on one process pool.')
+    parser.add_argument('config', help='JSON file listing the cases')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('-o', '--outdir', default='.',
+                        help='directory of the movies')
+    parser.add_argument('--case', action='append',
+                        help='only render this case (repeatable)')
+    opts = parser.parse_args(argv)
+
+    cases = load_config(opts.config)
+    if opts.case:
+        cases = [case for case in cases if case['name'] in opts.case]
+    for case in cases:
+        path = frames_dir(opts.outdir, case)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    items = schedule(cases, opts.outdir, opts.jobs)
+    remaining = {}
+    for item in items:
+        remaining[item[1]] = item[3]
+    total = sum(remaining.values())
+    byname = dict((case['name'], case) for case in cases)
+
+    encoders = []
+    pool = Pool(opts.jobs, initializer=_init_worker, initargs=(cases,))
+    try:
+        done = 0
+        for name, count in pool.imap_unordered(render_frames, items):
+            done += count
+            remaining[name] -= count
+            print('\r%d/%d frames' % (done, total), end='')
+            sys.stdout.flush()
+            if remaining[name] == 0:
+                print()
+                encoders.append(encode(byname[name], opts.outdir))
+    finally:
+        pool.close()
+        pool.join()
+    status = 0
+    for process in encoders:
+        if process is not None and process.wait() != 0:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+    figserver
+    ~~~~~~~~~
+
+    Warm render server for the figure scripts of ``sphinx/figures/python``.
+
+    Every figure script imports matplotlib, NumPy and ``sciPyFoam`` and sets
+    up the paper style and fonts before drawing anything; for small figures
+    this start-up is most of the run time. The server does it once, then
+    listens on a Unix socket. Each job is run in a child forked from the warm
+    process (so scripts cannot leak rcParams or global state into each other)
+    and the client gets back the files the script wrote and its output::
+
+        python figserver.py serve &            # once, keeps running
+        python figserver.py run animation.py   # sub-second when warm
+        python figserver.py stop
+
+    ``run`` executes the script in-process when no server is listening, so
+    ``makefigure.sh`` works the same with or without it. The backend and font
+    presets of the warm-up are those of the server only: without it, the
+    script runs with its own settings, as ``python script.py`` would.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import json
+import os
+import runpy
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+__all__ = ['serve', 'submit', 'run_local']
+
+
+def default_socket():
+    runtime = os.environ.get('XDG_RUNTIME_DIR', tempfile.gettempdir())
+    return os.path.join(runtime, 'figserver-%d.sock' % os.getuid())
+
+
+def warm_up():
+    """Import the figure stack and apply the style shared by the scripts.
+
+    Only for the server process, whose forked jobs inherit the state.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import matplotlib.font_manager as font_manager
+    import numpy  # noqa: F401
+    matplotlib.rcParams['font.family'] = 'Arial'
+    matplotlib.rcParams['mathtext.fontset'] = 'cm'
+    try:
+        import sciPyFoam.figure as scifig
+        import sciPyFoam.postProcessing.cuttingPlane  # noqa: F401
+        scifig.usePaperStyle(matplotlib, fontsize=12)
+    except ImportError:
+        pass
+    for module in ('colored', 'console_progressbar', 'vtkpolydata',
+                   'surfacelod', 'glyphs', 'timeinterp', 'telemetry'):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    # load the font cache and the fonts themselves
+    for family in ('Arial', 'DejaVu Sans', 'cmr10'):
+        try:
+            font_manager.findfont(family, fallback_to_default=True)
+        except Exception:
+            pass
+
+
+def _snapshot(path):
+    files = {}
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith('.')
+                   and d != '__pycache__']
+        for name in names:
+            filename = os.path.join(root, name)
+            try:
+                files[filename] = os.stat(filename).st_mtime_ns
+            except OSError:
+                pass
+    return files
+
+
+def run_job(request):
+    """Run a figure script in this process, return the list of outputs."""
+    cwd = request.get('cwd') or os.getcwd()
+    script = os.path.join(cwd, request['script'])
+    os.chdir(cwd)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    sys.argv = [script] + list(request.get('args', []))
+    before = _snapshot(cwd)
+    try:
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        try:
+            import matplotlib.pyplot as plt
+            plt.close('all')
+        except ImportError:
+            pass
+    after = _snapshot(cwd)
+    return sorted(name for name, mtime in after.items()
+                  if before.get(name) != mtime)
+
+
+def _child(conn, request):
+    """Body of a forked worker: run the job, answer on ``conn``."""
+    log = tempfile.TemporaryFile()
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    response = {'ok': True}
+    begin = time.time()
+    try:
+        response['outputs'] = run_job(request)
+    except SystemExit as e:
+        response['ok'] = e.code in (None, 0)
+    except BaseException as e:
+        import traceback
+        traceback.print_exc()
+        response['ok'] = False
+        response['error'] = '%s: %s' % (type(e).__name__, e)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    log.seek(0)
+    response['log'] = log.read().decode('utf-8', 'replace')
+    response['seconds'] = time.time() - begin
+    response.setdefault('outputs', [])
+    conn.sendall((json.dumps(response) + '\n').encode('utf-8'))
+    conn.close()
+
+
+def _read_line(conn):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def serve(path, workers):
+    """Warm up and answer jobs until a ``stop`` request."""
+    warm_up()
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(16)
+    children = set()
+    print('figserver ready on', path)
+    sys.stdout.flush()
+    try:
+        while True:
+            conn, _ = server.accept()
+            request = json.loads(_read_line(conn).decode('utf-8') or '{}')
+            if request.get('command') == 'stop':
+                conn.sendall(b'{"ok": true}\n')
+                conn.close()
+                break
+            # keep at most ``workers`` jobs running
+            while children:
+                pid, _ = os.waitpid(-1, os.WNOHANG if len(children) <
+                                    workers else 0)
+                if pid == 0:
+                    break
+                children.discard(pid)
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                try:
+                    _child(conn, request)
+                finally:
+                    os._exit(0)
+            conn.close()
+            children.add(pid)
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+        for pid in children:
+            os.waitpid(pid, 0)
+
+
+def submit(path, request):
+    """Send a request to the server, return its response (None if down)."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except (OSError, socket.error):
+        return None
+    try:
+        client.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        return json.loads(_read_line(client).decode('utf-8'))
+    finally:
+        client.close()
+
+
+def run_local(request):
+    """Cold fallback: run the job in this process, without the presets."""
+    begin = time.time()
+    outputs = run_job(request)
+    return {'ok': True, 'outputs': outputs, 'log': '',
+            'seconds': time.time() - begin}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Warm figure render server.')
+    parser.add_argument('--socket', default=default_socket())
+    sub = parser.add_subparsers(dest='command')
+    p_serve = sub.add_parser('serve', help='start the server')
+    p_serve.add_argument('-j', '--workers', type=int,
+                         default=os.cpu_count() or 1)
+    p_run = sub.add_parser('run', help='render a figure script')
+    p_run.add_argument('script')
+    p_run.add_argument('args', nargs=argparse.REMAINDER)
+    sub.add_parser('stop', help='stop the server')
+    opts = parser.parse_args(argv)
+
+    if opts.command == 'serve':
+        serve(opts.socket, opts.workers)
+        return 0
+    if opts.command == 'stop':
+        return 0 if submit(opts.socket, {'command': 'stop'}) else 1
+    if opts.command == 'run':
+        request = {'script': opts.script, 'args': opts.args,
+                   'cwd': os.getcwd()}
+        response = submit(opts.socket, request)
+        if response is None:
+            response = run_local(request)
+        sys.stdout.write(response.get('log', ''))
+        if not response['ok']:
+            print(response.get('error', 'failed'), file=sys.stderr)
+            return 1
+        for output in response['outputs']:
+            print(output)
+        print('%.2fs' % response['seconds'], file=sys.stderr)
+        return 0
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+    glyphs
+    ~~~~~~
+
+    Velocity arrows over a surface plot, one per cell of a screen-space grid.
+
+    Drawing an arrow at every vertex of a cutting plane is slow and
+    unreadable. The vertices are binned once per geometry onto a grid of
+    ``spacing`` output pixels and the vertex closest to the centre of each
+    occupied cell is kept. The indices are cached per triangulation, and a
+    frame only gathers the vectors of those vertices and updates the arrows of
+    one ``quiver`` in place::
+
+        import glyphs
+        arrows = glyphs.GlyphLayer(ax_field, triangles, dpi=dpi_out)
+        arrows.update(U)          # every frame
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import weakref
+
+import numpy as np
+
+import surfacelod
+
+__all__ = ['sample_indices', 'GlyphLayer']
+
+# triangulation -> {(spacing, pixel size, limits): indices}
+_samples = weakref.WeakKeyDictionary()
+
+
+def sample_indices(triangulation, ax, spacing=30, dpi=None):
+    """Indices of the vertices drawn as glyphs, at most one per grid cell.
+
+    ``spacing`` is the distance between glyphs in output pixels.
+    """
+    cellsize = spacing * surfacelod.pixel_size(ax, dpi)
+    key = (spacing, round(cellsize, 12), ax.get_xlim(), ax.get_ylim())
+    cache = _samples.setdefault(triangulation, {})
+    if key in cache:
+        return cache[key]
+
+    x, y = triangulation.x, triangulation.y
+    (x0, x1), (y0, y1) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+    visible = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+    ix = np.floor((x[visible] - x0) / cellsize)
+    iy = np.floor((y[visible] - y0) / cellsize)
+    cell = ix * (np.floor((y1 - y0) / cellsize) + 1) + iy
+    distance = np.hypot(x[visible] - (ix + 0.5) * cellsize - x0,
+                        y[visible] - (iy + 0.5) * cellsize - y0)
+    # nearest vertex to the centre first in every cell
+    order = np.lexsort((distance, cell))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = cell[order][1:] != cell[order][:-1]
+    cache[key] = indices = visible[order[first]]
+    return indices
+
+
+class GlyphLayer(object):
+    """A ``quiver`` of normalised vectors on a grid of the axes.
+
+    ``components`` are the columns of the vector field in the plane of the
+    plot; with ``depthPositive`` the vertical component is reversed like the
+    coordinates read with ``depthPositive=True``.
+    """
+
+    def __init__(self, ax, triangulation, spacing=30, dpi=None,
+                 normalize=True, components=(0, 1), depthPositive=False,
+                 **kwargs):
+        self.ax = ax
+        self.normalize = normalize
+        self.components = components
+        # vertical axis reversed by the reader: reverse the vectors as well
+        self.sign = -1.0 if depthPositive else 1.0
+        self.indices = sample_indices(triangulation, ax, spacing, dpi)
+        self.kwargs = dict(units='xy', angles='xy', pivot='middle',
+                           headwidth=3, headlength=4, color='k')
+        self.kwargs.update(kwargs)
+        self.x = triangulation.x[self.indices]
+        self.y = triangulation.y[self.indices]
+        self.quiver = None
+
+    def vectors(self, U):
+        """In-plane components of the sampled vectors."""
+        U = np.asarray(U)[self.indices]
+        u, v = U[:, self.components[0]], self.sign * U[:, self.components[1]]
+        if self.normalize:
+            norm = np.hypot(u, v)
+            norm[norm == 0] = 1.0
+            u, v = u / norm, v / norm
+        return u, v
+
+    def update(self, U):
+        """Draw (first call) or update the arrows, return the artist."""
+        u, v = self.vectors(U)
+        if self.quiver is None:
+            self.quiver = self.ax.quiver(self.x, self.y, u, v, **self.kwargs)
+        else:
+            self.quiver.set_UVC(u, v)
+        return self.quiver
+
+    def remove(self):
+        if self.quiver is not None:
+            self.quiver.remove()
+            self.quiver = None
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+    plotsamples
+    ~~~~~~~~~~~
+
+    Headless replacement of the per-case ``source/gnuplot/gnuplot_script`` runs.
+
+    The gnuplot scripts of the tutorials (see
+    ``BuildIn/incompressible/icoFoam_cavity_cavity/source/gnuplot``) compare the
+    sampled solution with reference data in interactive ``qt`` windows. This
+    script reads the same gnuplot script, so nothing has to be written twice,
+    and renders every ``set terminal`` window as an image with the Agg backend.
+    All cases found under the given directories are plotted in parallel.
+
+    Usage::
+
+        python plotsamples.py ../../../BuildIn            # all cases
+        python plotsamples.py path/to/case/source -j 4 --fmt svg
+
+    Data files of a ``plot`` command are searched relative to the ``source``
+    directory first and then relative to the case directory (the one holding
+    ``postProcessing``), the same places gnuplot would see when
+    ``run_sampling.sh`` is executed in the case.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import os
+import re
+import shlex
+import sys
+from multiprocessing import Pool
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import sampledata
+
+SCRIPT_NAME = 'gnuplot_script'
+
+# gnuplot point types used in the scripts -> matplotlib markers
+MARKERS = {'1': '+', '2': 'x', '3': '*', '4': 's', '5': 's',
+           '6': 'o', '7': 'o', '8': '^', '9': '^', '10': 'v', '11': 'v'}
+# gnuplot key positions -> matplotlib legend locations
+KEY_LOC = {'left': 'upper left', 'right': 'upper right',
+           'top': 'upper right', 'bottom': 'lower right',
+           'default': 'best'}
+
+
+class Curve(object):
+    """One data set of a gnuplot ``plot`` command."""
+
+    def __init__(self, filename, using=(1, 2), style='lp', marker=None,
+                 filled=True, title=None):
+        self.filename = filename
+        self.using = using
+        self.style = style
+        self.marker = marker
+        self.filled = filled
+        self.title = title
+
+
+class Figure(object):
+    """Everything drawn in one gnuplot terminal window."""
+
+    def __init__(self, index):
+        self.index = index
+        self.xlabel = None
+        self.ylabel = None
+        self.key = 'best'
+        self.grid = False
+        self.curves = []
+
+
+def _split_plot_items(text):
+    """Split the argument of ``plot`` at commas outside of quotes."""
+    items, current, quote = [], '', None
+    for c in text:
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '\'"':
+            quote = c
+        elif c == ',':
+            items.append(current)
+            current = ''
+            continue
+        current += c
+    items.append(current)
+    return [item.strip() for item in items if item.strip()]
+
+
+def _parse_curve(item):
+    tokens = shlex.split(item)
+    curve = Curve(tokens[0])
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else ''
+        if token in ('u', 'using'):
+            curve.using = tuple(int(col.strip('()$'))
+                                for col in value.split(':'))
+            i += 2
+        elif token in ('w', 'with'):
+            curve.style = value
+            i += 2
+        elif token in ('pt', 'pointtype'):
+            curve.marker = MARKERS.get(value, 'o')
+            # odd point types are the filled ones in the default terminal
+            curve.filled = value.isdigit() and int(value) % 2 == 1
+            i += 2
+        elif token in ('t', 'title'):
+            curve.title = value
+            i += 2
+        elif token == 'notitle':
+            curve.title = None
+            i += 1
+        else:
+            i += 1
+    return curve
+
+
+def parse_gnuplot_script(filename):
+    """Parse the subset of gnuplot used by the tutorial scripts.
+
+    Supported are ``set terminal <term> <n>``, ``set xlabel``/``ylabel``,
+    ``set key``, ``set grid`` and ``plot`` with ``using``, ``with``,
+    ``pt`` and ``title``. Everything else (``pause``, ``print``, multiplot)
+    only matters for interactive use and is ignored.
+    """
+    figures = []
+    current = None
+    with open(filename) as f:
+        lines = f.read().split('\n')
+    # join continuation lines
+    joined, buf = [], ''
+    for line in lines:
+        if line.rstrip().endswith('\\'):
+            buf += line.rstrip()[:-1]
+            continue
+        joined.append(buf + line)
+        buf = ''
+    for line in joined:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        words = line.split()
+        if words[0] == 'set' and len(words) > 1:
+            what = words[1]
+            if what.startswith('term'):
+                current = Figure(words[3] if len(words) > 3 else
+                                 str(len(figures)))
+                figures.append(current)
+                continue
+            if current is None:
+                current = Figure('0')
+                figures.append(current)
+            if what in ('xlabel', 'ylabel'):
+                label = shlex.split(line)[2] if len(words) > 2 else None
+                setattr(current, what, label)
+            elif what == 'key':
+                current.key = KEY_LOC.get(words[2] if len(words) > 2
+                                          else 'default', 'best')
+            elif what == 'grid':
+                current.grid = True
+        elif re.match(r'^(plot|p)\s', line):
+            if current is None:
+                current = Figure('0')
+                figures.append(current)
+            current.curves = [_parse_curve(item) for item in
+                              _split_plot_items(line.split(None, 1)[1])]
+    return [fig for fig in figures if fig.curves]
+
+
+def find_data(filename, searchdirs):
+    """Return the first existing ``filename`` relative to ``searchdirs``."""
+    for path in searchdirs:
+        candidate = os.path.normpath(os.path.join(path, filename))
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def case_dirs(sourcedir):
+    """Directories in which the data files of a gnuplot script are searched."""
+    casedir = os.path.dirname(os.path.abspath(sourcedir))
+    return [os.path.abspath(sourcedir), casedir]
+
+
+def render_figure(fig, searchdirs, outfile, dpi=150):
+    """Draw one gnuplot window to ``outfile``, return the missing files."""
+    missing = []
+    plt.figure(figsize=(6, 4.5))
+    ax = plt.gca()
+    for curve in fig.curves:
+        path = find_data(curve.filename, searchdirs)
+        if path is None:
+            missing.append(curve.filename)
+            continue
+        _, data = sampledata.load_sample(path)
+        xcol, ycol = curve.using[0] - 1, curve.using[1] - 1
+        linestyle = '-' if 'l' in curve.style else 'none'
+        marker = curve.marker if 'p' in curve.style else None
+        if marker is None and 'p' in curve.style:
+            marker = 'o'
+        ax.plot(data[:, xcol], data[:, ycol], linestyle=linestyle,
+                marker=marker, markersize=5,
+                markerfacecolor=None if curve.filled else 'none',
+                label=curve.title)
+    if fig.xlabel:
+        ax.set_xlabel(fig.xlabel)
+    if fig.ylabel:
+        ax.set_ylabel(fig.ylabel)
+    if fig.grid:
+        ax.grid(True, linestyle=':')
+    if any(curve.title for curve in fig.curves):
+        ax.legend(loc=fig.key)
+    if len(missing) < len(fig.curves):
+        plt.tight_layout()
+        plt.savefig(outfile, dpi=dpi)
+    plt.close()
+    return missing
+
+
+def plot_case(args):
+    """Render all windows of one gnuplot script (worker of the pool)."""
+    script, fmt, dpi = args
+    sourcedir = os.path.dirname(os.path.dirname(os.path.abspath(script)))
+    searchdirs = case_dirs(sourcedir)
+    outputs, missing = [], []
+    for fig in parse_gnuplot_script(script):
+        outfile = os.path.join(sourcedir, 'gnuplot_%s.%s' % (fig.index, fmt))
+        lost = render_figure(fig, searchdirs, outfile, dpi=dpi)
+        missing += lost
+        if len(lost) < len(fig.curves):
+            outputs.append(outfile)
+    return script, outputs, missing
+
+
+def find_scripts(paths):
+    """Find every ``source/gnuplot/gnuplot_script`` below ``paths``."""
+    scripts = []
+    for path in paths:
+        if os.path.isfile(path):
+            scripts.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')
+                       and d != 'postProcessing']
+            if SCRIPT_NAME in files and os.path.basename(root) == 'gnuplot':
+                scripts.append(os.path.join(root, SCRIPT_NAME))
+    return sorted(scripts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render the gnuplot comparison plots of tutorial cases '
+                    'without a display.')
+    parser.add_argument('paths', nargs='+',
+                        help='gnuplot scripts or directories to search')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--fmt', default='png', help='image format')
+    parser.add_argument('--dpi', type=int, default=150)
+    opts = parser.parse_args(argv)
+
+    scripts = find_scripts(opts.paths)
+    if not scripts:
+        print('no %s found' % SCRIPT_NAME)
+        return 1
+    tasks = [(script, opts.fmt, opts.dpi) for script in scripts]
+    pool = Pool(opts.jobs)
+    try:
+        for script, outputs, missing in pool.imap_unordered(plot_case, tasks):
+            for name in missing:
+                print('%s: data file not found: %s' % (script, name))
+            for outfile in outputs:
+                print(outfile)
+    finally:
+        pool.close()
+        pool.join()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
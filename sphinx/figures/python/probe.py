@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+    probe
+    ~~~~~
+
+    Point and line probes of the surfaces in ``postProcessing/surfaces``,
+    without running OpenFOAM ``sample`` again.
+
+    The triangles of a surface are registered once in a uniform bucket grid
+    (about one triangle per cell); locating a batch of points only visits the
+    few candidate triangles of their cells, all at once with NumPy. The
+    containing triangle and the barycentric weights of every point are then
+    reused for every field and every time directory, so a time series is one
+    gather and one weighted sum per time::
+
+        import probe
+        times, series = probe.probe_series(
+            'postProcessing/surfaces', ['T', 'U'], px, py,
+            name_fmt=lambda name: name + '_zNormal.vtk',
+            coord2km=True, depthPositive=True)
+        series['T']               # (ntimes, npoints)
+
+    Coordinates are those of the plot, i.e. in the plane of the surface after
+    ``coord2km`` and ``depthPositive``. Points outside the surface get NaN.
+    The index is cached per triangulation, and with the shared geometry of
+    :mod:`vtkpolydata` it is built once for all the time directories.
+
+    Usage::
+
+        python probe.py postProcessing/surfaces -f T --km --depth-positive \\
+            --point 1.5 0.8 --line 0 1 3 1 200 -o profile.csv
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import sys
+import weakref
+from multiprocessing import Pool
+
+import numpy as np
+
+import sampledata
+import vtkpolydata as vtp
+from surfacelod import barycentric
+
+__all__ = ['ProbeIndex', 'Probe', 'probe_index', 'line_points',
+           'probe_series']
+
+# points located per batch, bounds the size of the candidate arrays
+CHUNK = 65536
+# tolerance on the barycentric weights, points on edges belong to a triangle
+EPS = 1e-10
+
+_indices = weakref.WeakKeyDictionary()
+
+
+class ProbeIndex(object):
+    """Bucket grid of the triangles of a ``Triangulation``.
+
+    Every triangle is listed in the cells overlapped by its bounding box, in
+    compressed rows: the triangles of cell ``c`` are
+    ``tri[start[c]:start[c + 1]]``.
+    """
+
+    def __init__(self, triangulation):
+        self.triangulation = triangulation
+        x, y = triangulation.x, triangulation.y
+        ids = np.arange(len(triangulation.triangles))
+        if triangulation.mask is not None:
+            ids = ids[~np.asarray(triangulation.mask, dtype=bool)]
+        v = triangulation.triangles[ids]
+        self.x0, self.y0 = float(x.min()), float(y.min())
+        width = max(float(x.max()) - self.x0, 0.0)
+        height = max(float(y.max()) - self.y0, 0.0)
+        n = max(ids.size, 1)
+        cellsize = np.sqrt(width * height / n) if width * height > 0 else \
+            max(width, height) / n
+        self.cellsize = cellsize if cellsize > 0 else 1.0
+        self.nx = int(width / self.cellsize) + 1
+        self.ny = int(height / self.cellsize) + 1
+
+        i0, j0 = self._cell(x[v].min(axis=1), y[v].min(axis=1))
+        i1, j1 = self._cell(x[v].max(axis=1), y[v].max(axis=1))
+        wide = i1 - i0 + 1
+        counts = wide * (j1 - j0 + 1)
+        # enumerate the cells of every bounding box
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+        wide = np.repeat(wide, counts)
+        cell = (np.repeat(i0, counts) + k % wide) * self.ny + \
+            np.repeat(j0, counts) + k // wide
+        order = np.argsort(cell, kind='stable')
+        self.tri = ids[np.repeat(np.arange(ids.size), counts)[order]]
+        self.start = np.searchsorted(cell[order],
+                                     np.arange(self.nx * self.ny + 1))
+
+    def _cell(self, px, py):
+        i = np.floor((px - self.x0) / self.cellsize).astype(np.int64)
+        j = np.floor((py - self.y0) / self.cellsize).astype(np.int64)
+        return np.clip(i, 0, self.nx - 1), np.clip(j, 0, self.ny - 1)
+
+    def locate(self, px, py):
+        """Index of the triangle containing every point, -1 if none."""
+        px = np.asarray(px, dtype=float).ravel()
+        py = np.asarray(py, dtype=float).ravel()
+        found = np.full(px.size, -1, dtype=np.intp)
+        for begin in range(0, px.size, CHUNK):
+            end = min(begin + CHUNK, px.size)
+            found[begin:end] = self._locate(px[begin:end], py[begin:end])
+        return found
+
+    def _locate(self, px, py):
+        found = np.full(px.size, -1, dtype=np.intp)
+        i, j = self._cell(px, py)
+        cell = i * self.ny + j
+        lo, hi = self.start[cell], self.start[cell + 1]
+        counts = hi - lo
+        point = np.repeat(np.arange(px.size), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+        candidate = self.tri[np.repeat(lo, counts) + k]
+        tri = self.triangulation
+        _, weights = barycentric(tri.x, tri.y, tri.triangles,
+                                 px[point], py[point], candidate)
+        hit = (weights >= -EPS).all(axis=1)
+        # several hits on shared edges: keep the first candidate
+        found[point[hit][::-1]] = candidate[hit][::-1]
+        return found
+
+
+def probe_index(triangulation):
+    """Return the cached :class:`ProbeIndex` of ``triangulation``."""
+    index = _indices.get(triangulation)
+    if index is None:
+        index = _indices[triangulation] = ProbeIndex(triangulation)
+    return index
+
+
+class Probe(object):
+    """Interpolation of surface fields at fixed points.
+
+    ``vertices`` and ``weights`` are ``(npoints, 3)``, ``triangles`` the
+    containing triangle of every point (-1 outside of the surface).
+    """
+
+    def __init__(self, triangulation, px, py):
+        self.px = np.asarray(px, dtype=float).ravel()
+        self.py = np.asarray(py, dtype=float).ravel()
+        self.triangles = probe_index(triangulation).locate(self.px, self.py)
+        self.inside = self.triangles >= 0
+        self.vertices = np.zeros((self.px.size, 3), dtype=np.intp)
+        self.weights = np.zeros((self.px.size, 3))
+        self.vertices[self.inside], self.weights[self.inside] = barycentric(
+            triangulation.x, triangulation.y, triangulation.triangles,
+            self.px[self.inside], self.py[self.inside],
+            self.triangles[self.inside])
+
+    def sample(self, field, location='point'):
+        """Values of a point (or cell) field at the probes, NaN outside."""
+        field = np.asarray(field)
+        if location == 'cell':
+            values = field[np.maximum(self.triangles, 0)].astype(float)
+        elif field.ndim == 1:
+            values = np.einsum('ij,ij->i', self.weights,
+                               field[self.vertices])
+        else:
+            values = np.einsum('ij,ij...->i...', self.weights,
+                               field[self.vertices])
+        values[~self.inside] = np.nan
+        return values
+
+
+def line_points(start, end, npoints):
+    """``npoints`` equally spaced points from ``start`` to ``end``."""
+    s = np.linspace(0.0, 1.0, npoints)
+    return (start[0] + s * (end[0] - start[0]),
+            start[1] + s * (end[1] - start[1]))
+
+
+def _points_key(px, py):
+    """Digest of the probe points, part of the key of the cached probes."""
+    sha = hashlib.sha1()
+    for a in (px, py):
+        sha.update(np.ascontiguousarray(a, dtype=float).ravel().tobytes())
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+# per process: (geometry key, points key) -> Probe, see _probe_time
+_probes = {}
+# probes kept per process, oldest dropped first
+MAX_PROBES = 8
+
+
+def _probe_time(item):
+    path, fields, px, py, points, name_fmt, coord2km, depthPositive = item
+    surface = vtp.read_surface(path, fields, name_fmt=name_fmt,
+                               coord2km=coord2km, depthPositive=depthPositive)
+    key = (surface.key, points)
+    probe = _probes.get(key)
+    if probe is None:
+        while len(_probes) >= MAX_PROBES:
+            del _probes[next(iter(_probes))]
+        probe = _probes[key] = Probe(surface.triangulation, px, py)
+    return [probe.sample(surface.fields[name], surface.location[name])
+            for name in fields]
+
+
+class _SuffixFormat(object):
+    """Picklable ``name_fmt`` for the worker processes."""
+
+    def __init__(self, suffix):
+        self.suffix = suffix
+
+    def __call__(self, name):
+        return name + self.suffix
+
+
+def probe_series(surfacesdir, fields, px, py, name_fmt=None, coord2km=False,
+                 depthPositive=False, times=None, jobs=1):
+    """Fields at the points ``(px, py)`` in every time directory.
+
+    Returns ``(times, {field: array})`` where the arrays are
+    ``(ntimes, npoints)`` (or ``(ntimes, npoints, ncomp)`` for vectors).
+    With ``jobs > 1`` the time directories are read by a process pool;
+    ``name_fmt`` must then be picklable (e.g. not a lambda).
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    if times is None:
+        times = sampledata.time_dirs(surfacesdir)
+    points = _points_key(px, py)
+    items = [(os.path.join(surfacesdir, time), fields, px, py, points,
+              name_fmt, coord2km, depthPositive) for time in times]
+    if jobs > 1:
+        pool = Pool(jobs)
+        try:
+            results = pool.map(_probe_time, items,
+                               chunksize=max(len(items) // (4 * jobs), 1))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_probe_time(item) for item in items]
+    series = {}
+    for i, name in enumerate(fields):
+        series[name] = np.stack([values[i] for values in results]) \
+            if results else np.empty((0, np.size(px)))
+    return np.array([float(time) for time in times]), series
+
+
+def write_csv(filename, times, px, py, series):
+    """Write one row per (time, point), vector components in columns."""
+    header, columns = ['time', 'x', 'y'], []
+    for name, values in series.items():
+        if values.ndim == 2:
+            header.append(name)
+            columns.append(values[:, :, None])
+        else:
+            header += ['%s_%d' % (name, c) for c in range(values.shape[2])]
+            columns.append(values)
+    data = np.concatenate(columns, axis=2) if columns else \
+        np.empty((len(times), len(px), 0))
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for t, time in enumerate(times):
+            for p in range(len(px)):
+                writer.writerow(['%g' % time, '%g' % px[p], '%g' % py[p]] +
+                                ['%.8g' % value for value in data[t, p]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Probe the fields of postProcessing/surfaces at points.')
+    parser.add_argument('surfaces', help='postProcessing/surfaces directory')
+    parser.add_argument('-f', '--field', action='append', required=True,
+                        help='field to probe (repeatable)')
+    parser.add_argument('--surface', default='zNormal',
+                        help='name of the surface (default: zNormal)')
+    parser.add_argument('--point', nargs=2, type=float, action='append',
+                        default=[], metavar=('X', 'Y'), help='probe point')
+    parser.add_argument('--line', nargs=5, action='append', default=[],
+                        metavar=('X0', 'Y0', 'X1', 'Y1', 'N'),
+                        help='N probes from (X0, Y0) to (X1, Y1)')
+    parser.add_argument('--points', help='file of x y columns')
+    parser.add_argument('--km', action='store_true',
+                        help='coordinates in km (coord2km)')
+    parser.add_argument('--depth-positive', action='store_true',
+                        help='vertical axis reversed (depthPositive)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes reading the times')
+    parser.add_argument('-o', '--output', default='probes.csv',
+                        help='output file, .csv or .npz')
+    opts = parser.parse_args(argv)
+
+    px, py = [p[0] for p in opts.point], [p[1] for p in opts.point]
+    for x0, y0, x1, y1, n in opts.line:
+        lx, ly = line_points((float(x0), float(y0)), (float(x1), float(y1)),
+                             int(n))
+        px += list(lx)
+        py += list(ly)
+    if opts.points:
+        data = sampledata.load_columns(opts.points, cache=False)
+        px += list(data[:, 0])
+        py += list(data[:, 1])
+    if not px:
+        parser.error('no probe points, use --point, --line or --points')
+    px, py = np.array(px), np.array(py)
+
+    times, series = probe_series(
+        opts.surfaces, opts.field, px, py,
+        name_fmt=_SuffixFormat('_%s.vtk' % opts.surface),
+        coord2km=opts.km, depthPositive=opts.depth_positive, jobs=opts.jobs)
+    for name, values in series.items():
+        outside = np.isnan(values[0]).reshape(len(px), -1).any(axis=1) \
+            if len(times) else np.zeros(len(px), dtype=bool)
+        if outside.any():
+            print('%s: %d probes outside of the surface'
+                  % (name, outside.sum()), file=sys.stderr)
+    if opts.output.endswith('.npz'):
+        np.savez(opts.output, times=times, x=px, y=py, **series)
+    else:
+        write_csv(opts.output, times, px, py, series)
+    print('%d probes x %d times written to %s'
+          % (len(px), len(times), opts.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+    regenerate
+    ~~~~~~~~~~
+
+    Re-run the BuildIn tutorials and collect their results, e.g. after an
+    OpenFOAM upgrade.
+
+    The cases are read from the catalogs of ``BuildIn`` (``<category>.csv``,
+    one ``$FOAM_TUTORIALS/...`` path per row). Every case is copied from
+    ``$FOAM_TUTORIALS`` into a work directory and run with its ``Allrun``
+    (``blockMesh`` and the application of ``controlDict`` when it has none).
+    A case calling ``runParallel``/``decomposePar`` takes the
+    ``numberOfSubdomains`` of its ``decomposeParDict`` cores; the cases are
+    packed onto the available cores, the largest first, and smaller ones fill
+    the cores left free. Afterwards the logs and the sampled data of
+    ``postProcessing`` are copied into the ``source`` directory of the case,
+    where :mod:`plotsamples` and :mod:`validate` find them.
+
+    A case whose ``Allrun`` fails or whose logs hold a ``FOAM FATAL`` error is
+    retried from a fresh copy. The state of every case is kept in
+    ``<workdir>/state.json``, so an interrupted run resumes with the cases not
+    done yet. ``--stub`` replaces the solvers by a stand-in writing synthetic
+    logs and samples, to try the scheduler without OpenFOAM; their outputs
+    are collected into ``<workdir>/BuildIn``, never into ``BuildIn``::
+
+        python regenerate.py -j 16                       # all cases
+        python regenerate.py --case pitzDaily --retries 2
+        python regenerate.py --stub --fail 0.3
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import csv
+import fnmatch
+import glob
+import json
+import mmap
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+__all__ = ['Case', 'read_catalog', 'case_cores', 'Scheduler']
+
+BUILDIN = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', '..', '..', 'BuildIn')
+TUTORIALS_PREFIX = '$FOAM_TUTORIALS/'
+# seconds between two polls of the running cases
+POLL = 0.5
+# files copied into source/: logs anywhere, sampled data of postProcessing
+LOG_PATTERN = 'log.*'
+DATA_EXTENSIONS = ('.xy', '.csv', '.dat', '.raw')
+FATAL = re.compile(rb'FOAM FATAL (?:IO )?ERROR')
+
+# run when a tutorial has no Allrun
+FALLBACK = ('. $WM_PROJECT_DIR/bin/tools/RunFunctions; '
+            '[ -f system/blockMeshDict ] && runApplication blockMesh; '
+            'runApplication $(getApplication)')
+
+
+class Case(object):
+    """A tutorial of the catalog and its directory in ``BuildIn``."""
+
+    def __init__(self, category, tutorial, buildin):
+        self.category = category
+        self.tutorial = tutorial
+        parts = tutorial.split('/')
+        self.name = '_'.join(parts[1:])
+        self.sourcedir = os.path.join(buildin, category, self.name, 'source')
+        self.cores = 1
+
+    @property
+    def key(self):
+        return '%s/%s' % (self.category, self.name)
+
+
+def read_catalog(buildin, target=None):
+    """Cases listed in the ``<category>/<category>.csv`` catalogs.
+
+    The outputs of the cases are collected into ``target`` (default
+    ``buildin``), in the same ``<category>/<case>/source`` layout.
+    """
+    cases = []
+    for filename in sorted(glob.glob(os.path.join(buildin, '*', '*.csv'))):
+        category = os.path.basename(os.path.dirname(filename))
+        with open(filename, encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f):
+                path = row[0].strip() if row else ''
+                if not path.startswith(TUTORIALS_PREFIX):
+                    continue
+                cases.append(Case(category, path[len(TUTORIALS_PREFIX):],
+                                  target or buildin))
+    return cases
+
+
+def _read(filename):
+    try:
+        with open(filename, errors='replace') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def case_cores(casedir):
+    """Cores used by the ``Allrun`` of a tutorial (1 if it is serial)."""
+    allrun = _read(os.path.join(casedir, 'Allrun'))
+    if not re.search(r'\b(runParallel|decomposePar|mpirun)\b', allrun):
+        return 1
+    cores = 1
+    for name in glob.glob(os.path.join(casedir, 'system',
+                                       'decomposeParDict')) + \
+            glob.glob(os.path.join(casedir, '*', 'system',
+                                   'decomposeParDict')):
+        match = re.search(r'^\s*numberOfSubdomains\s+(\d+)\s*;',
+                          _read(name), re.M)
+        if match:
+            cores = max(cores, int(match.group(1)))
+    return cores
+
+
+def applications(casedir):
+    """Applications run by the ``Allrun`` of a tutorial, in order."""
+    apps = []
+    control = _read(os.path.join(casedir, 'system', 'controlDict'))
+    match = re.search(r'^\s*application\s+(\w+)\s*;', control, re.M)
+    default = match.group(1) if match else 'solver'
+    allrun = _read(os.path.join(casedir, 'Allrun'))
+    if not allrun:
+        return ['blockMesh', default]
+    for match in re.finditer(r'\brun(?:Application|Parallel)\s+(.*)',
+                             allrun):
+        words = [w for w in match.group(1).split() if not w.startswith('-')
+                 and not w.isdigit()]
+        if not words:
+            continue
+        app = default if words[0].startswith('$(getApplication') \
+            else words[0]
+        apps.append(app)
+    return apps or [default]
+
+
+def collect(casedir, sourcedir, max_size=10 * 1024 * 1024):
+    """Copy the logs and sampled data of a finished case to ``sourcedir``."""
+    copied = []
+    for root, dirs, names in os.walk(casedir):
+        dirs[:] = [d for d in dirs if not d.startswith('processor')]
+        rel = os.path.relpath(root, casedir)
+        sampled = 'postProcessing' in rel.split(os.sep)
+        for name in names:
+            if not (fnmatch.fnmatch(name, LOG_PATTERN) or sampled and
+                    os.path.splitext(name)[1] in DATA_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            if os.path.getsize(path) > max_size:
+                continue
+            target = os.path.normpath(os.path.join(sourcedir, rel, name))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(path, target)
+            copied.append(os.path.relpath(target, sourcedir))
+    return copied
+
+
+def fatal_logs(casedir):
+    """Logs of a case holding a ``FOAM FATAL ERROR``."""
+    failed = []
+    for root, dirs, names in os.walk(casedir):
+        dirs[:] = [d for d in dirs if not d.startswith('processor')]
+        for name in fnmatch.filter(names, LOG_PATTERN):
+            path = os.path.join(root, name)
+            if not os.path.getsize(path):
+                continue
+            with open(path, 'rb') as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if FATAL.search(buf):
+                    failed.append(os.path.relpath(path, casedir))
+            finally:
+                buf.close()
+    return failed
+
+
+class Scheduler(object):
+    """Run cases on ``cores`` cores, with retries and a resumable state."""
+
+    def __init__(self, cases, workdir, tutorials=None, cores=None,
+                 retries=1, timeout=None, stub=False, fail=0.0):
+        self.cases = cases
+        self.workdir = os.path.abspath(workdir)
+        self.tutorials = tutorials
+        self.cores = cores or os.cpu_count() or 1
+        self.retries = retries
+        self.timeout = timeout
+        self.stub = stub
+        self.fail = fail
+        self.statefile = os.path.join(self.workdir, 'state.json')
+        self.state = {}
+        if os.path.exists(self.statefile):
+            with open(self.statefile) as f:
+                self.state = json.load(f)
+
+    def save(self):
+        os.makedirs(self.workdir, exist_ok=True)
+        tmp = '%s.%d' % (self.statefile, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.statefile)
+
+    def casedir(self, case):
+        return os.path.join(self.workdir, case.category, case.name)
+
+    def prepare(self, case):
+        """Fresh copy of the tutorial in the work directory."""
+        casedir = self.casedir(case)
+        if os.path.exists(casedir):
+            shutil.rmtree(casedir)
+        source = os.path.join(self.tutorials or '', case.tutorial)
+        if self.tutorials and os.path.isdir(source):
+            shutil.copytree(source, casedir, symlinks=True)
+        elif self.stub:
+            os.makedirs(casedir)
+        else:
+            raise OSError('tutorial not found: %s' % source)
+        return casedir
+
+    def command(self, casedir):
+        if self.stub:
+            return [sys.executable, os.path.abspath(__file__), 'stub',
+                    casedir, '--fail', str(self.fail)]
+        allrun = os.path.join(casedir, 'Allrun')
+        if os.path.exists(allrun):
+            os.chmod(allrun, os.stat(allrun).st_mode | 0o111)
+            return [allrun]
+        return ['sh', '-c', FALLBACK]
+
+    def run(self, force=False):
+        """Run all the cases not done yet, return the number of failures."""
+        pending = []
+        for case in self.cases:
+            entry = self.state.get(case.key, {})
+            if entry.get('status') == 'done' and not force:
+                continue
+            if self.tutorials:
+                case.cores = case_cores(os.path.join(self.tutorials,
+                                                     case.tutorial))
+            self.state[case.key] = {'status': 'pending', 'attempts': 0,
+                                    'cores': case.cores}
+            pending.append(case)
+        self.save()
+        # largest first, the small cases fill the cores left free
+        pending.sort(key=lambda case: (-case.cores, case.key))
+        print('%d cases to run on %d cores' % (len(pending), self.cores))
+
+        running = []
+        free = self.cores
+        try:
+            while pending or running:
+                for case in list(pending):
+                    # a case larger than the machine runs alone
+                    need = min(case.cores, self.cores)
+                    if need <= free:
+                        pending.remove(case)
+                        job = self._start(case)
+                        if job is None:
+                            continue
+                        running.append(job + (need,))
+                        free -= need
+                if not running:
+                    continue
+                time.sleep(POLL)
+                for job in list(running):
+                    case, process, begin, logfile, need = job
+                    if process.poll() is None:
+                        if self.timeout and time.time() - begin > \
+                                self.timeout:
+                            os.killpg(process.pid, signal.SIGTERM)
+                        continue
+                    running.remove(job)
+                    logfile.close()
+                    free += need
+                    if self._finish(case, process.returncode,
+                                    time.time() - begin):
+                        continue
+                    if self.state[case.key]['attempts'] <= self.retries:
+                        pending.append(case)
+        except KeyboardInterrupt:
+            for case, process, _, _, _ in running:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait()
+                self.state[case.key]['status'] = 'pending'
+            self.save()
+            raise
+        failed = [key for key, entry in self.state.items()
+                  if entry['status'] == 'failed']
+        for key in sorted(failed):
+            print('FAILED: %s (%s)' % (key, self.state[key].get('error')),
+                  file=sys.stderr)
+        return len(failed)
+
+    def _start(self, case):
+        entry = self.state[case.key]
+        entry['attempts'] += 1
+        try:
+            casedir = self.prepare(case)
+        except OSError as e:
+            entry.update(status='failed', error=str(e))
+            self.save()
+            return None
+        logfile = open(os.path.join(casedir, 'log.Allrun'), 'w')
+        process = subprocess.Popen(
+            self.command(casedir), cwd=casedir, stdout=logfile,
+            stderr=subprocess.STDOUT, start_new_session=True)
+        entry['status'] = 'running'
+        self.save()
+        print('start  %-60s %2d cores, attempt %d'
+              % (case.key, case.cores, entry['attempts']))
+        return case, process, time.time(), logfile
+
+    def _finish(self, case, returncode, seconds):
+        """Record a finished case, collect its outputs if it succeeded."""
+        entry = self.state[case.key]
+        casedir = self.casedir(case)
+        entry['seconds'] = round(seconds, 1)
+        entry['returncode'] = returncode
+        fatal = fatal_logs(casedir)
+        if returncode == 0 and not fatal:
+            outputs = collect(casedir, case.sourcedir)
+            entry.update(status='done', outputs=len(outputs))
+            entry.pop('error', None)
+            print('done   %-60s %6.1fs, %d files'
+                  % (case.key, seconds, len(outputs)))
+        else:
+            entry['error'] = 'exit code %d' % returncode if returncode \
+                else 'fatal error in %s' % ', '.join(fatal)
+            entry['status'] = 'failed'
+            print('failed %-60s %s' % (case.key, entry['error']))
+        self.save()
+        return entry['status'] == 'done'
+
+
+def stub(casedir, fail=0.0, steps=20, seconds=0.5):
+    """Stand-in solver: synthetic logs and samples for every application."""
+    for app in applications(casedir):
+        with open(os.path.join(casedir, 'log.' + app), 'w') as f:
+            f.write('Stub of %s\n\nStarting time loop\n\n' % app)
+            for i in range(steps):
+                f.write('Courant Number mean: %g max: %g\n'
+                        'Time = %g\n\n' % (0.01 * i, 0.1 * i, i + 1))
+                f.write('smoothSolver:  Solving for Ux, Initial residual = '
+                        '%g, Final residual = %g, No Iterations %d\n'
+                        % (1.0 / (i + 1), 1e-6 / (i + 1), 3))
+                f.write('ExecutionTime = %g s  ClockTime = %d s\n\n'
+                        % (0.01 * (i + 1), i))
+            if random.random() < fail:
+                f.write('\n--> FOAM FATAL ERROR: stub failure\n')
+                return 1
+            f.write('End\n')
+        time.sleep(seconds / steps)
+    path = os.path.join(casedir, 'postProcessing', 'sampleDict', str(steps))
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, 'line_U.xy'), 'w') as f:
+        for i in range(11):
+            f.write('%g %g 0 0\n' % (0.1 * i, (0.1 * i) ** 2))
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['stub']:
+        # command of the cases with --stub
+        parser = argparse.ArgumentParser(prog='regenerate.py stub')
+        parser.add_argument('casedir')
+        parser.add_argument('--fail', type=float, default=0.0)
+        opts = parser.parse_args(argv[1:])
+        return stub(opts.casedir, opts.fail)
+
+    parser = argparse.ArgumentParser(
+        description='Re-run the BuildIn tutorials and collect their results.')
+    parser.add_argument('--buildin', default=BUILDIN,
+                        help='BuildIn directory with the catalogs')
+    parser.add_argument('--tutorials',
+                        default=os.environ.get('FOAM_TUTORIALS'),
+                        help='OpenFOAM tutorials (default: $FOAM_TUTORIALS)')
+    parser.add_argument('-w', '--workdir', default='regenerate',
+                        help='directory in which the cases are run')
+    parser.add_argument('-j', '--cores', type=int, default=None,
+                        help='number of cores (default: all)')
+    parser.add_argument('--case', action='append',
+                        help='only cases whose name contains this '
+                             '(repeatable)')
+    parser.add_argument('--category', action='append',
+                        help='only this category (repeatable)')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='runs of a failed case after the first')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds after which a case is stopped')
+    parser.add_argument('--force', action='store_true',
+                        help='run the cases already done as well')
+    parser.add_argument('--stub', action='store_true',
+                        help='stand-in solvers, no OpenFOAM needed, '
+                             'outputs in <workdir>/BuildIn')
+    parser.add_argument('--fail', type=float, default=0.0,
+                        help='failure probability of the stub solvers')
+    opts = parser.parse_args(argv)
+
+    if not opts.stub and not opts.tutorials:
+        parser.error('$FOAM_TUTORIALS is not set, use --tutorials or --stub')
+    # synthetic outputs must not end up next to the real ones
+    target = os.path.abspath(os.path.join(opts.workdir, 'BuildIn')) \
+        if opts.stub else None
+    cases = read_catalog(os.path.abspath(opts.buildin), target)
+    if opts.category:
+        cases = [case for case in cases if case.category in opts.category]
+    if opts.case:
+        cases = [case for case in cases
+                 if any(name in case.name for name in opts.case)]
+    scheduler = Scheduler(cases, opts.workdir, tutorials=opts.tutorials,
+                          cores=opts.cores, retries=opts.retries,
+                          timeout=opts.timeout, stub=opts.stub,
+                          fail=opts.fail)
+    return 1 if scheduler.run(force=opts.force) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
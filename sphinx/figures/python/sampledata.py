@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+    sampledata
+    ~~~~~~~~~~
+
+    Loader of OpenFOAM ``sample`` outputs (``postProcessing/sampleDict/<time>/*.xy``
+    and ``*.csv``) and of the plain column files used as reference data
+    (e.g. ``source/gnuplot/UX_yline``).
+
+    Text is converted with a single vectorised ``np.fromstring`` call instead of
+    line by line parsing. The parsed array is cached as ``.npy`` in a
+    ``.npycache`` directory next to the data file (i.e. one cache per time
+    directory), and later loads memory-map that file, so large line samples are
+    neither parsed nor copied again.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import os
+import numpy as np
+
+__all__ = ['load_sample', 'load_columns', 'latest_time', 'time_dirs']
+
+CACHE_DIR = '.npycache'
+
+
+def _parse_text(data, delimiter=None):
+    """Parse the bytes of a column file into a 2D float array.
+
+    Comment lines (``#``) are removed, the number of columns is taken from the
+    first data line, and all the numbers are converted in one call.
+    """
+    if b'#' in data:
+        data = b'\n'.join(line for line in data.splitlines()
+                          if not line.lstrip().startswith(b'#'))
+    if delimiter is not None:
+        data = data.replace(delimiter, b' ')
+    lines = data.split(b'\n', 50)
+    first = next((line for line in lines if line.strip()), None)
+    if first is None:
+        return np.empty((0, 0))
+    ncols = len(first.split())
+    values = np.fromstring(data.decode('ascii'), sep=' ')
+    if values.size % ncols:
+        raise ValueError('ragged column data: %d values in %d columns'
+                         % (values.size, ncols))
+    return values.reshape(-1, ncols)
+
+
+def _cache_file(filename):
+    path, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(path, CACHE_DIR, name + '.npy')
+
+
+def _is_fresh(cachefile, filename):
+    try:
+        return os.path.getmtime(cachefile) >= os.path.getmtime(filename)
+    except OSError:
+        return False
+
+
+def load_columns(filename, delimiter=None, cache=True, mmap=True):
+    """Load a whitespace (or ``delimiter``) separated column file.
+
+    Returns an array of shape ``(nrows, ncols)``. With ``cache`` the parsed
+    array is stored next to the file and reused while the file is unchanged;
+    with ``mmap`` the cached array is memory-mapped read only.
+    """
+    cachefile = _cache_file(filename)
+    if cache and _is_fresh(cachefile, filename):
+        return np.load(cachefile, mmap_mode='r' if mmap else None)
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if delimiter is not None:
+        header, _, body = data.partition(b'\n')
+        if any(c.isalpha() for c in header.decode('ascii', 'replace')):
+            data = body
+        delimiter = delimiter.encode('ascii')
+    array = _parse_text(data, delimiter)
+    if cache:
+        try:
+            os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+            tmp = '%s.%d.npy' % (cachefile[:-4], os.getpid())
+            np.save(tmp, array)
+            os.replace(tmp, cachefile)
+        except OSError:
+            # read-only case directory, just skip the cache
+            pass
+    return array
+
+
+def load_sample(filename, cache=True, mmap=True):
+    """Load an OpenFOAM sample file, returning ``(names, array)``.
+
+    ``names`` are the column names from the header of ``.csv`` files (e.g.
+    ``['y', 'U_0', 'U_1', 'U_2']``); raw ``.xy`` files have no header and
+    ``names`` is None. Columns are ordered as in the file, so they can be
+    addressed like gnuplot's ``using 2:1`` (1-based) or as ``array[:, 1]``.
+    """
+    names = None
+    delimiter = None
+    if filename.endswith('.csv'):
+        delimiter = ','
+        with open(filename) as f:
+            header = f.readline().strip()
+        if any(c.isalpha() for c in header):
+            names = [name.strip() for name in header.split(',')]
+    return names, load_columns(filename, delimiter=delimiter,
+                               cache=cache, mmap=mmap)
+
+
+def time_dirs(path):
+    """Return the numeric time directories of ``path`` sorted by time."""
+    times = []
+    for name in os.listdir(path):
+        if not os.path.isdir(os.path.join(path, name)):
+            continue
+        try:
+            times.append((float(name), name))
+        except ValueError:
+            continue
+    return [name for _, name in sorted(times)]
+
+
+def latest_time(path):
+    """Return the name of the latest time directory of ``path``."""
+    times = time_dirs(path)
+    if not times:
+        raise IOError('no time directory in %s' % path)
+    return times[-1]
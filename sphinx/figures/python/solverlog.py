@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+    solverlog
+    ~~~~~~~~~
+
+    Streaming parser of OpenFOAM solver logs (``log.hydrothermalFoam``,
+    ``log.pimpleFoam``, ...) for the residual and convergence plots of the
+    tutorials, replacing ``foamLog`` and the ad-hoc scripts.
+
+    The log is memory-mapped and scanned window by window with one compiled
+    regular expression; every time step becomes a row of NumPy arrays::
+
+        import solverlog
+        log = solverlog.SolverLog.open('log.hydrothermalFoam')
+        data = log.data()
+        data['time'], data['courant_max'], data['execution']
+        data['residuals']['T']['initial']   # one value per time step
+
+    For every solved field and time step the first initial residual, the
+    last final residual, the total number of linear iterations and the
+    number of solves (outer correctors) are kept.
+
+    The parsed arrays are cached next to the log (in ``.npycache``, see
+    :mod:`sampledata`) together with the byte offset reached, so reading a
+    growing log again only parses the new lines. ``follow`` polls the log of a
+    running case in the same way::
+
+        python solverlog.py log.hydrothermalFoam -o residuals.pdf
+        python solverlog.py log.hydrothermalFoam --follow -o residuals.pdf
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+import sampledata
+
+__all__ = ['SolverLog', 'follow', 'plot']
+
+# bytes scanned between two flushes of the rows into arrays
+WINDOW = 64 * 1024 * 1024
+# bytes at the head of the log identifying it, see SolverLog.update
+HEAD = 4096
+CACHE_VERSION = 1
+
+_PATTERN = re.compile(
+    rb'^(?:'
+    rb'(?P<time>Time = (?P<t>[-+.\deE]+))'
+    rb'|(?P<solve>[ \t]*\w+:[ \t]+Solving for (?P<field>\w+), '
+    rb'Initial residual = (?P<initial>\S+), '
+    rb'Final residual = (?P<final>\S+), '
+    rb'No Iterations (?P<iterations>\d+))'
+    rb'|(?P<courant>Courant Number mean: (?P<comean>\S+) max: (?P<comax>\S+))'
+    rb'|(?P<deltaT>deltaT = (?P<dt>\S+))'
+    rb'|(?P<execution>ExecutionTime = (?P<exe>\S+) s\s+'
+    rb'ClockTime = (?P<clock>\S+) s)'
+    rb'|(?P<end>End[ \t\r]*$)'
+    rb')', re.M)
+
+STEP_COLUMNS = ('time', 'deltaT', 'courant_mean', 'courant_max',
+                'execution', 'clock')
+# columns of the solve events: step, field id, initial, final, iterations
+SOLVE_COLUMNS = 5
+
+
+class _Table(object):
+    """Rows appended as lists, flushed to float arrays block by block."""
+
+    def __init__(self, ncols):
+        self.ncols = ncols
+        self.rows = []
+        self.blocks = []
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks) + len(self.rows)
+
+    def flush(self, keep=0):
+        """Convert all but the last ``keep`` rows into an array block."""
+        n = len(self.rows) - keep
+        if n > 0:
+            self.blocks.append(np.array(self.rows[:n], dtype=float))
+            del self.rows[:n]
+
+    def array(self):
+        """All the rows as one array, without flushing the pending ones."""
+        if len(self.blocks) > 1:
+            self.blocks = [np.concatenate(self.blocks)]
+        blocks = list(self.blocks)
+        if self.rows:
+            blocks.append(np.array(self.rows, dtype=float))
+        if not blocks:
+            return np.empty((0, self.ncols))
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+
+class SolverLog(object):
+    """Time steps, residuals and timings parsed from a solver log."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.finished = False
+        self.head = b''
+        self.fields = []
+        self._field_ids = {}
+        self._steps = _Table(len(STEP_COLUMNS))
+        self._solves = _Table(SOLVE_COLUMNS)
+        # Courant number and deltaT printed before the next "Time ="
+        self._pending = {}
+        self._closed = True
+
+    @classmethod
+    def open(cls, filename, cache=True):
+        """Parse ``filename``, resuming from its cache if there is one."""
+        log = cls(filename)
+        if cache:
+            log._load_cache()
+        if log.update() and cache:
+            log._save_cache()
+        return log
+
+    # -- parsing -------------------------------------------------------------
+
+    def update(self):
+        """Parse the lines appended since the last call.
+
+        Returns the number of bytes parsed. A log that was truncated or
+        replaced (its head changed) is parsed again from the start.
+        """
+        with open(self.filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                if self.offset:
+                    self.reset()
+                return 0
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if size < self.offset or buf[:len(self.head)] != self.head:
+                self.reset()
+            # complete lines only, a running solver may be writing the last
+            end = buf.rfind(b'\n', self.offset) + 1
+            if end <= self.offset:
+                return 0
+            start = self.offset
+            while self.offset < end:
+                stop = buf.rfind(b'\n', self.offset,
+                                 min(self.offset + WINDOW, end)) + 1
+                if stop <= self.offset:
+                    stop = end
+                self._parse(buf, self.offset, stop)
+                self.offset = stop
+                self._steps.flush(keep=1)
+                self._solves.flush()
+            if len(self.head) < HEAD:
+                self.head = bytes(buf[:min(HEAD, self.offset)])
+            return self.offset - start
+        finally:
+            buf.close()
+
+    def _field_id(self, name):
+        index = self._field_ids.get(name)
+        if index is None:
+            index = self._field_ids[name] = len(self.fields)
+            self.fields.append(name.decode('ascii'))
+        return index
+
+    def _parse(self, buf, pos, endpos):
+        steps = self._steps.rows
+        solves = self._solves.rows
+        nsteps = len(self._steps) - 1
+        pending = self._pending
+        nan = float('nan')
+        for m in _PATTERN.finditer(buf, pos, endpos):
+            kind = m.lastgroup
+            if kind == 'time':
+                row = [float(m.group('t')), nan, nan, nan, nan, nan]
+                for column, value in pending.items():
+                    row[column] = value
+                pending.clear()
+                steps.append(row)
+                nsteps += 1
+                self._closed = False
+            elif kind == 'solve':
+                if nsteps >= 0:
+                    solves.append((nsteps, self._field_id(m.group('field')),
+                                   float(m.group('initial')),
+                                   float(m.group('final')),
+                                   int(m.group('iterations'))))
+            elif kind == 'execution':
+                if steps:
+                    steps[-1][4] = float(m.group('exe'))
+                    steps[-1][5] = float(m.group('clock'))
+                self._closed = True
+            elif kind == 'courant':
+                self._set(2, float(m.group('comean')))
+                self._set(3, float(m.group('comax')))
+            elif kind == 'deltaT':
+                self._set(1, float(m.group('dt')))
+            elif kind == 'end':
+                self.finished = True
+
+    def _set(self, column, value):
+        # after the ExecutionTime of a step the value is for the next one
+        if self._closed or not self._steps.rows:
+            self._pending[column] = value
+        else:
+            self._steps.rows[-1][column] = value
+
+    # -- results -------------------------------------------------------------
+
+    def data(self):
+        """Dict of the per-step arrays and ``residuals[field]`` dicts."""
+        steps = self._steps.array()
+        out = dict((name, steps[:, i]) for i, name in enumerate(STEP_COLUMNS))
+        out['residuals'] = dict((name, self.residuals(name))
+                                for name in self.fields)
+        return out
+
+    def residuals(self, field):
+        """``initial``, ``final``, ``iterations`` and ``solves`` per step."""
+        nsteps = len(self._steps)
+        events = self._solves.array()
+        events = events[events[:, 1] == self.fields.index(field)]
+        steps = events[:, 0].astype(np.intp)
+        initial = np.full(nsteps, np.nan)
+        final = np.full(nsteps, np.nan)
+        # first solve of every step, and last one (reversed order)
+        solved, first = np.unique(steps, return_index=True)
+        initial[solved] = events[first, 2]
+        _, last = np.unique(steps[::-1], return_index=True)
+        final[solved] = events[::-1][last, 3]
+        return {
+            'initial': initial,
+            'final': final,
+            'iterations': np.bincount(steps, weights=events[:, 4],
+                                      minlength=nsteps).astype(np.int64),
+            'solves': np.bincount(steps, minlength=nsteps),
+        }
+
+    # -- cache ---------------------------------------------------------------
+
+    def _cache_file(self):
+        path, name = os.path.split(os.path.abspath(self.filename))
+        return os.path.join(path, sampledata.CACHE_DIR, name + '.npz')
+
+    def _load_cache(self):
+        cachefile = self._cache_file()
+        if not os.path.exists(cachefile):
+            return
+        try:
+            with np.load(cachefile) as cache:
+                if int(cache['version']) != CACHE_VERSION:
+                    return
+                self.offset = int(cache['offset'])
+                self.finished = bool(cache['finished'])
+                self.head = cache['head'].tobytes()
+                self.fields = [str(name) for name in cache['fields']]
+                self._field_ids = dict((name.encode('ascii'), i)
+                                       for i, name in enumerate(self.fields))
+                self._steps.blocks = [cache['steps']]
+                self._solves.blocks = [cache['solves']]
+                pending = cache['pending']
+                self._pending = dict((int(column), value) for column, value
+                                     in zip(pending[0], pending[1]))
+                self._closed = bool(cache['closed'])
+        except (OSError, KeyError, ValueError):
+            self.reset()
+        # the last step may still be completed by the next lines
+        if self._steps.blocks and len(self._steps.blocks[0]):
+            steps = self._steps.blocks[0]
+            self._steps.blocks = [steps[:-1]]
+            self._steps.rows = [list(steps[-1])]
+
+    def _save_cache(self):
+        cachefile = self._cache_file()
+        pending = sorted(self._pending.items())
+        try:
+            os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+            tmp = '%s.%d.npz' % (cachefile[:-4], os.getpid())
+            np.savez(tmp, version=CACHE_VERSION, offset=self.offset,
+                     finished=self.finished, closed=self._closed,
+                     head=np.frombuffer(self.head, dtype=np.uint8),
+                     fields=np.array(self.fields, dtype=str),
+                     steps=self._steps.array(), solves=self._solves.array(),
+                     pending=np.array([[c for c, _ in pending],
+                                       [v for _, v in pending]]))
+            os.replace(tmp, cachefile)
+        except OSError:
+            # read-only case directory, just skip the cache
+            pass
+
+
+def follow(filename, interval=2.0, cache=True):
+    """Yield the :class:`SolverLog` of a running case whenever it grows.
+
+    Stops after the solver has written ``End``.
+    """
+    log = SolverLog.open(filename, cache=cache)
+    yield log
+    while not log.finished:
+        time.sleep(interval)
+        if log.update():
+            if cache:
+                log._save_cache()
+            yield log
+
+
+def plot(log, filename, fields=None):
+    """Residuals, Courant number and time per step of ``log`` in a figure."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    data = log.data()
+    t = data['time']
+    fig, axes = plt.subplots(3, 1, sharex=True, figsize=(8, 9))
+    ax = axes[0]
+    for name in fields or log.fields:
+        ax.semilogy(t, data['residuals'][name]['initial'], lw=1, label=name)
+    ax.set_ylabel('Initial residual')
+    if log.fields:
+        ax.legend(loc='upper right', ncol=4, fontsize=8)
+    ax = axes[1]
+    ax.plot(t, data['courant_max'], lw=1, label='max')
+    ax.plot(t, data['courant_mean'], lw=1, label='mean')
+    ax.set_ylabel('Courant number')
+    ax.legend(loc='upper right', fontsize=8)
+    ax = axes[2]
+    ax.plot(t[1:], np.diff(data['execution']), lw=1)
+    ax.set_ylabel('Execution time per step (s)')
+    ax.set_xlabel('Time')
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def summary(log):
+    data = log.data()
+    t = data['time']
+    lines = ['%s: %d time steps%s' % (
+        log.filename, t.size, ', finished' if log.finished else '')]
+    if t.size:
+        lines.append('  time %g .. %g, execution time %g s' % (
+            t[0], t[-1], np.nanmax(data['execution'])
+            if np.isfinite(data['execution']).any() else 0.0))
+    for name in log.fields:
+        res = data['residuals'][name]
+        solved = np.isfinite(res['initial'])
+        lines.append('  %-10s last initial residual %.3g, %d iterations'
+                     % (name, res['initial'][solved][-1]
+                        if solved.any() else np.nan,
+                        res['iterations'].sum()))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Parse an OpenFOAM solver log into residual arrays.')
+    parser.add_argument('log', help='solver log, e.g. log.hydrothermalFoam')
+    parser.add_argument('-o', '--output',
+                        help='plot the residuals to this file')
+    parser.add_argument('--npz', help='save the arrays to this file')
+    parser.add_argument('-f', '--field', action='append',
+                        help='only plot this field (repeatable)')
+    parser.add_argument('--follow', action='store_true',
+                        help='keep reading the log of a running case')
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help='seconds between two reads with --follow')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse the whole log, do not write the cache')
+    opts = parser.parse_args(argv)
+
+    if opts.follow:
+        logs = follow(opts.log, opts.interval, cache=not opts.no_cache)
+    else:
+        logs = [SolverLog.open(opts.log, cache=not opts.no_cache)]
+    try:
+        for log in logs:
+            print(summary(log))
+            if opts.output:
+                plot(log, opts.output, opts.field)
+    except KeyboardInterrupt:
+        pass
+    if opts.npz:
+        data = log.data()
+        arrays = dict((name, data[name]) for name in STEP_COLUMNS)
+        for name, res in data['residuals'].items():
+            for key, values in res.items():
+                arrays['%s_%s' % (name, key)] = values
+        np.savez(opts.npz, **arrays)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+    surfacelod
+    ~~~~~~~~~~
+
+    Levels of detail of a dense surface triangulation for ``tripcolor``.
+
+    A cutting plane of a fine mesh often has many more triangles than the
+    figure has pixels, and ``tripcolor(..., shading='gouraud')`` draws every
+    one of them. The hierarchy built here decimates the triangulation by
+    vertex clustering on grids of doubling cell size; every cluster becomes a
+    vertex at the mean position of its members, and its value is interpolated
+    with precomputed barycentric weights in the original triangle containing
+    it, looked for among the triangles around its nearest member (or taken
+    from that member). Per frame only one gather and one weighted sum are
+    left::
+
+        import surfacelod
+        level = surfacelod.select(triangles, ax_field, dpi=dpi_out)
+        ax_field.tripcolor(level.triangulation, level.remap(T),
+                           shading='gouraud')
+
+    The levels are decimated on demand, down to the coarsest one requested.
+    The hierarchy is cached per triangulation object, so with the shared
+    geometry of :mod:`vtkpolydata` it is built once for a whole movie.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import weakref
+
+import numpy as np
+from matplotlib.tri import Triangulation
+
+__all__ = ['Level', 'Hierarchy', 'hierarchy', 'select', 'barycentric']
+
+# do not decimate below this number of triangles
+MIN_TRIANGLES = 2000
+# tolerance on the barycentric weights, points on edges belong to a triangle
+EPS = 1e-10
+
+_hierarchies = weakref.WeakKeyDictionary()
+
+
+class Level(object):
+    """One level of detail.
+
+    ``index`` and ``weights`` are ``(npoints, 3)``: the value at a vertex of
+    this level is ``sum(weights * field[index])`` over the original vertices.
+    """
+
+    def __init__(self, triangulation, cellsize, index=None, weights=None):
+        self.triangulation = triangulation
+        self.cellsize = cellsize
+        self.index = index
+        self.weights = weights
+
+    @property
+    def ntriangles(self):
+        return len(self.triangulation.triangles)
+
+    def remap(self, field):
+        """Values of a point field of the original mesh at this level."""
+        if self.index is None:
+            return field
+        field = np.asarray(field)
+        values = field[self.index]
+        if field.ndim == 1:
+            return np.einsum('ij,ij->i', self.weights, values)
+        return np.einsum('ij,ij...->i...', self.weights, values)
+
+
+def barycentric(x, y, triangles, px, py, tri):
+    """Barycentric weights of points ``(px, py)`` in triangles ``tri``."""
+    v = triangles[tri]
+    x0, x1, x2 = x[v[:, 0]], x[v[:, 1]], x[v[:, 2]]
+    y0, y1, y2 = y[v[:, 0]], y[v[:, 1]], y[v[:, 2]]
+    det = (y1 - y2) * (x0 - x2) + (x2 - x1) * (y0 - y2)
+    det[det == 0] = 1.0
+    w0 = ((y1 - y2) * (px - x2) + (x2 - x1) * (py - y2)) / det
+    w1 = ((y2 - y0) * (px - x2) + (x0 - x2) * (py - y2)) / det
+    return v, np.stack([w0, w1, 1.0 - w0 - w1], axis=1)
+
+
+class Hierarchy(object):
+    """The levels of one triangulation, finest (the original) first.
+
+    Only the original level exists at first; :meth:`select` decimates the
+    coarser ones when they are first asked for.
+    """
+
+    def __init__(self, triangulation, min_triangles=MIN_TRIANGLES):
+        self.base = triangulation
+        self.min_triangles = min_triangles
+        x, y = triangulation.x, triangulation.y
+        tris = triangulation.get_masked_triangles()
+        edges = np.hypot(x[tris] - x[np.roll(tris, 1, axis=1)],
+                         y[tris] - y[np.roll(tris, 1, axis=1)])
+        spacing = float(np.median(edges)) if edges.size else 0.0
+        self.levels = [Level(triangulation, spacing)]
+        # cell size of the next level, None when there is none
+        self._next = 2 * spacing \
+            if spacing > 0 and len(tris) > min_triangles else None
+        self._incident = None
+
+    def _extend(self):
+        """Decimate the next level, False if there is none."""
+        if self._next is None:
+            return False
+        level = self._decimate(self._next)
+        if level.ntriangles >= self.levels[-1].ntriangles or \
+                level.ntriangles < 2:
+            self._next = None
+            return False
+        self.levels.append(level)
+        self._next = 2 * self._next \
+            if level.ntriangles > self.min_triangles else None
+        return True
+
+    def _triangles_of_vertices(self):
+        """Triangles around every vertex, in compressed rows: those of
+        vertex ``v`` are ``tri[start[v]:start[v + 1]]``."""
+        if self._incident is None:
+            base = self.base
+            ids = np.arange(len(base.triangles))
+            if base.mask is not None:
+                ids = ids[~np.asarray(base.mask, dtype=bool)]
+            vertices = base.triangles[ids].ravel()
+            order = np.argsort(vertices, kind='stable')
+            start = np.zeros(base.x.size + 1, dtype=np.intp)
+            np.cumsum(np.bincount(vertices, minlength=base.x.size),
+                      out=start[1:])
+            self._incident = start, np.repeat(ids, 3)[order]
+        return self._incident
+
+    def _decimate(self, cellsize):
+        base = self.base
+        x, y = base.x, base.y
+        ix = np.floor((x - x.min()) / cellsize).astype(np.int64)
+        iy = np.floor((y - y.min()) / cellsize).astype(np.int64)
+        cells, inverse = np.unique(ix * (iy.max() + 1) + iy,
+                                   return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse)
+        cx = np.bincount(inverse, weights=x) / counts
+        cy = np.bincount(inverse, weights=y) / counts
+
+        tri = inverse[base.get_masked_triangles()]
+        keep = (tri[:, 0] != tri[:, 1]) & (tri[:, 1] != tri[:, 2]) & \
+            (tri[:, 0] != tri[:, 2])
+        tri = np.unique(np.sort(tri[keep], axis=1), axis=0)
+
+        # the member nearest to the centre of every cluster
+        distance = (x - cx[inverse]) ** 2 + (y - cy[inverse]) ** 2
+        order = np.lexsort((distance, inverse))
+        member = order[np.cumsum(counts) - counts]
+        # the centre in one of the triangles around that member
+        start, around = self._triangles_of_vertices()
+        lo = start[member]
+        n = start[member + 1] - lo
+        cluster = np.repeat(np.arange(cells.size), n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        candidate = around[np.repeat(lo, n) + k]
+        vertices, weights = barycentric(x, y, base.triangles, cx[cluster],
+                                        cy[cluster], candidate)
+        hit = np.nonzero((weights >= -EPS).all(axis=1))[0]
+        # several hits on shared edges: keep the first candidate
+        chosen = np.full(cells.size, -1, dtype=np.intp)
+        chosen[cluster[hit][::-1]] = hit[::-1]
+        inside = chosen >= 0
+        index = np.empty((cells.size, 3), dtype=np.intp)
+        index[inside] = vertices[chosen[inside]]
+        weights, found = np.zeros((cells.size, 3)), weights
+        weights[inside] = found[chosen[inside]]
+        # elsewhere (concave boundary, centre beyond the triangles of the
+        # member) the value of the member
+        index[~inside] = member[~inside, None]
+        weights[~inside, 0] = 1.0
+        return Level(Triangulation(cx, cy, tri), cellsize, index, weights)
+
+    def select(self, pixelsize):
+        """Coarsest level whose cells are not larger than ``pixelsize``."""
+        while self._next is not None and self._next <= pixelsize and \
+                self._extend():
+            pass
+        chosen = self.levels[0]
+        for level in self.levels[1:]:
+            if level.cellsize > pixelsize:
+                break
+            chosen = level
+        return chosen
+
+
+def hierarchy(triangulation):
+    """Return the cached :class:`Hierarchy` of ``triangulation``."""
+    lod = _hierarchies.get(triangulation)
+    if lod is None:
+        lod = _hierarchies[triangulation] = Hierarchy(triangulation)
+    return lod
+
+
+def pixel_size(ax, dpi=None):
+    """Size of one output pixel in data units of ``ax``."""
+    fig = ax.figure
+    dpi = dpi or fig.dpi
+    bbox = ax.get_position()
+    width, height = fig.get_size_inches()
+    wpx = max(bbox.width * width * dpi, 1.0)
+    hpx = max(bbox.height * height * dpi, 1.0)
+    x0, x1 = ax.get_xlim()
+    y0, y1 = ax.get_ylim()
+    return min(abs(x1 - x0) / wpx, abs(y1 - y0) / hpx)
+
+
+def select(triangulation, ax, dpi=None):
+    """Level of ``triangulation`` fitting the output resolution of ``ax``.
+
+    ``dpi`` is the resolution the figure is saved with (``savefig`` or
+    ``Animation.save``), the figure dpi by default.
+    """
+    return hierarchy(triangulation).select(pixel_size(ax, dpi))
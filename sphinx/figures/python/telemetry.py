@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+    telemetry
+    ~~~~~~~~~
+
+    Per-frame timing of the render stages of a movie.
+
+    Replaces the percentage-only ``console_progressbar`` of ``animation.py``:
+    every frame is split into stages (VTK reading, level of detail, drawing,
+    ``savefig``, encoding, ...), a live line shows the progress, the stage
+    times of the last frame, the running frames per second and the peak
+    resident memory, and at the end all the records and a summary are
+    written as JSON::
+
+        log = telemetry.FrameTelemetry(len(times), 'animation.telemetry.json')
+        def update(i):
+            log.begin(i)
+            with log.stage('read'):
+                ...
+        log.close()
+
+    A frame lasts until the next one begins, so work done between two calls
+    of ``update`` (``FuncAnimation`` grabs and encodes the frame after it)
+    is charged to the frame it belongs to.
+
+    Stages can be nested, each one is charged its self time only, so a stage
+    wrapping the whole encoder call (``grab_frame``) does not count the
+    drawing measured inside it. :meth:`FrameTelemetry.wrap` times existing
+    methods, e.g. the writer's ``grab_frame`` and the figure's ``draw``.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import functools
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+__all__ = ['FrameTelemetry', 'peak_rss_mb']
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+class FrameTelemetry(object):
+    """Stage timings of every frame, printed live and logged at the end."""
+
+    def __init__(self, total, logfile=None, stream=sys.stdout):
+        self.total = total
+        self.logfile = logfile
+        self.stream = stream
+        self.records = []
+        self.start = time.perf_counter()
+        self._current = None
+        self._stack = []
+
+    def begin(self, index):
+        """Finish the current frame, if any, and start frame ``index``.
+
+        Drawing the same frame again (``FuncAnimation`` draws the first frame
+        at initialisation) continues its record.
+        """
+        if self._current is not None and self._current['frame'] == index:
+            return
+        self.finish()
+        self._current = {'frame': index, 'stages': {},
+                         'begin': time.perf_counter()}
+
+    def finish(self):
+        """Finish the current frame: record and print it."""
+        record = self._current
+        if record is None:
+            return
+        self._current = None
+        record['total'] = time.perf_counter() - record.pop('begin')
+        record['rss_mb'] = peak_rss_mb()
+        self.records.append(record)
+        self._print()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the current frame, excluding nested stages."""
+        entry = [time.perf_counter(), 0.0]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - entry[0]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            if self._current is not None:
+                stages = self._current['stages']
+                stages[name] = stages.get(name, 0.0) + elapsed - entry[1]
+
+    def wrap(self, name, func):
+        """Return ``func`` timed as stage ``name``."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.start
+        return len(self.records) / elapsed if elapsed > 0 else 0.0
+
+    def _print(self):
+        if self.stream is None:
+            return
+        record = self.records[-1]
+        stages = ' '.join('%s %.0fms' % (name, 1e3 * seconds)
+                          for name, seconds in record['stages'].items())
+        rss = record['rss_mb']
+        self.stream.write('\r\033[K[%d/%d] %.2f frames/s | %s%s' % (
+            len(self.records), self.total, self.fps(), stages,
+            ' | peak %.0f MB' % rss if rss is not None else ''))
+        self.stream.flush()
+
+    def summary(self):
+        """Total, mean and max time of every stage over all frames."""
+        stages = {}
+        for record in self.records:
+            for name, seconds in record['stages'].items():
+                entry = stages.setdefault(name, {'total': 0.0, 'max': 0.0})
+                entry['total'] += seconds
+                entry['max'] = max(entry['max'], seconds)
+        for entry in stages.values():
+            entry['mean'] = entry['total'] / max(len(self.records), 1)
+        return {
+            'frames': len(self.records),
+            'elapsed': time.perf_counter() - self.start,
+            'fps': self.fps(),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': stages,
+        }
+
+    def close(self):
+        """Finish the last frame and write the log file."""
+        self.finish()
+        summary = self.summary()
+        if self.stream is not None:
+            self.stream.write('\n')
+            for name, entry in sorted(summary['stages'].items(),
+                                      key=lambda item: -item[1]['total']):
+                self.stream.write('  %-12s total %8.2fs  mean %7.1fms  '
+                                  'max %7.1fms\n' % (
+                                      name, entry['total'],
+                                      1e3 * entry['mean'], 1e3 * entry['max']))
+        if self.logfile:
+            with open(self.logfile, 'w') as f:
+                json.dump({'summary': summary, 'frames': self.records}, f,
+                          indent=1)
+        return summary
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+    timeinterp
+    ~~~~~~~~~~
+
+    Frames at uniformly spaced times, interpolated from sparse solver writes.
+
+    ``postProcessing/surfaces`` is written rarely and at uneven intervals, so
+    one frame per time directory gives a stuttering movie. Frames are instead
+    placed at uniform times between the first and last write, and each one is
+    the linear interpolation of the two neighbouring time directories. Frames
+    are produced in time order and only these two neighbours are held in
+    memory; the geometry is shared by all of them (see :mod:`vtkpolydata`)::
+
+        import timeinterp
+        frames = timeinterp.Interpolator(times, read)
+        for time, fields in frames.resample(nframes):
+            ...
+
+    where ``read(time)`` returns the dict of fields of one time directory.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import numpy as np
+
+__all__ = ['uniform_times', 'brackets', 'Interpolator']
+
+
+def uniform_times(times, nframes):
+    """``nframes`` uniformly spaced times from the first to the last write."""
+    times = np.asarray(times, dtype=float)
+    return np.linspace(times[0], times[-1], nframes)
+
+
+def brackets(times, targets):
+    """Left neighbour index and weight of the right one for every target."""
+    times = np.asarray(times, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    if times.size == 1:
+        return np.zeros(targets.size, dtype=int), np.zeros(targets.size)
+    k = np.clip(np.searchsorted(times, targets, side='right') - 1,
+                0, times.size - 2)
+    weight = (targets - times[k]) / (times[k + 1] - times[k])
+    return k, np.clip(weight, 0.0, 1.0)
+
+
+class Interpolator(object):
+    """Stream of interpolated frames holding at most two writes in memory.
+
+    ``times`` are the written times (sorted, as numbers) and ``read(i)``
+    returns the dict of fields of the ``i``-th one.
+    """
+
+    def __init__(self, times, read):
+        self.times = np.asarray(times, dtype=float)
+        self.read = read
+        self._loaded = {}
+
+    def _get(self, i):
+        if i not in self._loaded:
+            self._loaded[i] = self.read(i)
+        return self._loaded[i]
+
+    def fields(self, k, weight):
+        """Fields at ``(1 - weight) * write[k] + weight * write[k + 1]``."""
+        for i in list(self._loaded):
+            if i not in (k, k + 1):
+                del self._loaded[i]
+        left = self._get(k)
+        if weight == 0.0 or k + 1 >= self.times.size:
+            return left
+        right = self._get(k + 1)
+        if weight == 1.0:
+            return right
+        out = {}
+        for name, a in left.items():
+            # a + weight * (b - a), with a single temporary
+            value = np.subtract(right[name], a, dtype=np.result_type(a, 1.0))
+            value *= weight
+            value += a
+            out[name] = value
+        return out
+
+    def at(self, time):
+        """Fields at any time between the first and the last write."""
+        k, weight = brackets(self.times, [time])
+        return self.fields(int(k[0]), float(weight[0]))
+
+    def resample(self, nframes):
+        """Yield ``(time, fields)`` for ``nframes`` uniformly spaced times."""
+        targets = uniform_times(self.times, nframes)
+        ks, weights = brackets(self.times, targets)
+        for time, k, weight in zip(targets, ks, weights):
+            yield time, self.fields(int(k), float(weight))
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    validate
+    ~~~~~~~~
+
+    Validation metrics of the tutorials that ship reference data under
+    ``source/``.
+
+    The pairs of reference and sampled curves are taken from the same
+    ``source/gnuplot/gnuplot_script`` rendered by :mod:`plotsamples`: in every
+    window, each curve read from ``postProcessing`` is compared with each curve
+    read from the ``source`` directory. The solution is linearly interpolated
+    onto the reference coordinates and the L2 (root mean square) and Linf
+    errors are reported, one row per pair.
+
+    Usage::
+
+        python validate.py ../../../BuildIn
+        python validate.py ../../../BuildIn --csv metrics.csv --max-linf 0.05
+
+    With ``--max-linf`` the exit status is 1 when any pair exceeds the
+    tolerance, so the script can be used as a regression check.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import csv
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+import plotsamples
+import sampledata
+
+COLUMNS = ['case', 'figure', 'reference', 'solution', 'points', 'L2', 'Linf']
+
+
+def _is_solution(curve):
+    return 'postProcessing' in curve.filename.replace('\\', '/').split('/')
+
+
+def _monotonic(values):
+    steps = np.diff(values)
+    return steps.size > 0 and (np.all(steps > 0) or np.all(steps < 0))
+
+
+def _curve_data(curve, searchdirs):
+    path = plotsamples.find_data(curve.filename, searchdirs)
+    if path is None:
+        return None
+    _, data = sampledata.load_sample(path)
+    return data[:, curve.using[0] - 1], data[:, curve.using[1] - 1]
+
+
+def compare(reference, solution):
+    """Return ``(points, L2, Linf)`` of ``solution`` against ``reference``.
+
+    Both are ``(x, y)`` pairs of arrays as drawn in the plot. The sampled
+    coordinate is the axis along which the solution is monotonic (a sample
+    line is written in order), the other axis is the compared value.
+    """
+    (sx, sy), (rx, ry) = solution, reference
+    if not _monotonic(sx) and _monotonic(sy):
+        sx, sy, rx, ry = sy, sx, ry, rx
+    order = np.argsort(sx, kind='mergesort')
+    sx, sy = np.asarray(sx)[order], np.asarray(sy)[order]
+    inside = (rx >= sx[0]) & (rx <= sx[-1])
+    if not np.any(inside):
+        return 0, np.nan, np.nan
+    error = np.interp(rx[inside], sx, sy) - ry[inside]
+    return (int(inside.sum()), float(np.sqrt(np.mean(error ** 2))),
+            float(np.max(np.abs(error))))
+
+
+def validate_case(script):
+    """Compute the metrics of one gnuplot script (worker of the pool)."""
+    sourcedir = os.path.dirname(os.path.dirname(os.path.abspath(script)))
+    casename = os.path.basename(os.path.dirname(sourcedir))
+    searchdirs = plotsamples.case_dirs(sourcedir)
+    rows, missing = [], []
+    for fig in plotsamples.parse_gnuplot_script(script):
+        references = [c for c in fig.curves if not _is_solution(c)]
+        solutions = [c for c in fig.curves if _is_solution(c)]
+        for sol in solutions:
+            sol_data = _curve_data(sol, searchdirs)
+            if sol_data is None:
+                missing.append(sol.filename)
+                continue
+            for ref in references:
+                ref_data = _curve_data(ref, searchdirs)
+                if ref_data is None:
+                    missing.append(ref.filename)
+                    continue
+                points, l2, linf = compare(ref_data, sol_data)
+                rows.append([casename, fig.index,
+                             os.path.basename(ref.filename),
+                             os.path.basename(sol.filename),
+                             points, l2, linf])
+    return script, rows, missing
+
+
+def print_table(rows):
+    cells = [COLUMNS] + [row[:5] + ['%.4g' % row[5], '%.4g' % row[6]]
+                         for row in rows]
+    widths = [max(len(str(row[i])) for row in cells)
+              for i in range(len(COLUMNS))]
+    for row in cells:
+        print('  '.join(str(cell).ljust(width)
+                        for cell, width in zip(row, widths)).rstrip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare sampled tutorial results with reference data.')
+    parser.add_argument('paths', nargs='+',
+                        help='gnuplot scripts or directories to search')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--csv', help='also write the table to this file')
+    parser.add_argument('--max-linf', type=float, default=None,
+                        help='fail when a Linf error exceeds this value')
+    opts = parser.parse_args(argv)
+
+    scripts = plotsamples.find_scripts(opts.paths)
+    rows = []
+    pool = Pool(opts.jobs)
+    try:
+        for script, case_rows, missing in pool.imap(validate_case, scripts):
+            for name in missing:
+                print('%s: data file not found: %s' % (script, name),
+                      file=sys.stderr)
+            rows += case_rows
+    finally:
+        pool.close()
+        pool.join()
+
+    print_table(rows)
+    if opts.csv:
+        with open(opts.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    if opts.max_linf is not None:
+        failed = [row for row in rows
+                  if not row[6] <= opts.max_linf]
+        for row in failed:
+            print('FAILED: %s figure %s (%s): Linf = %.4g'
+                  % (row[0], row[1], row[2], row[6]), file=sys.stderr)
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
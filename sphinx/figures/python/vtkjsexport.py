@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+    vtkjsexport
+    ~~~~~~~~~~~
+
+    Export of case surfaces (``postProcessing/surfaces``) to the vtk.js
+    scenes shown by ``_static/vtk_js/index.html?url=scenes/<case>/<time>``.
+
+    Full resolution surfaces of every time step would be hundreds of MB, so
+    the export
+
+    * decimates each geometry to a triangle budget by vertex clustering on a
+      3D grid (the cell size is searched once per geometry);
+    * quantises the coordinates and the fields to 16 (or 8) bit integers;
+      the coordinates are restored by the scale and position of the actor and
+      the colour range of the mapper is the quantised one, so the viewer needs
+      no change. The ranges of the fields are taken over all the time steps,
+      so the colours of the time steps match;
+    * writes the arrays deflated and named by their hash to the ``data``
+      directory of the case, shared by its time steps: the points and
+      triangles of a geometry are stored (and downloaded) once, a time step
+      only adds its fields and two small ``index.json``. A ``manifest.json``
+      lists the times, scenes, sizes and real field ranges.
+
+    All (case, time) pairs are exported by one process pool. A scene is
+    rewritten only when the hash of its input files or of the export options
+    changed; input files whose size and modification time are those of the
+    last export are not read or hashed again::
+
+        python vtkjsexport.py ../../../../cookbooks/singlepass -f T -f U
+        python vtkjsexport.py case1 case2 --triangles 20000 --bits 8 -j 8
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from multiprocessing import Pool
+
+import numpy as np
+
+import sampledata
+import vtkpolydata as vtp
+
+__all__ = ['Decimation', 'decimate', 'quantize', 'export_scene']
+
+OUTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                      'source', '_static', 'vtk_js', 'scenes')
+# cell size searches when decimating to the triangle budget
+SEARCH_STEPS = 16
+BLOCK = 1024 * 1024
+# directory of the shared arrays, from ``<case>/<time>/surface``
+DATA = 'data'
+BASEPATH = '../../' + DATA
+# vtk.js constants: ColorMode.MAP_SCALARS, ScalarMode.USE_POINT_FIELD_DATA
+# and USE_CELL_FIELD_DATA, Representation.SURFACE
+COLOR_MODE = 1
+SCALAR_MODE = {'point': 3, 'cell': 4}
+SURFACE = 2
+
+
+class Decimation(object):
+    """Triangles of a surface clustered on a grid of ``cellsize``.
+
+    ``cluster`` maps the original points to the new ones and ``cells`` the
+    new triangles to the original triangle they come from.
+    """
+
+    def __init__(self, points, triangles, cellsize=None):
+        self.cellsize = cellsize
+        if cellsize is None:
+            self.cluster = None
+            self.points, self.triangles = points, triangles
+            self.cells = None
+            return
+        lo = points.min(axis=0)
+        ijk = np.floor((points - lo) / cellsize).astype(np.int64)
+        dims = ijk.max(axis=0) + 1
+        key = (ijk[:, 0] * dims[1] + ijk[:, 1]) * dims[2] + ijk[:, 2]
+        _, cluster = np.unique(key, return_inverse=True)
+        self.cluster = cluster.ravel()
+        counts = np.bincount(self.cluster)
+        self.points = np.stack([np.bincount(self.cluster, weights=points[:, i])
+                                / counts for i in range(3)], axis=1)
+        tri = self.cluster[triangles]
+        keep = np.flatnonzero((tri[:, 0] != tri[:, 1]) &
+                              (tri[:, 1] != tri[:, 2]) &
+                              (tri[:, 0] != tri[:, 2]))
+        # one triangle per set of clusters, with its original orientation
+        _, first = np.unique(np.sort(tri[keep], axis=1), axis=0,
+                             return_index=True)
+        self.cells = keep[np.sort(first)]
+        self.triangles = tri[self.cells]
+        self._counts = counts
+
+    @property
+    def ntriangles(self):
+        return len(self.triangles)
+
+    def remap(self, field, location='point'):
+        """Values of a field of the original surface on this one."""
+        field = np.asarray(field, dtype=float)
+        if self.cluster is None:
+            return field
+        if location == 'cell':
+            return field[self.cells]
+        if field.ndim == 1:
+            return np.bincount(self.cluster, weights=field) / self._counts
+        return np.stack([np.bincount(self.cluster, weights=field[:, i])
+                         / self._counts for i in range(field.shape[1])],
+                        axis=1)
+
+
+def decimate(points, triangles, budget):
+    """Finest :class:`Decimation` with at most ``budget`` triangles."""
+    if len(triangles) <= budget:
+        return Decimation(points, triangles)
+    diag = float(np.linalg.norm(points.max(axis=0) - points.min(axis=0)))
+    # geometric bisection of the cell size, fewer triangles when larger
+    lo, hi = diag / (8.0 * np.sqrt(len(triangles))), diag / 2.0
+    best = Decimation(points, triangles, hi)
+    for _ in range(SEARCH_STEPS):
+        mid = np.sqrt(lo * hi)
+        level = Decimation(points, triangles, mid)
+        if level.ntriangles <= budget:
+            best, hi = level, mid
+        else:
+            lo = mid
+    return best
+
+
+def quantize(values, vmin, vmax, bits=16):
+    """Integers of ``bits`` bits spanning ``[vmin, vmax]``."""
+    top = (1 << bits) - 1
+    scale = top / (vmax - vmin) if vmax > vmin else 0.0
+    q = np.rint((np.asarray(values, dtype=float) - vmin) * scale)
+    return np.clip(q, 0, top).astype(np.uint16 if bits > 8 else np.uint8)
+
+
+def _array(files, name, values, vtkClass='vtkDataArray'):
+    """vtk.js description of an array, its bytes added to ``files``."""
+    values = np.ascontiguousarray(values)
+    data = values.astype(values.dtype.newbyteorder('<')).tobytes()
+    digest = hashlib.md5(data).hexdigest()
+    files[digest] = data
+    return {
+        'vtkClass': vtkClass,
+        'name': name,
+        'numberOfComponents': values.shape[1] if values.ndim > 1 else 1,
+        'dataType': {'u1': 'Uint8Array', 'u2': 'Uint16Array',
+                     'u4': 'Uint32Array', 'f4': 'Float32Array'}[
+                         values.dtype.str[1:]],
+        'size': int(values.size),
+        'ref': {'encode': 'LittleEndian', 'basepath': BASEPATH,
+                'id': digest},
+    }
+
+
+def _magnitude(values):
+    return np.linalg.norm(values, axis=1) if values.ndim > 1 else values
+
+
+def _write(filename, data):
+    tmp = '%s.%d' % (filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, filename)
+
+
+def _write_arrays(datadir, files):
+    """Store the arrays not stored yet, return the bytes of all of them."""
+    size = 0
+    for digest, data in files.items():
+        filename = os.path.join(datadir, digest + '.gz')
+        if not os.path.exists(filename):
+            _write(filename, zlib.compress(data, 9))
+        size += os.path.getsize(filename)
+    return size
+
+
+def export_scene(dirname, name, level, fields, ranges, bits=16):
+    """Write the scene of a decimated surface to the directory ``dirname``.
+
+    ``fields`` maps names to ``(values, location)`` on ``level``, vectors
+    are exported as magnitudes; ``ranges`` are the real ranges of the fields.
+    The arrays go to the ``data`` directory next to ``dirname``, where the
+    points and triangles are found already when another time step of the
+    same geometry was exported. Returns the bytes of the scene without them.
+    """
+    geometry, files = {}, {}
+    points = level.points
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    top = float((1 << bits) - 1)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    qpoints = np.clip(np.rint((points - lo) / span * top), 0, top).astype(
+        np.uint16 if bits > 8 else np.uint8)
+    index = np.uint16 if len(points) <= 0xffff else np.uint32
+    polys = np.empty((level.ntriangles, 4), dtype=index)
+    polys[:, 0] = 3
+    polys[:, 1:] = level.triangles
+    dataset = {
+        'vtkClass': 'vtkPolyData',
+        'points': _array(geometry, '_points', qpoints, 'vtkPoints'),
+        'polys': _array(geometry, '_polys', polys, 'vtkCellArray'),
+        'pointData': {'vtkClass': 'vtkDataSetAttributes', 'arrays': []},
+        'cellData': {'vtkClass': 'vtkDataSetAttributes', 'arrays': []},
+    }
+    for field, (values, location) in sorted(fields.items()):
+        vmin, vmax = ranges[field]
+        dataset[location + 'Data']['arrays'].append({'data': _array(
+            files, field, quantize(_magnitude(values), vmin, vmax, bits))})
+
+    first = sorted(fields)[0] if fields else None
+    item = {
+        'name': name,
+        'type': 'httpDataSetReader',
+        'httpDataSetReader': {'url': 'surface'},
+        'actor': {'origin': [0, 0, 0], 'scale': list(span / top),
+                  'position': list(lo)},
+        'property': {'representation': SURFACE, 'edgeVisibility': 0,
+                     'opacity': 1},
+    }
+    if first is not None:
+        item['mapper'] = {
+            'colorByArrayName': first, 'colorMode': COLOR_MODE,
+            'scalarMode': SCALAR_MODE[fields[first][1]],
+            'scalarVisibility': True, 'scalarRange': [0, top],
+        }
+        item['lookupTable'] = {'hueRange': [0.666, 0.0]}
+    scene = {'version': 1, 'fetchGzip': True, 'background': [1, 1, 1],
+             'scene': [item]}
+
+    datadir = os.path.join(os.path.dirname(os.path.normpath(dirname)), DATA)
+    os.makedirs(datadir, exist_ok=True)
+    os.makedirs(os.path.join(dirname, 'surface'), exist_ok=True)
+    _write_arrays(datadir, geometry)
+    size = _write_arrays(datadir, files)
+    # the scene index last: a scene without it is incomplete
+    for path, data in (('surface/index.json', dataset),
+                       ('index.json', scene)):
+        data = json.dumps(data).encode('utf-8')
+        _write(os.path.join(dirname, path), data)
+        size += len(data)
+    return size
+
+
+def scene_arrays(dirname):
+    """Ids of the shared arrays the scene in ``dirname`` refers to."""
+    with open(os.path.join(dirname, 'surface', 'index.json')) as f:
+        dataset = json.load(f)
+    arrays = [dataset['points'], dataset['polys']]
+    for location in ('pointData', 'cellData'):
+        arrays += [array['data'] for array in dataset[location]['arrays']]
+    return set(array['ref']['id'] for array in arrays)
+
+
+# -- export of cases -----------------------------------------------------------
+
+class _SuffixFormat(object):
+    """Picklable ``name_fmt`` for the worker processes."""
+
+    def __init__(self, suffix):
+        self.suffix = suffix
+
+    def __call__(self, name):
+        return name + self.suffix
+
+
+def _input_stamp(path, fields, name_fmt, options):
+    """Hash of the options and of the size and mtime of the input files."""
+    stats = []
+    for field in fields:
+        stat = os.stat(os.path.join(path, name_fmt(field)))
+        stats.append([stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps([options, fields, stats], sort_keys=True)
+                        .encode('utf-8')).hexdigest()
+
+
+def _input_hash(path, fields, name_fmt, options):
+    sha = hashlib.sha1(json.dumps(options, sort_keys=True).encode('utf-8'))
+    for field in fields:
+        with open(os.path.join(path, name_fmt(field)), 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def _read(path, fields, surface):
+    return vtp.read_surface(path, fields, name_fmt=_SuffixFormat(
+        '_%s.vtk' % surface))
+
+
+def scan_time(item):
+    """Field ranges and input hash of one time directory (pool worker).
+
+    ``previous`` is the manifest entry of the last export of the time, its
+    hash and ranges are reused when the stamp of the input is unchanged.
+    """
+    case, time, fields, options, previous = item
+    path = os.path.join(case, 'postProcessing', 'surfaces', time)
+    name_fmt = _SuffixFormat('_%s.vtk' % options['surface'])
+    stamp = _input_stamp(path, fields, name_fmt, options)
+    if previous and previous.get('stamp') == stamp:
+        ranges = dict((field, tuple(rng))
+                      for field, rng in previous['ranges'].items())
+        return case, time, stamp, previous['hash'], ranges
+    digest = _input_hash(path, fields, name_fmt, options)
+    surface = _read(path, fields, options['surface'])
+    ranges = {}
+    for field in fields:
+        values = _magnitude(np.asarray(surface.fields[field], dtype=float))
+        ranges[field] = (float(np.nanmin(values)), float(np.nanmax(values)))
+    return case, time, stamp, digest, ranges
+
+
+# per worker process: geometry key -> Decimation
+_levels = {}
+
+
+def export_time(item):
+    """Export one time directory of a case (pool worker)."""
+    case, time, fields, options, ranges, dirname = item
+    path = os.path.join(case, 'postProcessing', 'surfaces', time)
+    surface = _read(path, fields, options['surface'])
+    level = _levels.get(surface.key)
+    if level is None:
+        level = _levels[surface.key] = decimate(
+            surface.points, surface.triangles, options['triangles'])
+    values = dict((field, (level.remap(surface.fields[field],
+                                       surface.location[field]),
+                           surface.location[field])) for field in fields)
+    size = export_scene(dirname, os.path.basename(os.path.normpath(case)),
+                        level, values, ranges, options['bits'])
+    return case, time, size, level.ntriangles
+
+
+def _case_name(case):
+    return os.path.basename(os.path.normpath(case))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Export case surfaces to compressed vtk.js scenes.')
+    parser.add_argument('cases', nargs='+', help='case directories')
+    parser.add_argument('-f', '--field', action='append', required=True,
+                        help='field to export (repeatable)')
+    parser.add_argument('--surface', default='zNormal',
+                        help='name of the surface (default: zNormal)')
+    parser.add_argument('--triangles', type=int, default=50000,
+                        help='triangle budget of a scene (default: 50000)')
+    parser.add_argument('--bits', type=int, choices=(8, 16), default=16,
+                        help='bits of the quantised arrays')
+    parser.add_argument('-o', '--outdir', default=OUTDIR,
+                        help='directory of the scenes')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    opts = parser.parse_args(argv)
+
+    options = {'surface': opts.surface, 'triangles': opts.triangles,
+               'bits': opts.bits}
+    old = {}
+    for case in opts.cases:
+        filename = os.path.join(opts.outdir, _case_name(case),
+                                'manifest.json')
+        old[case] = {}
+        if os.path.exists(filename):
+            with open(filename) as f:
+                old[case] = dict((entry['time'], entry)
+                                 for entry in json.load(f).get('times', []))
+    items = []
+    for case in opts.cases:
+        path = os.path.join(case, 'postProcessing', 'surfaces')
+        times = sampledata.time_dirs(path) if os.path.isdir(path) else []
+        if not times:
+            print('no surfaces in', path, file=sys.stderr)
+        items += [(case, time, opts.field, options, old[case].get(time))
+                  for time in times]
+
+    pool = Pool(opts.jobs)
+    try:
+        scans = pool.map(scan_time, items)
+        ranges, manifests = {}, {}
+        for case, time, stamp, digest, time_ranges in scans:
+            case_ranges = ranges.setdefault(case, {})
+            for field, (vmin, vmax) in time_ranges.items():
+                prev = case_ranges.get(field, (vmin, vmax))
+                case_ranges[field] = (min(prev[0], vmin), max(prev[1], vmax))
+        jobs = []
+        for case in opts.cases:
+            os.makedirs(os.path.join(opts.outdir, _case_name(case)),
+                        exist_ok=True)
+            manifests[case] = {
+                'fields': dict((field, {'range': list(rng)}) for field, rng
+                               in sorted(ranges.get(case, {}).items())),
+                'bits': opts.bits, 'times': [],
+            }
+        for case, time, stamp, digest, time_ranges in scans:
+            manifest = manifests[case]
+            # the ranges are part of the input: they set the quantisation
+            scene = hashlib.sha1((digest + json.dumps(
+                manifest['fields'], sort_keys=True)).encode()).hexdigest()
+            entry = {'time': time, 'url': time, 'input': scene,
+                     'stamp': stamp, 'hash': digest,
+                     'ranges': dict((field, list(rng)) for field, rng
+                                    in time_ranges.items())}
+            dirname = os.path.join(opts.outdir, _case_name(case), time)
+            previous = old[case].get(time)
+            if previous and previous.get('input') == scene and \
+                    os.path.exists(os.path.join(dirname, 'index.json')):
+                entry.update(bytes=previous['bytes'],
+                             triangles=previous['triangles'])
+            else:
+                jobs.append((case, time, opts.field, options,
+                             ranges[case], dirname))
+            manifest['times'].append(entry)
+        print('%d scenes to export, %d up to date'
+              % (len(jobs), len(scans) - len(jobs)))
+        done = {}
+        for case, time, size, ntriangles in pool.imap_unordered(export_time,
+                                                                jobs):
+            done[(case, time)] = (size, ntriangles)
+            print('%s %s: %d triangles, %.1f kB'
+                  % (_case_name(case), time, ntriangles, size / 1024.0))
+    finally:
+        pool.close()
+        pool.join()
+
+    for case, manifest in manifests.items():
+        outdir = os.path.join(opts.outdir, _case_name(case))
+        used = set()
+        for entry in manifest['times']:
+            if (case, entry['time']) in done:
+                entry['bytes'], entry['triangles'] = done[(case,
+                                                           entry['time'])]
+            used |= scene_arrays(os.path.join(outdir, entry['url']))
+        with open(os.path.join(outdir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        # arrays of geometries and fields no scene refers to any more
+        datadir = os.path.join(outdir, DATA)
+        for name in os.listdir(datadir) if os.path.isdir(datadir) else []:
+            if name.endswith('.gz') and name[:-3] not in used:
+                os.remove(os.path.join(datadir, name))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
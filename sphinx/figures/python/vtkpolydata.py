@@ -0,0 +1,643 @@
+# -*- coding: utf-8 -*-
+"""
+    vtkpolydata
+    ~~~~~~~~~~~
+
+    Reader of the surfaces written by OpenFOAM ``surfaces`` function objects
+    (``postProcessing/surfaces/<time>/<field>_<surface>.vtk``), replacing
+    ``sciPyFoam.postProcessing.cuttingPlane.Read_VTK_POLYDATA`` in the figure
+    scripts.
+
+    * legacy VTK in ASCII and BINARY format and XML ``.vtp`` (ascii, inline
+      base64 and appended data, optionally zlib compressed);
+    * the file is memory-mapped and every binary array is read with
+      ``np.frombuffer``, ASCII arrays with one ``np.fromstring`` call;
+    * all the requested fields of a file are taken in one pass, and the
+      geometry shared by the files of one time directory (or of all the time
+      directories of a static mesh) is transformed and triangulated only
+      once. A file read again, unchanged (same path, mtime and size), skips
+      the parsing and hashing of its geometry as well. The last
+      ``MAX_GEOMETRIES`` geometries are kept;
+    * ``coord2km`` and ``depthPositive`` are applied in place on the single
+      native copy of the coordinates.
+
+    Usage, as in ``animation.py``::
+
+        import vtkpolydata as vtp
+        triangles, T = vtp.Read_VTK_POLYDATA(datapath, 'T', name_fmt=name_fmt,
+                                             coord2km=True, depthPositive=True)
+        surface = vtp.read_surface(datapath, ['T', 'U'], name_fmt=name_fmt,
+                                   coord2km=True, depthPositive=True)
+        surface.triangulation, surface.fields['T'], surface.fields['U']
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import base64
+import hashlib
+import mmap
+import os
+import re
+import zlib
+
+import numpy as np
+
+__all__ = ['Surface', 'read_polydata', 'read_surface', 'Read_VTK_POLYDATA']
+
+# legacy VTK data types, binary legacy files are big endian
+LEGACY_TYPES = {
+    'bit': 'u1', 'unsigned_char': 'u1', 'char': 'i1',
+    'unsigned_short': '>u2', 'short': '>i2',
+    'unsigned_int': '>u4', 'int': '>i4',
+    'unsigned_long': '>u8', 'long': '>i8', 'vtkIdType': '>i4',
+    'vtktypeint64': '>i8', 'vtktypeint32': '>i4',
+    'float': '>f4', 'double': '>f8',
+}
+# XML VTK data types, without the byte order
+XML_TYPES = {
+    'Int8': 'i1', 'UInt8': 'u1', 'Int16': 'i2', 'UInt16': 'u2',
+    'Int32': 'i4', 'UInt32': 'u4', 'Int64': 'i8', 'UInt64': 'u8',
+    'Float32': 'f4', 'Float64': 'f8',
+}
+_LEGACY_KEYWORD = re.compile(rb'\n\s*[A-Za-z_]')
+
+# geometry key -> Surface without fields, least recently used first, see
+# read_surface
+_geometry_cache = {}
+# (path, mtime, size, coord2km, depthPositive) -> geometry key of the file
+_file_keys = {}
+MAX_GEOMETRIES = 4
+MAX_FILES = 1024
+
+
+class Surface(object):
+    """Triangulated surface and its fields.
+
+    ``points`` is ``(npoints, 3)``, ``triangles`` ``(ntriangles, 3)`` indices
+    into ``points``, ``fields`` maps names to arrays of ``npoints`` (point
+    data) or ``ntriangles`` (cell data, repeated for the triangles of split
+    polygons) values. ``key`` identifies the geometry, to cache derived data.
+    """
+
+    def __init__(self, points, triangles, key, axes=(0, 1)):
+        self.points = points
+        self.triangles = triangles
+        self.key = key
+        self.axes = axes
+        self.fields = {}
+        self.location = {}
+        self.poly = None
+        self._base = None
+        self._triangulation = None
+
+    @property
+    def x(self):
+        return self.points[:, self.axes[0]]
+
+    @property
+    def y(self):
+        return self.points[:, self.axes[1]]
+
+    @property
+    def triangulation(self):
+        """``matplotlib.tri.Triangulation`` of the plane of the surface.
+
+        Shared by all the surfaces of one geometry, so that caches keyed by
+        the triangulation (level of detail, glyphs, probes) are reused.
+        """
+        if self._base is not None:
+            return self._base.triangulation
+        if self._triangulation is None:
+            from matplotlib.tri import Triangulation
+            self._triangulation = Triangulation(self.x, self.y,
+                                                self.triangles)
+        return self._triangulation
+
+    def with_fields(self, fields, location):
+        surface = Surface(self.points, self.triangles, self.key, self.axes)
+        surface.poly = self.poly
+        surface._base = self
+        surface.fields = fields
+        surface.location = location
+        return surface
+
+
+class _RawPolyData(object):
+    """Arrays as found in a file, before any transform."""
+
+    def __init__(self):
+        self.points = None
+        self.polys = None       # (connectivity, offsets) or (ntri, 3)
+        self.point_data = {}
+        self.cell_data = {}
+        self.digest = None
+
+
+def _fan_triangulate(connectivity, starts, counts):
+    """Split polygons into triangle fans, vectorised.
+
+    Returns the triangles and, for each triangle, the index of its polygon.
+    """
+    ntri = np.maximum(counts - 2, 0)
+    poly = np.repeat(np.arange(counts.size), ntri)
+    # j = 1 .. counts-2 within every polygon
+    first = np.cumsum(ntri) - ntri
+    j = np.arange(poly.size) - np.repeat(first, ntri) + 1
+    base = starts[poly]
+    triangles = np.stack([connectivity[base], connectivity[base + j],
+                          connectivity[base + j + 1]], axis=1)
+    return triangles, poly
+
+
+def _walk(step, pos, end, mark=None):
+    """Follow the chains of cell headers from ``pos`` up to ``end``, all at
+    once; the first positions at or past ``end``."""
+    pos = pos.copy()
+    active = np.flatnonzero(pos < end)
+    while active.size:
+        p = pos[active]
+        if mark is not None:
+            mark[p] = True
+        pos[active] = p + step[p]
+        active = active[pos[active] < end[active]]
+    return pos
+
+
+def _cell_starts(cells, count, block=1024, width=16):
+    """Positions of the headers of ``count`` cells packed as
+    ``n, v1 .. vn, n, ...``, vectorised; None if the layout is not
+    consistent.
+
+    The chains of headers starting at the first ``width`` positions of every
+    block of ``block`` values are followed together. The first header of a
+    block is one of them, and the chain it starts gives the first header of
+    the next block; the true chain is then followed once more, marking the
+    headers.
+    """
+    size = cells.size
+    step = np.maximum(cells, 0) + 1
+    nblocks = max(-(-size // block), 1)
+    first = np.arange(nblocks) * block
+    end = np.minimum(first + block, size)
+    lanes = (first[:, None] + np.arange(width)).ravel()
+    exits = _walk(step, lanes, np.repeat(end, width)).reshape(nblocks, width)
+    entry = np.zeros(nblocks, dtype=np.intp)
+    for b in range(nblocks - 1):
+        offset = entry[b] - first[b]
+        if 0 <= offset < width:
+            entry[b + 1] = exits[b, offset]
+        else:
+            # a cell larger than width, or spanning the whole block
+            pos = entry[b]
+            while pos < end[b]:
+                pos += step[pos]
+            entry[b + 1] = pos
+    head = np.zeros(size, dtype=bool)
+    _walk(step, entry, end, head)
+    starts = np.flatnonzero(head)
+    if starts.size != count or (cells[starts] < 0).any() or \
+            count and starts[-1] + step[starts[-1]] != size:
+        return None
+    return starts
+
+
+def _digest(*arrays):
+    sha = hashlib.sha1()
+    for array in arrays:
+        sha.update(memoryview(np.ascontiguousarray(array)).cast('B'))
+    return sha.hexdigest()
+
+
+# -- legacy VTK --------------------------------------------------------------
+
+class _LegacyReader(object):
+
+    def __init__(self, buf, binary, wanted):
+        self.buf = buf
+        self.binary = binary
+        self.pos = 0
+        self.wanted = wanted
+
+    def line(self):
+        while True:
+            end = self.buf.find(b'\n', self.pos)
+            if end < 0:
+                end = len(self.buf)
+            text = self.buf[self.pos:end].strip()
+            self.pos = end + 1
+            if text or self.pos >= len(self.buf):
+                return text.decode('ascii', 'replace')
+
+    def array(self, dtype, count, skip=False):
+        """Read ``count`` values at the cursor, a view if binary."""
+        if self.binary:
+            dtype = np.dtype(dtype)
+            data = None if skip else np.frombuffer(
+                self.buf, dtype=dtype, count=count, offset=self.pos)
+            self.pos += dtype.itemsize * count
+            # binary blocks are followed by a newline
+            if self.pos < len(self.buf) and self.buf[self.pos:self.pos + 1] \
+                    == b'\n':
+                self.pos += 1
+            return data
+        match = _LEGACY_KEYWORD.search(self.buf, self.pos)
+        end = match.start() + 1 if match else len(self.buf)
+        data = None
+        if not skip:
+            text = self.buf[self.pos:end].decode('ascii')
+            data = np.fromstring(text, sep=' ', dtype=np.float64)
+            if data.size != count:
+                raise IOError('expected %d values, found %d'
+                              % (count, data.size))
+            data = data.astype(np.dtype(dtype).newbyteorder('='),
+                               copy=False)
+        self.pos = end
+        return data
+
+    def attributes(self, size, target):
+        """Read a POINT_DATA or CELL_DATA block into ``target``."""
+        while self.pos < len(self.buf):
+            start = self.pos
+            words = self.line().split()
+            if not words:
+                break
+            keyword = words[0].upper()
+            if keyword in ('SCALARS', 'VECTORS', 'NORMALS'):
+                name, dtype = words[1], LEGACY_TYPES[words[2]]
+                ncomp = 3 if keyword != 'SCALARS' else \
+                    (int(words[3]) if len(words) > 3 else 1)
+                if keyword == 'SCALARS':
+                    lookup = self.line()
+                    if not lookup.upper().startswith('LOOKUP_TABLE'):
+                        raise IOError('LOOKUP_TABLE expected: %s' % lookup)
+                self._field(target, name, dtype, size, ncomp)
+            elif keyword == 'FIELD':
+                for _ in range(int(words[2])):
+                    name, ncomp, ntuple, dtype = self.line().split()
+                    self._field(target, name, LEGACY_TYPES[dtype],
+                                int(ntuple), int(ncomp))
+            elif keyword == 'LOOKUP_TABLE':
+                self.array('>f4', 4 * int(words[2]), skip=True)
+            else:
+                # next block (POINT_DATA/CELL_DATA)
+                self.pos = start
+                return
+
+    def _field(self, target, name, dtype, ntuple, ncomp):
+        skip = self.wanted is not None and name not in self.wanted
+        data = self.array(dtype, ntuple * ncomp, skip=skip)
+        if data is not None:
+            target[name] = data.reshape(ntuple, ncomp) if ncomp > 1 else data
+
+
+def _read_legacy(buf, wanted, geometry):
+    header_end = 0
+    for _ in range(4):
+        header_end = buf.find(b'\n', header_end) + 1
+    header = buf[:header_end].decode('ascii', 'replace').split('\n')
+    binary = header[2].strip().upper() == 'BINARY'
+    if not header[3].upper().startswith('DATASET POLYDATA'):
+        raise IOError('not a POLYDATA file: %s' % header[3])
+    reader = _LegacyReader(buf, binary, wanted)
+    reader.pos = header_end
+    raw = _RawPolyData()
+    while reader.pos < len(buf):
+        words = reader.line().split()
+        if not words:
+            break
+        keyword = words[0].upper()
+        if keyword == 'POINTS':
+            npoints = int(words[1])
+            points = reader.array(LEGACY_TYPES[words[2]], 3 * npoints,
+                                  skip=not geometry)
+            if points is not None:
+                raw.points = points.reshape(-1, 3)
+        elif keyword in ('POLYGONS', 'TRIANGLE_STRIPS', 'LINES',
+                         'VERTICES'):
+            count, size = int(words[1]), int(words[2])
+            is_polys = keyword == 'POLYGONS'
+            nextline = buf[reader.pos:reader.pos + 16].lstrip()
+            if nextline.upper().startswith(b'OFFSETS'):
+                # VTK >= 5.1: OFFSETS and CONNECTIVITY arrays
+                skip = not (is_polys and geometry)
+                dtype = LEGACY_TYPES[reader.line().split()[1]]
+                offsets = reader.array(dtype, count, skip=skip)
+                dtype = LEGACY_TYPES[reader.line().split()[1]]
+                connectivity = reader.array(dtype, size, skip=skip)
+                if not skip:
+                    offsets = np.asarray(offsets, dtype=np.intp)
+                    raw.polys = (np.asarray(connectivity, dtype=np.intp),
+                                 offsets[:-1], np.diff(offsets))
+                continue
+            cells = reader.array(LEGACY_TYPES['int'], size,
+                                 skip=not (is_polys and geometry))
+            if cells is None:
+                continue
+            cells = np.asarray(cells, dtype=np.intp)
+            if size == 4 * count and np.all(cells[::4] == 3):
+                raw.polys = cells.reshape(count, 4)[:, 1:]
+            else:
+                # mixed polygons
+                heads = _cell_starts(cells, count)
+                if heads is not None:
+                    raw.polys = (cells, heads + 1, cells[heads])
+                    continue
+                # malformed: find the starts one by one
+                counts = np.empty(count, dtype=np.intp)
+                starts = np.empty(count, dtype=np.intp)
+                pos = 0
+                for i in range(count):
+                    counts[i] = cells[pos]
+                    starts[i] = pos + 1
+                    pos += cells[pos] + 1
+                raw.polys = (cells, starts, counts)
+        elif keyword == 'POINT_DATA':
+            reader.attributes(int(words[1]), raw.point_data)
+        elif keyword == 'CELL_DATA':
+            reader.attributes(int(words[1]), raw.cell_data)
+        elif keyword == 'METADATA':
+            while reader.line():
+                pass
+        else:
+            raise IOError('unknown legacy VTK keyword: %s' % words[0])
+    return raw
+
+
+# -- XML VTK -----------------------------------------------------------------
+
+_XML_ATTR = re.compile(rb'(\w+)="([^"]*)"')
+_XML_ARRAY = re.compile(
+    rb'<DataArray\b([^>]*?)(/>|>(.*?)</DataArray>)', re.S)
+_XML_SECTION = re.compile(
+    rb'<(Points|Polys|PointData|CellData)\b[^>]*?(/>|>(.*?)</\1>)', re.S)
+
+
+def _attrs(text):
+    return dict((k.decode(), v.decode()) for k, v in _XML_ATTR.findall(text))
+
+
+class _XMLReader(object):
+
+    def __init__(self, buf):
+        self.buf = buf
+        appended = buf.find(b'<AppendedData')
+        self.header = buf[:appended] if appended >= 0 else buf
+        start = buf.find(b'<VTKFile')
+        root = _attrs(buf[start:buf.find(b'>', start)])
+        if root.get('type') != 'PolyData':
+            raise IOError('not a PolyData file: %s' % root.get('type'))
+        self.order = '<' if root.get('byte_order', 'LittleEndian') == \
+            'LittleEndian' else '>'
+        self.header_type = np.dtype(self.order + XML_TYPES[
+            root.get('header_type', 'UInt32')])
+        self.compressed = 'compressor' in root
+        self.appended = None
+        if appended >= 0:
+            tag_end = buf.find(b'>', appended)
+            self.appended_encoding = _attrs(
+                buf[appended:tag_end]).get('encoding', 'raw')
+            self.appended = buf.find(b'_', tag_end) + 1
+
+    def sections(self):
+        return dict((m.group(1).decode(), m.group(3) or b'')
+                    for m in _XML_SECTION.finditer(self.header))
+
+    def arrays(self, section):
+        for m in _XML_ARRAY.finditer(section):
+            yield _attrs(m.group(1)), m.group(3) or b''
+
+    def decode(self, attrs, text, skip=False):
+        dtype = np.dtype(self.order + XML_TYPES[attrs['type']])
+        ncomp = int(attrs.get('NumberOfComponents', 1))
+        fmt = attrs.get('format', 'ascii')
+        if skip:
+            return None
+        if fmt == 'ascii':
+            data = np.fromstring(text.decode('ascii'), sep=' ')
+            data = data.astype(dtype.newbyteorder('='), copy=False)
+        elif fmt == 'binary':
+            data = np.frombuffer(self._binary(text.strip()), dtype=dtype)
+        elif fmt == 'appended':
+            data = np.frombuffer(self._appended(int(attrs['offset'])),
+                                 dtype=dtype)
+        else:
+            raise IOError('unknown DataArray format: %s' % fmt)
+        return data.reshape(-1, ncomp) if ncomp > 1 else data
+
+    def _header_values(self, raw, count):
+        return np.frombuffer(raw, dtype=self.header_type, count=count)
+
+    def _decompress(self, header, payload):
+        nblocks = int(header[0])
+        sizes = header[3:3 + nblocks]
+        out, pos = [], 0
+        for size in sizes:
+            out.append(zlib.decompress(payload[pos:pos + int(size)]))
+            pos += int(size)
+        return b''.join(out)
+
+    def _binary(self, text):
+        hsize = self.header_type.itemsize
+        if self.compressed:
+            first = base64.b64decode(text[:_b64len(3 * hsize)])
+            nblocks = int(self._header_values(first, 1)[0])
+            hlen = _b64len((3 + nblocks) * hsize)
+            header = self._header_values(base64.b64decode(text[:hlen]),
+                                         3 + nblocks)
+            return self._decompress(header, base64.b64decode(text[hlen:]))
+        hlen = _b64len(hsize)
+        if text[hlen - 1:hlen] == b'=':
+            # header and data encoded separately
+            return base64.b64decode(text[hlen:])
+        return base64.b64decode(text)[hsize:]
+
+    def _appended(self, offset):
+        hsize = self.header_type.itemsize
+        start = self.appended + offset
+        if self.appended_encoding == 'base64':
+            end = self.buf.find(b'\n', start)
+            end = self.buf.find(b'</AppendedData', start) if end < 0 else end
+            return self._binary(self.buf[start:end].strip())
+        if self.compressed:
+            nblocks = int(self._header_values(
+                self.buf[start:start + hsize], 1)[0])
+            hlen = (3 + nblocks) * hsize
+            header = self._header_values(self.buf[start:start + hlen],
+                                         3 + nblocks)
+            size = int(np.sum(header[3:]))
+            return self._decompress(
+                header, self.buf[start + hlen:start + hlen + size])
+        nbytes = int(self._header_values(self.buf[start:start + hsize], 1)[0])
+        return memoryview(self.buf)[start + hsize:start + hsize + nbytes]
+
+
+def _b64len(nbytes):
+    return (nbytes + 2) // 3 * 4
+
+
+def _read_xml(buf, wanted, geometry):
+    reader = _XMLReader(buf)
+    sections = reader.sections()
+    raw = _RawPolyData()
+    if geometry:
+        for attrs, text in reader.arrays(sections.get('Points', b'')):
+            raw.points = reader.decode(attrs, text).reshape(-1, 3)
+        polys = {}
+        for attrs, text in reader.arrays(sections.get('Polys', b'')):
+            polys[attrs.get('Name')] = np.asarray(reader.decode(attrs, text),
+                                                  dtype=np.intp)
+        connectivity, offsets = polys['connectivity'], polys['offsets']
+        starts = np.concatenate(([0], offsets[:-1]))
+        counts = offsets - starts
+        if counts.size and np.all(counts == 3):
+            raw.polys = connectivity.reshape(-1, 3)
+        else:
+            raw.polys = (connectivity, starts, counts)
+    for name, target in (('PointData', raw.point_data),
+                         ('CellData', raw.cell_data)):
+        for attrs, text in reader.arrays(sections.get(name, b'')):
+            field = attrs.get('Name')
+            skip = wanted is not None and field not in wanted
+            data = reader.decode(attrs, text, skip=skip)
+            if data is not None:
+                target[field] = data
+    return raw
+
+
+# -- public API --------------------------------------------------------------
+
+def read_polydata(filename, fields=None, geometry=True):
+    """Read the raw arrays of a legacy ``.vtk`` or XML ``.vtp`` file.
+
+    ``fields`` restricts the point and cell data that are converted (all by
+    default), ``geometry=False`` skips the points and polygons. Returns a
+    :class:`_RawPolyData` with views into the memory-mapped file where
+    possible.
+    """
+    with open(filename, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    wanted = None if fields is None else set(fields)
+    if buf[:5] == b'<?xml' or buf.find(b'<VTKFile', 0, 512) >= 0:
+        return _read_xml(buf, wanted, geometry)
+    return _read_legacy(buf, wanted, geometry)
+
+
+def _plane_axes(points):
+    """Axes of the plane of a cutting plane: drop the thinnest extent."""
+    extent = points.max(axis=0) - points.min(axis=0) if points.size else \
+        np.ones(3)
+    axes = [i for i in range(3) if i != int(np.argmin(extent))]
+    return tuple(axes)
+
+
+def _build_geometry(raw, coord2km, depthPositive):
+    # the only copy of the coordinates: native float64, transformed in place
+    points = np.array(raw.points, dtype=np.float64)
+    if isinstance(raw.polys, tuple):
+        triangles, poly = _fan_triangulate(*raw.polys)
+    else:
+        triangles = np.ascontiguousarray(raw.polys, dtype=np.int32)
+        poly = None
+    axes = _plane_axes(points)
+    if coord2km:
+        points /= 1000.0
+    if depthPositive:
+        points[:, axes[1]] *= -1
+    surface = Surface(points, triangles, key=None, axes=axes)
+    surface.poly = poly
+    return surface
+
+
+def _cached_geometry(key):
+    base = _geometry_cache.pop(key, None)
+    if base is not None:
+        # most recently used last
+        _geometry_cache[key] = base
+    return base
+
+
+def _remember(table, key, value, size):
+    table.pop(key, None)
+    table[key] = value
+    while len(table) > size:
+        del table[next(iter(table))]
+
+
+def read_surface(datapath, fields, name_fmt=None, coord2km=False,
+                 depthPositive=False):
+    """Read ``fields`` of a surface into a :class:`Surface`.
+
+    ``datapath`` is either one file holding all the fields, or a time
+    directory in which the file of every field is ``name_fmt(field)``
+    (e.g. ``lambda name: name + '_zNormal.vtk'``). Files are memory-mapped
+    and parsed once, and the geometry is shared with every other surface
+    read with the same points and polygons.
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    if os.path.isdir(datapath):
+        if name_fmt is None:
+            raise ValueError('name_fmt is required to read a directory')
+        groups = {}
+        for name in fields:
+            groups.setdefault(os.path.join(datapath, name_fmt(name)),
+                              []).append(name)
+    else:
+        groups = {datapath: list(fields)}
+
+    base, values, location = None, {}, {}
+    for filename, names in groups.items():
+        if base is None:
+            # unchanged file already read: no parsing nor hashing
+            stat = os.stat(filename)
+            file_key = (os.path.abspath(filename), stat.st_mtime_ns,
+                        stat.st_size, bool(coord2km), bool(depthPositive))
+            key = _file_keys.get(file_key)
+            if key is not None:
+                base = _cached_geometry(key)
+        # the files of one surface share the geometry: parse it only once
+        raw = read_polydata(filename, names, geometry=base is None)
+        if base is None:
+            key = (_digest(raw.points, *(raw.polys if isinstance(
+                raw.polys, tuple) else (raw.polys,))),
+                bool(coord2km), bool(depthPositive))
+            base = _cached_geometry(key)
+            if base is None:
+                base = _build_geometry(raw, coord2km, depthPositive)
+                base.key = key
+                _remember(_geometry_cache, key, base, MAX_GEOMETRIES)
+            _remember(_file_keys, file_key, key, MAX_FILES)
+        for name in names:
+            if name in raw.point_data:
+                data, where = raw.point_data[name], 'point'
+            elif name in raw.cell_data:
+                data, where = raw.cell_data[name], 'cell'
+                if base.poly is not None:
+                    data = data[base.poly]
+            else:
+                raise KeyError('field %s not found in %s' % (name, filename))
+            # native byte order, the only copy of the values
+            values[name] = np.array(data, dtype=data.dtype.newbyteorder('='))
+            location[name] = where
+    return base.with_fields(values, location)
+
+
+def Read_VTK_POLYDATA(datapath, fieldname, name_fmt=None, coord2km=False,
+                      depthPositive=False):
+    """Drop-in replacement of ``sciPyFoam``'s reader.
+
+    Returns ``(triangulation, field)`` for one field name, or
+    ``(triangulation, {name: field})`` for a list of names read in one pass.
+    """
+    surface = read_surface(datapath, fieldname, name_fmt=name_fmt,
+                           coord2km=coord2km, depthPositive=depthPositive)
+    if isinstance(fieldname, str):
+        return surface.triangulation, surface.fields[fieldname]
+    return surface.triangulation, surface.fields
+
+
+def clear_cache():
+    """Forget the cached geometries."""
+    _geometry_cache.clear()
+    _file_keys.clear()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+    latexchapters
+    ~~~~~~~~~~~~~
+
+    Build the PDF one category (``incompressible``, ``multiphase``, ...) at a
+    time, the categories in parallel::
+
+        python latexchapters.py              # build/latex/*_<category>.pdf
+        python latexchapters.py -j 4 incompressible
+        make latexchapters
+
+    Every category listed as ``<category>/index`` in the toctree of
+    ``source/index.rst`` gets its own entry in ``latex_documents`` (see
+    ``SPHINX_LATEX_CHAPTERS`` in ``conf.py``), plus a back matter unit with
+    the change log, so a single ``sphinx-build -b latex`` run, sharing
+    ``build/doctrees`` with ``make latex``, writes one ``.tex`` per unit.
+    Every unit has the bibliography as an appendix, so its citations
+    resolve. Each is then compiled by its own ``latexmk`` process. latexmk
+    keeps the ``.aux``/``.toc`` files and an MD5 database of the inputs
+    (``.fdb_latexmk``) in ``build/latex``, so an unchanged chapter costs
+    nothing and an edited one only the xelatex passes it needs.
+
+    The full book (``<latex_main>_chapters.pdf``) is merged from the unit
+    PDFs with ``pdfpages``: one title page and table of contents, the body
+    of every chapter (without its own title page, table of contents and
+    bibliography, whose pages the units write in their ``.aux``), then the
+    change log and the references. This takes a short xelatex run instead
+    of compiling the whole book again.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+__all__ = ['chapters', 'write_latex', 'compile_tex', 'page_ranges', 'merge']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCEDIR = os.path.join(HERE, 'source')
+LATEX_MAIN = 'OpenFOAM算例详解_latest'  # html_context['latex_main']
+# latex_documents[0] of conf.py
+TITLE = 'OpenFOAM算例详解 Manual'
+AUTHOR = '成员姓名+主要贡献者姓名'
+# unit of the change log and the references, see conf.py
+BACKMATTER = 'backmatter'
+BACKMATTER_TITLES = ('Change Log', '参考文献')
+LATEXMK = ['latexmk', '-pdfxe', '-silent', '-interaction=nonstopmode',
+           '-halt-on-error']
+
+_ENTRY = re.compile(r'^\s+([^\s/]+)/index(?:\.rst)?\s*$')
+_TITLE = re.compile(r'^(\S.*)\n(=+)\s*$', re.M)
+# written in the .aux of the units by the preamble of conf.py
+_MARK = re.compile(r'^%latexchapters (front|body) (\d+)\s*$', re.M)
+_SPECIALS = re.compile(r'[\\{}$&#^_%~]')
+_ESCAPES = {'\\': r'\textbackslash{}', '^': r'\textasciicircum{}',
+            '~': r'\textasciitilde{}'}
+
+MERGE = r'''\documentclass[a4paper]{ctexrep}
+\usepackage{pdfpages}
+\usepackage{bookmark}
+\title{%(title)s}
+\author{%(author)s}
+\date{}
+\begin{document}
+\pagenumbering{roman}
+\maketitle
+\tableofcontents
+\clearpage
+\pagenumbering{arabic}
+%(pages)s
+\end{document}
+'''
+
+
+def chapters(sourcedir=SOURCEDIR):
+    """``[(category, title), ...]`` in the order of the master toctree."""
+    with open(os.path.join(sourcedir, 'index.rst'), encoding='utf-8') as f:
+        names = [m.group(1) for m in map(_ENTRY.match, f) if m]
+    found = []
+    for name in names:
+        index = os.path.join(sourcedir, name, 'index.rst')
+        if not os.path.exists(index):
+            continue
+        with open(index, encoding='utf-8-sig') as f:
+            title = _TITLE.search(f.read())
+        found.append((name, title.group(1).strip() if title else name))
+    return found
+
+
+def write_latex(units, outdir, sphinxbuild='sphinx-build', options=()):
+    """Write the ``.tex`` of every unit in one build."""
+    env = dict(os.environ, SPHINX_LATEX_CHAPTERS=json.dumps(units))
+    command = sphinxbuild.split() + [
+        '-b', 'latex', '-d', os.path.join(os.path.dirname(outdir), 'doctrees'),
+    ] + list(options) + [SOURCEDIR, outdir]
+    return subprocess.call(command, cwd=HERE, env=env)
+
+
+def compile_tex(outdir, jobname):
+    """Run latexmk on ``<jobname>.tex``, return ``(jobname, returncode)``."""
+    code = subprocess.call(LATEXMK + [jobname + '.tex'], cwd=outdir,
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+    return jobname, code
+
+
+def _tex_escape(text):
+    """``text`` safe in a LaTeX argument, commas included."""
+    text = _SPECIALS.sub(lambda m: _ESCAPES.get(m.group(0),
+                                                '\\' + m.group(0)), text)
+    return '{%s}' % text
+
+
+def page_ranges(outdir, jobname):
+    """``(body, appendix)`` pages of a compiled unit, ``'first-last'``
+    ranges for pdfpages, from the marks of its ``.aux``."""
+    marks = {}
+    try:
+        with open(os.path.join(outdir, jobname + '.aux'),
+                  encoding='utf-8', errors='replace') as f:
+            marks = dict((kind, int(page))
+                         for kind, page in _MARK.findall(f.read()))
+    except IOError:
+        pass
+    if 'front' not in marks or 'body' not in marks:
+        # LaTeX older than 2020-10: the whole unit
+        return '-', None
+    return ('%d-%d' % (marks['front'] + 1, marks['body']),
+            '%d-' % (marks['body'] + 1))
+
+
+def _include(pdf, pages, title, label):
+    return (r'\includepdf[pages={%s},addtotoc={1,chapter,0,%s,%s}]{%s}'
+            % (pages, _tex_escape(title), re.sub(r'[^\w-]+', '-', label),
+               pdf))
+
+
+def merge(outdir, units, jobname):
+    """Merge the body of the compiled units into ``<jobname>.pdf``."""
+    pages = []
+    for name, title in units:
+        pdf = '%s_%s.pdf' % (LATEX_MAIN, name)
+        if not os.path.exists(os.path.join(outdir, pdf)):
+            continue
+        body, appendix = page_ranges(outdir, LATEX_MAIN + '_' + name)
+        pages.append(_include(pdf, body, title, name))
+    pdf = '%s_%s.pdf' % (LATEX_MAIN, BACKMATTER)
+    if os.path.exists(os.path.join(outdir, pdf)):
+        body, appendix = page_ranges(outdir, LATEX_MAIN + '_' + BACKMATTER)
+        pages.append(_include(pdf, body, BACKMATTER_TITLES[0], 'changelog'))
+        if appendix:
+            pages.append(_include(pdf, appendix, BACKMATTER_TITLES[1],
+                                  'refs'))
+    with open(os.path.join(outdir, jobname + '.tex'), 'w',
+              encoding='utf-8') as f:
+        f.write(MERGE % {'title': _tex_escape(TITLE)[1:-1],
+                         'author': _tex_escape(AUTHOR)[1:-1],
+                         'pages': '\n'.join(pages)})
+    return compile_tex(outdir, jobname)[1]
+
+
+def _tail(filename, lines=20):
+    try:
+        with open(filename, encoding='utf-8', errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+    except IOError:
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[4])
+    parser.add_argument('categories', nargs='*',
+                        help='compile only these categories (default: all)')
+    parser.add_argument('-j', dest='jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='parallel latexmk processes')
+    parser.add_argument('--builddir', default=os.path.join(HERE, 'build'))
+    parser.add_argument('--sphinxbuild', default='sphinx-build',
+                        help='sphinx-build command (default: sphinx-build)')
+    parser.add_argument('--no-merge', action='store_true',
+                        help='do not merge the chapters into the full book')
+    opts = parser.parse_args(argv)
+
+    outdir = os.path.join(opts.builddir, 'latex')
+    units = chapters()
+    if not units:
+        print('no <category>/index in the toctree of source/index.rst')
+        return 1
+    code = write_latex(units, outdir, opts.sphinxbuild)
+    if code:
+        return code
+    selected = [name for name, title in units
+                if not opts.categories or name in opts.categories]
+    selected.append(BACKMATTER)
+    pool = ThreadPool(max(1, min(opts.jobs, len(selected))))
+    failed = []
+    try:
+        for jobname, code in pool.imap_unordered(
+                lambda name: compile_tex(outdir, LATEX_MAIN + '_' + name),
+                selected):
+            print('%s: %s' % (jobname, 'failed' if code else 'done'))
+            if code:
+                failed.append(jobname)
+                sys.stdout.write(_tail(os.path.join(outdir,
+                                                    jobname + '.log')))
+    finally:
+        pool.close()
+        pool.join()
+    if failed:
+        return 1
+    if not opts.no_merge:
+        jobname = LATEX_MAIN + '_chapters'
+        if merge(outdir, units, jobname):
+            print('%s: failed' % jobname)
+            return 1
+        print('%s.pdf' % os.path.join(outdir, jobname))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,7 +20,8 @@ function makepythonfigures()
     fmt1=$2
     fmt2=$3
     cd figures/python
-    python $name.py
+    # goes through the warm server when "python figserver.py serve" is running
+    python figserver.py run $name.py
     mv $name.$fmt1 ../../$figpath
     mv $name.$fmt2 ../../$figpath
     # mv out to the original path
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+    buildprofile
+    ~~~~~~~~~~~~
+
+    Build-time profiling of the documentation.
+
+    Times every directive invocation (``jinja``, ``tabs``, ``code-tab``, ...),
+    every event handler (``update_context``, ``copy_assets``, ...), every
+    highlight call (one entry per Pygments lexer) and the formatting of the
+    bibliography (APA entries and labels). Timings are aggregated per
+    document and per worker process, so ``sphinx-build -j N`` is covered as
+    well: every process appends its records to
+    ``<outdir>/.buildprofile/<pid>.json`` after each document, and the main
+    process merges them at ``build-finished`` into
+
+    * ``<outdir>/buildprofile.json``: totals per name, per document and per
+      worker, sorted by time;
+    * ``<outdir>/buildprofile.folded``: self times in the folded stack format
+      read by ``flamegraph.pl`` and speedscope.
+
+    The extension is enabled in ``conf.py`` by setting ``SPHINX_BUILDPROFILE``
+    in the environment, e.g. ``SPHINX_BUILDPROFILE=1 make html``.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import functools
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+
+from docutils.parsers.rst import Directive, directives
+
+_WRAPPED = '_buildprofile'
+_MAIN_PID = os.getpid()
+
+
+class Profiler(object):
+    """Timings of one process, kept until the next :meth:`flush`."""
+
+    def __init__(self):
+        self.docname = '-'
+        self.stack = []
+        self.reset()
+
+    def reset(self):
+        # (docname, category, name) -> [calls, inclusive seconds]
+        self.totals = defaultdict(lambda: [0, 0.0])
+        # (docname,) + stack of names -> self seconds
+        self.folded = defaultdict(float)
+
+    def enter(self, category, name):
+        # [category, name, start, seconds of the children]
+        self.stack.append([category, name, time.perf_counter(), 0.0])
+
+    def leave(self):
+        names = tuple('%s:%s' % (f[0], f[1]) for f in self.stack)
+        category, name, start, children = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        if self.stack:
+            self.stack[-1][3] += elapsed
+        total = self.totals[(self.docname, category, name)]
+        total[0] += 1
+        total[1] += elapsed
+        self.folded[(self.docname,) + names] += elapsed - children
+
+    def flush(self, path):
+        """Append the records since the last flush to ``path``."""
+        if not self.totals:
+            return
+        record = {
+            'pid': os.getpid(),
+            'totals': [list(key) + value
+                       for key, value in self.totals.items()],
+            'folded': [[list(key), value]
+                       for key, value in self.folded.items()],
+        }
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        self.reset()
+
+
+profiler = Profiler()
+if hasattr(os, 'register_at_fork'):
+    # forked workers must not report the records of their parent again
+    os.register_at_fork(after_in_child=profiler.reset)
+
+
+def timed(category, name, func):
+    """Return ``func`` timed under ``category:name``."""
+    if getattr(func, _WRAPPED, False):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler.enter(category, name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.leave()
+    setattr(wrapper, _WRAPPED, True)
+    return wrapper
+
+
+def timed_generator(category, name, func):
+    """Like :func:`timed` for generator functions, timing every step."""
+    if getattr(func, _WRAPPED, False):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        iterator = iter(func(*args, **kwargs))
+        while True:
+            profiler.enter(category, name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                profiler.leave()
+            yield item
+    setattr(wrapper, _WRAPPED, True)
+    return wrapper
+
+
+def _wrap_directive(cls):
+    run = cls.run
+    if getattr(run, _WRAPPED, False):
+        return
+
+    @functools.wraps(run)
+    def wrapper(self):
+        profiler.enter('directive', type(self).__name__)
+        try:
+            return run(self)
+        finally:
+            profiler.leave()
+    setattr(wrapper, _WRAPPED, True)
+    cls.run = wrapper
+
+
+def instrument_directives(app):
+    classes = list(directives._directives.values())
+    for domain in getattr(app.env, 'domains', {}).values():
+        classes.extend(domain.directives.values())
+    for cls in classes:
+        if isinstance(cls, type) and issubclass(cls, Directive):
+            _wrap_directive(cls)
+
+
+def instrument_events(app):
+    listeners = getattr(app.events, 'listeners', None) \
+        if hasattr(app, 'events') else getattr(app, '_listeners', None)
+    if listeners is None:
+        return
+    for event, handlers in listeners.items():
+        if event == 'builder-inited':
+            continue
+        if isinstance(handlers, dict):
+            for key, callback in list(handlers.items()):
+                handlers[key] = timed(
+                    'event', '%s/%s' % (event, _funcname(callback)), callback)
+        else:
+            # sphinx >= 3: list of EventListener(id, handler, priority)
+            for idx, listener in enumerate(handlers):
+                handler = listener.handler
+                handlers[idx] = listener._replace(handler=timed(
+                    'event', '%s/%s' % (event, _funcname(handler)), handler))
+
+
+def instrument_highlighting():
+    from sphinx.highlighting import PygmentsBridge
+    highlight_block = PygmentsBridge.highlight_block
+    if getattr(highlight_block, _WRAPPED, False):
+        return
+
+    @functools.wraps(highlight_block)
+    def wrapper(self, source, lang, *args, **kwargs):
+        profiler.enter('highlight', lang)
+        try:
+            return highlight_block(self, source, lang, *args, **kwargs)
+        finally:
+            profiler.leave()
+    setattr(wrapper, _WRAPPED, True)
+    PygmentsBridge.highlight_block = wrapper
+
+
+def instrument_bibliography():
+    try:
+        from pybtex.plugin import find_plugin
+        style = find_plugin('pybtex.style.formatting', 'apa')
+    except Exception:
+        return
+    # sphinxcontrib-bibtex 2.x formats the entries one at a time
+    style.format_entry = timed('bibtex', 'apa.format_entry',
+                               style.format_entry)
+    labels = style.default_label_style
+    labels.format_labels = timed_generator(
+        'bibtex', 'apa.format_labels', labels.format_labels)
+
+
+def instrument_writer(app):
+    builder = app.builder
+    write_doc = builder.write_doc
+
+    @functools.wraps(write_doc)
+    def wrapper(docname, doctree):
+        # parallel writers resolve a whole chunk before forking, so the
+        # document is only known for sure here
+        profiler.docname = docname
+        profiler.enter('write', type(builder).__name__)
+        try:
+            return write_doc(docname, doctree)
+        finally:
+            profiler.leave()
+            if os.getpid() != _MAIN_PID:
+                profiler.flush(_record_file(app))
+    builder.write_doc = wrapper
+
+
+def _funcname(func):
+    func = getattr(func, '__wrapped__', func)
+    return '%s.%s' % (getattr(func, '__module__', '?'),
+                      getattr(func, '__qualname__', repr(func)))
+
+
+def _profile_dir(app):
+    return os.path.join(app.outdir, '.buildprofile')
+
+
+def _record_file(app):
+    return os.path.join(_profile_dir(app), '%d.json' % os.getpid())
+
+
+def builder_inited(app):
+    path = _profile_dir(app)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    instrument_directives(app)
+    instrument_events(app)
+    instrument_writer(app)
+    instrument_highlighting()
+    instrument_bibliography()
+
+
+def set_docname(app, docname, *args):
+    if os.getpid() != _MAIN_PID:
+        profiler.flush(_record_file(app))
+    profiler.docname = docname
+
+
+def doctree_resolved(app, doctree, docname):
+    set_docname(app, docname)
+
+
+def doctree_read(app, doctree):
+    if os.getpid() != _MAIN_PID:
+        profiler.flush(_record_file(app))
+
+
+def _merge(path):
+    totals = defaultdict(lambda: [0, 0.0])
+    folded = defaultdict(float)
+    for name in os.listdir(path):
+        with open(os.path.join(path, name)) as f:
+            for line in f:
+                record = json.loads(line)
+                pid = record['pid']
+                for docname, category, func, calls, seconds in \
+                        record['totals']:
+                    total = totals[(pid, docname, category, func)]
+                    total[0] += calls
+                    total[1] += seconds
+                for key, seconds in record['folded']:
+                    folded[tuple(key)] += seconds
+    return totals, folded
+
+
+def _sorted_table(table):
+    return [dict(name=key, calls=value[0], seconds=round(value[1], 6))
+            for key, value in sorted(table.items(),
+                                     key=lambda item: -item[1][1])]
+
+
+def build_finished(app, exception):
+    path = _profile_dir(app)
+    if not os.path.isdir(path):
+        return
+    profiler.flush(_record_file(app))
+    totals, folded = _merge(path)
+
+    by_name = defaultdict(lambda: [0, 0.0])
+    by_doc = defaultdict(lambda: [0, 0.0])
+    by_worker = defaultdict(lambda: [0, 0.0])
+    for (pid, docname, category, func), (calls, seconds) in totals.items():
+        for table, key in ((by_name, '%s:%s' % (category, func)),
+                           (by_doc, docname), (by_worker, str(pid))):
+            table[key][0] += calls
+            table[key][1] += seconds
+    per_doc = defaultdict(dict)
+    for (pid, docname, category, func), (calls, seconds) in totals.items():
+        entry = per_doc[docname].setdefault('%s:%s' % (category, func),
+                                            [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    report = {
+        'builder': app.builder.name,
+        'workers': len(by_worker),
+        'by_name': _sorted_table(by_name),
+        'by_document': _sorted_table(by_doc),
+        'by_worker': _sorted_table(by_worker),
+        'documents': {docname: _sorted_table(table)
+                      for docname, table in sorted(per_doc.items())},
+    }
+    with open(os.path.join(app.outdir, 'buildprofile.json'), 'w') as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    with open(os.path.join(app.outdir, 'buildprofile.folded'), 'w') as f:
+        for stack, seconds in sorted(folded.items()):
+            # flamegraph tools expect integer sample counts: microseconds
+            f.write('%s %d\n' % (';'.join(stack), round(seconds * 1e6)))
+    shutil.rmtree(path)
+
+
+def setup(app):
+    app.connect('builder-inited', builder_inited)
+    app.connect('source-read', set_docname)
+    app.connect('doctree-read', doctree_read)
+    app.connect('doctree-resolved', doctree_resolved)
+    app.connect('build-finished', build_finished)
+    return {'parallel_read_safe': True, 'parallel_write_safe': True}
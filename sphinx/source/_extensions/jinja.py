@@ -27,8 +27,13 @@
 
 
 import codecs
+import glob
+import hashlib
 import os
+import pickle
 import sys
+import time
+import types
 import urllib
 
 from docutils import nodes
@@ -39,6 +44,142 @@ from jinja2 import FileSystemLoader, Environment
 import sphinx.util
 
 
+def _code_digest(provider):
+    """Digest of the code of ``provider`` and of the functions it defines."""
+    md5 = hashlib.md5(str(getattr(provider, '__module__', '')).encode())
+    function = getattr(provider, '__func__', provider)
+    code = getattr(function, '__code__', None)
+    if code is None:
+        # callable instance
+        code = getattr(type(provider).__call__, '__code__', None)
+    stack = [code] if code is not None else []
+    while stack:
+        code = stack.pop()
+        md5.update(code.co_code)
+        md5.update(repr(code.co_names).encode('utf-8'))
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                stack.append(const)
+            elif isinstance(const, frozenset):
+                # the order of a set depends on the hash seed
+                md5.update(repr(sorted(map(repr, const))).encode('utf-8'))
+            else:
+                md5.update(repr(const).encode('utf-8'))
+    return md5.hexdigest()
+
+
+class LazyContext(object):
+    """Context computed on first use, for ``jinja_contexts``::
+
+        jinja_contexts = {
+            'tutorials': LazyContext(read_catalogs,
+                                     depends=['../../BuildIn/*.csv']),
+        }
+
+    ``provider()`` returns the context dict. It is called once, the result
+    is memoized per process and pickled in ``<doctreedir>/jinja_contexts``
+    for the other workers and the next builds, until one of the files
+    matched by ``depends`` (globs relative to ``conf.py``) changes. Without
+    ``depends`` it is computed once per build. A plain callable in
+    ``jinja_contexts`` is taken as ``LazyContext(callable)``, but Sphinx
+    cannot pickle such a config and then reads every document again.
+
+    The documents using the context depend on those files, so they are
+    read again when the files change.
+    """
+
+    def __init__(self, provider, depends=()):
+        self.provider = provider
+        self.depends = list(depends)
+        self.name = getattr(provider, '__qualname__', repr(provider))
+        self.code = _code_digest(provider)
+
+    def files(self, base):
+        found = set()
+        for pattern in self.depends:
+            found.update(glob.glob(os.path.join(base, pattern),
+                                   recursive=True))
+        return sorted(found)
+
+    # compared with the pickled config of the last build: equal as long as
+    # the code of the provider and its dependencies are, whatever the
+    # function object
+    def _key(self):
+        return (self.name, self.code, tuple(self.depends))
+
+    def __eq__(self, other):
+        return isinstance(other, LazyContext) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __getstate__(self):
+        return {'provider': None, 'depends': self.depends, 'name': self.name,
+                'code': self.code}
+
+
+# name -> (signature, context), per process
+_contexts = {}
+# contexts without dependencies are valid for one build
+_build = [None]
+
+
+def _signature(lazy, files):
+    if not lazy.depends:
+        return ('build', _build[0])
+    signature = [lazy._key()]
+    for filename in files:
+        stat = os.stat(filename)
+        signature.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def get_context(app, name):
+    """The context ``name`` and the files it depends on."""
+    value = app.config.jinja_contexts[name]
+    if not isinstance(value, LazyContext):
+        if not callable(value):
+            return value, []
+        value = LazyContext(value)
+    files = value.files(app.confdir)
+    signature = _signature(value, files)
+    memo = _contexts.get(name)
+    if memo is not None and memo[0] == signature:
+        return memo[1], files
+    path = os.path.join(app.doctreedir, 'jinja_contexts', name + '.pickle')
+    try:
+        with open(path, 'rb') as f:
+            cached_signature, context = pickle.load(f)
+    except Exception:
+        # missing or unreadable
+        cached_signature = context = None
+    # the signature holds the digest of the code of the provider: a pickle
+    # written by another version of the provider is not reused
+    if cached_signature != signature:
+        context = value.provider()
+        try:
+            data = pickle.dumps((signature, context), pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            data = None
+        if data is not None:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '%s.%d' % (path, os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+    _contexts[name] = (signature, context)
+    return context, files
+
+
+def builder_inited(app):
+    _contexts.clear()
+    _build[0] = '%d-%f' % (os.getpid(), time.time())
+
+
 class JinjaDirective(Directive):
     has_content = True
     optional_arguments = 1
@@ -56,8 +197,13 @@ class JinjaDirective(Directive):
         docname = env.docname
         template_filename = self.options.get("file")
         debug_template = self.options.get("debug")
-        cxt = (self.app.config.jinja_contexts[self.arguments[0]].copy()
-               if self.arguments else {})
+        cxt = {}
+        if self.arguments:
+            context, files = get_context(self.app, self.arguments[0])
+            # shallow: "options" below must not leak into the shared context
+            cxt.update(context)
+            for filename in files:
+                env.note_dependency(filename)
         cxt["options"] = {
             "header_char": self.options.get("header_char")
         }
@@ -106,6 +252,7 @@ class JinjaDirective(Directive):
 def setup(app):
     JinjaDirective.app = app
     app.add_directive('jinja', JinjaDirective)
+    app.connect('builder-inited', builder_inited)
     app.add_config_value('jinja_contexts', {}, 'env')
     app.add_config_value('jinja_base', os.path.abspath('.'), 'env')
     return {'parallel_read_safe': True, 'parallel_write_safe': True}
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+    lazymedia
+    ~~~~~~~~~
+
+    Lazy-loading, responsive media in the HTML pages.
+
+    The ``figure``/``image`` directives write a plain ``<img src=...>``, so a
+    long tutorial page downloads all of its screenshots before it settles.
+    This extension rewrites the body of every page before it goes into the
+    theme template:
+
+    * ``<img>``: ``decoding="async"``, ``loading="lazy"`` except for the first
+      image of the page (usually in view), ``width``/``height`` from the
+      image file so the layout does not jump, and a ``srcset`` of downscaled
+      copies (``lazymedia_widths``) for raster images wider than them. Their
+      ``sizes`` is ``lazymedia_sizes`` (the content column) for full width
+      images; an image with its own width (``:width: 50%``, ``:width:
+      300px``, ``:scale:``) gets that fraction of it or that many pixels;
+    * ``<video>``: ``preload="none"`` unless it says otherwise;
+    * ``<iframe>``: ``loading="lazy"``.
+
+    The downscaled copies ``<name>-<width>w.<ext>`` are written next to the
+    images in ``_images`` and only redone when the image is newer. They need
+    Pillow; without it the pages get everything but the ``srcset``.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import os
+import posixpath
+import re
+
+from sphinx.util.images import get_image_size
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+_TAG = re.compile(r'<(img|video|iframe)\b([^>]*?)(\s*/?)>', re.I)
+_ATTR = re.compile(r'([\w:-]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'>]+))?')
+_RASTER = ('.png', '.jpg', '.jpeg', '.webp')
+# width written by the html writer for :width: and :scale:
+_STYLE_WIDTH = re.compile(r'(?:^|;)\s*width\s*:\s*([\d.]+)(px|%)', re.I)
+_LENGTH = re.compile(r'([\d.]+)([a-z]+)\s*$', re.I)
+
+
+def _attributes(text):
+    return {name.lower(): value.strip('"\'') if value else ''
+            for name, value in _ATTR.findall(text)}
+
+
+def sizes(attrs, column):
+    """``sizes`` of an image displayed at the width set in ``attrs``.
+
+    ``column`` is the ``sizes`` of a full width image: a percentage scales
+    its lengths, pixels are used as they are (unless the screen is
+    narrower).
+    """
+    match = _STYLE_WIDTH.search(attrs.get('style', ''))
+    if match:
+        value, unit = float(match.group(1)), match.group(2)
+    elif attrs.get('width', '').isdigit():
+        value, unit = float(attrs['width']), 'px'
+    else:
+        return column
+    if unit == 'px':
+        return '(max-width: %dpx) 100vw, %dpx' % (value, value)
+    parts = []
+    for part in column.split(','):
+        # the length after the media condition, if any
+        match = _LENGTH.search(part)
+        if match:
+            length = float(match.group(1)) * value / 100
+            part = '%s%g%s' % (part[:match.start()], round(length, 2),
+                               match.group(2))
+        parts.append(part)
+    return ','.join(parts)
+
+
+def variant(builder, source, name, width):
+    """Downscaled copy of ``source`` in ``_images``, its name or None."""
+    root, ext = posixpath.splitext(name)
+    target = '%s-%dw%s' % (root, width, ext)
+    path = os.path.join(builder.outdir, builder.imagedir, target)
+    if (os.path.exists(path)
+            and os.path.getmtime(path) >= os.path.getmtime(source)):
+        return target
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with Image.open(source) as image:
+            height = round(image.height * width / image.width)
+            small = image.resize((width, height), Image.LANCZOS)
+            # parallel writers may render the same copy
+            tmp = '%s.%d%s' % (path, os.getpid(), ext)
+            small.save(tmp)
+    except (IOError, ValueError):
+        return None
+    os.replace(tmp, path)
+    return target
+
+
+class Rewriter(object):
+    """Rewrite the media tags of one page."""
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.config = builder.config
+        self.sources = {dest: os.path.join(builder.srcdir, src)
+                        for src, dest in builder.images.items()}
+        self.images = 0
+
+    def img(self, attrs, extra):
+        src = attrs.get('src', '')
+        path, name = posixpath.split(src)
+        source = self.sources.get(name)
+        if 'decoding' not in attrs:
+            extra.append('decoding="async"')
+        if 'loading' not in attrs and self.images:
+            extra.append('loading="lazy"')
+        self.images += 1
+        if (source is None or posixpath.basename(path) != self.builder.imagedir
+                or not os.path.exists(source)):
+            return
+        size = get_image_size(source)
+        if size is None:
+            return
+        width, height = size
+        # the width of the image in the page, not the one of the file
+        display = sizes(attrs, self.config.lazymedia_sizes)
+        if 'width' not in attrs and 'height' not in attrs:
+            extra.append('width="%d" height="%d"' % (width, height))
+        if ('srcset' in attrs or Image is None
+                or not name.lower().endswith(_RASTER)):
+            return
+        candidates = []
+        for w in sorted(self.config.lazymedia_widths):
+            if w >= width:
+                break
+            target = variant(self.builder, source, name, w)
+            if target:
+                candidates.append('%s %dw' % (posixpath.join(path, target),
+                                              w))
+        if candidates:
+            candidates.append('%s %dw' % (src, width))
+            extra.append('srcset="%s" sizes="%s"'
+                         % (', '.join(candidates), display))
+
+    def __call__(self, match):
+        tag = match.group(1).lower()
+        attrs = _attributes(match.group(2))
+        extra = []
+        if tag == 'img':
+            self.img(attrs, extra)
+        elif tag == 'video' and 'preload' not in attrs:
+            extra.append('preload="none"')
+        elif tag == 'iframe' and 'loading' not in attrs:
+            extra.append('loading="lazy"')
+        if not extra:
+            return match.group(0)
+        return '<%s%s %s%s>' % (match.group(1), match.group(2),
+                                ' '.join(extra), match.group(3))
+
+
+def page_context(app, pagename, templatename, context, doctree):
+    if 'body' not in context or app.builder.format != 'html':
+        return
+    context['body'] = _TAG.sub(Rewriter(app.builder), context['body'])
+
+
+def setup(app):
+    app.add_config_value('lazymedia_widths', [480, 960], 'html')
+    # the content column of the rtd theme is at most 1000px wide
+    app.add_config_value('lazymedia_sizes',
+                         '(max-width: 1000px) 100vw, 940px', 'html')
+    app.connect('html-page-context', page_context)
+    return {'parallel_read_safe': True, 'parallel_write_safe': True}
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+    mathsvg
+    ~~~~~~~
+
+    Math rendered at build time as inline SVG, no MathJax in the browser.
+
+    The equations of every document are collected when it is read and kept
+    in the environment. Before the pages are written, the ones not rendered
+    yet are typeset in batches: one LaTeX document per batch with every
+    equation in a ``preview`` environment (one page each), one ``dvisvgm``
+    call per batch, the batches in parallel. The SVGs are cached by the hash
+    of the equation and the LaTeX settings in ``mathsvg_cache`` (by default
+    ``<doctreedir>/mathsvg``), so a rebuild only renders new equations.
+
+    A batch that fails is split in halves until the broken equation is
+    found, the others still render. The equations without an SVG, all of
+    them when ``mathsvg_latex`` or ``mathsvg_dvisvgm`` is not installed
+    (checked once when the builder starts), are reported in one warning and
+    written as MathJax markup, with the ``mathjax_path`` script added to the
+    pages that have such equations (and only those); without
+    ``sphinx.ext.mathjax`` they stay LaTeX source.
+
+    Enabled with ``html_math_renderer = 'mathsvg'``; the settings are those
+    of imgmath: ``mathsvg_latex``, ``mathsvg_dvisvgm``, ``mathsvg_preamble``,
+    ``mathsvg_fontsize`` and ``mathsvg_batch`` (equations per LaTeX run).
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+from docutils import nodes
+from sphinx.locale import _
+from sphinx.util import logging
+from sphinx.util.math import get_node_equation_number, wrap_displaymath
+
+logger = logging.getLogger(__name__)
+
+DOC = r'''\documentclass[%(fontsize)dpt]{article}
+\usepackage{amsmath}
+\usepackage{amsthm}
+\usepackage{amssymb}
+\usepackage{amsfonts}
+\usepackage{bm}
+\usepackage[active,tightpage]{preview}
+%(preamble)s
+\pagestyle{empty}
+\begin{document}
+%(snippets)s
+\end{document}
+'''
+SNIPPET = '\\begin{preview}%s\\end{preview}'
+
+# dvisvgm reports the extents of every page from the preview data
+_DEPTH = re.compile(r'depth=(-?[\d.]+)pt')
+_PAGE = re.compile(r'-(\d+)\.svg$')
+_PROLOG = re.compile(r'<\?xml[^>]*\?>|<!DOCTYPE[^>]*>|<!--.*?-->', re.S)
+_REF = re.compile(r'(\bid="|\bhref="#|url\(#)')
+
+# svg file contents, per process
+_svgs = {}
+# missing tool of this build, if any
+_missing = [None]
+
+
+def source(node):
+    """The LaTeX of a math node as it is typeset."""
+    if isinstance(node, nodes.math_block):
+        if node['nowrap']:
+            return node.astext()
+        return wrap_displaymath(node.astext(), None, False)
+    return '$%s$' % node.astext()
+
+
+def equation_key(config, latex):
+    settings = '\0'.join([config.mathsvg_latex, config.mathsvg_preamble,
+                          str(config.mathsvg_fontsize), latex])
+    return hashlib.sha1(settings.encode('utf-8')).hexdigest()
+
+
+def cache_dir(app):
+    return app.config.mathsvg_cache or os.path.join(app.doctreedir, 'mathsvg')
+
+
+def _svg(text, key, depth):
+    """Inline form of a dvisvgm page: no prolog, ids unique on the page and
+    the baseline aligned with the text."""
+    text = _PROLOG.sub('', text).strip()
+    text = _REF.sub(lambda m: m.group(1) + 'm%s-' % key[:8], text)
+    return text.replace('<svg ', '<svg style="vertical-align: -%.3fpt" '
+                        % depth, 1)
+
+
+def _typeset(config, batch, workdir):
+    """Typeset ``[(key, latex), ...]`` at once, ``{key: svg}`` or None."""
+    tex = os.path.join(workdir, 'math.tex')
+    with open(tex, 'w', encoding='utf-8') as f:
+        f.write(DOC % {
+            'fontsize': config.mathsvg_fontsize,
+            'preamble': config.mathsvg_preamble,
+            'snippets': '\n'.join(SNIPPET % latex for key, latex in batch),
+        })
+    for name in os.listdir(workdir):
+        if name.endswith('.svg'):
+            os.remove(os.path.join(workdir, name))
+    command = config.mathsvg_latex.split() + [
+        '--interaction=nonstopmode', '--halt-on-error', 'math.tex']
+    try:
+        code = subprocess.call(command, cwd=workdir,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if code:
+        return None
+    command = config.mathsvg_dvisvgm.split() + [
+        '--no-fonts', '--page=1-', '--output=math-%p.svg', 'math.dvi']
+    try:
+        process = subprocess.run(command, cwd=workdir, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+    except OSError:
+        return None
+    if process.returncode:
+        return None
+    depths = [float(depth) for depth in
+              _DEPTH.findall(process.stdout.decode('utf-8', 'replace'))]
+    pages = {}
+    for name in os.listdir(workdir):
+        page = _PAGE.search(name)
+        if page:
+            with open(os.path.join(workdir, name), encoding='utf-8') as f:
+                pages[int(page.group(1))] = f.read()
+    if len(pages) != len(batch) or len(depths) != len(batch):
+        return None
+    return {key: _svg(pages[n], key, depths[n - 1])
+            for n, (key, latex) in enumerate(batch, 1)}
+
+
+def _render(config, batch, failed):
+    """Typeset a batch, bisecting it around the equations that fail."""
+    workdir = tempfile.mkdtemp(prefix='mathsvg')
+    try:
+        pending = [batch]
+        rendered = {}
+        while pending:
+            part = pending.pop()
+            svgs = _typeset(config, part, workdir)
+            if svgs is not None:
+                rendered.update(svgs)
+            elif len(part) == 1:
+                failed.append(part[0][1])
+            else:
+                half = len(part) // 2
+                pending += [part[:half], part[half:]]
+        return rendered
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def builder_inited(app):
+    _missing[0] = None
+    if getattr(app.builder, 'math_renderer_name', None) != 'mathsvg':
+        return
+    for command in (app.config.mathsvg_latex, app.config.mathsvg_dvisvgm):
+        if not shutil.which(command.split()[0]):
+            _missing[0] = command.split()[0]
+            logger.warning('mathsvg: %s not found, math is rendered by '
+                           'MathJax' % _missing[0])
+            return
+
+
+def _use_mathjax(app):
+    mathjax_path = getattr(app.config, 'mathjax_path', None)
+    if mathjax_path:
+        app.add_js_file(mathjax_path, **{'async': 'async'})
+
+
+def doctree_read(app, doctree):
+    env = app.env
+    if not hasattr(env, 'mathsvg_equations'):
+        env.mathsvg_equations = {}
+    equations = {source(node)
+                 for node in doctree.traverse(
+                     lambda n: isinstance(n, (nodes.math, nodes.math_block)))}
+    if equations:
+        env.mathsvg_equations[env.docname] = equations
+    else:
+        env.mathsvg_equations.pop(env.docname, None)
+
+
+def env_purge_doc(app, env, docname):
+    getattr(env, 'mathsvg_equations', {}).pop(docname, None)
+
+
+def env_merge_info(app, env, docnames, other):
+    if not hasattr(env, 'mathsvg_equations'):
+        env.mathsvg_equations = {}
+    env.mathsvg_equations.update(getattr(other, 'mathsvg_equations', {}))
+
+
+def env_updated(app, env):
+    if getattr(app.builder, 'math_renderer_name', None) != 'mathsvg':
+        return
+    config = app.config
+    path = cache_dir(app)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    missing = {}
+    for equations in getattr(env, 'mathsvg_equations', {}).values():
+        for latex in equations:
+            key = equation_key(config, latex)
+            if not os.path.exists(os.path.join(path, key + '.svg')):
+                missing[key] = latex
+    if not missing:
+        return
+    if _missing[0]:
+        # reported in builder_inited
+        return
+    todo = sorted(missing.items())
+    jobs = os.cpu_count() or 1
+    size = min(config.mathsvg_batch, -(-len(todo) // jobs))
+    batches = [todo[i:i + size] for i in range(0, len(todo), size)]
+    failed = []
+    pool = ThreadPool(min(jobs, len(batches)))
+    try:
+        for rendered in pool.imap_unordered(
+                lambda batch: _render(config, batch, failed), batches):
+            for key, svg in rendered.items():
+                tmp = os.path.join(path, key + '.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    f.write(svg)
+                os.replace(tmp, os.path.join(path, key + '.svg'))
+    finally:
+        pool.close()
+        pool.join()
+    logger.info('mathsvg: %d equations rendered in %d batches'
+                % (len(todo) - len(failed), len(batches)))
+    if failed:
+        logger.warning('mathsvg: %d equation(s) cannot be rendered, shown '
+                       'with MathJax: %s'
+                       % (len(failed), ', '.join(map(repr, failed[:5]))))
+
+
+def _load(app, latex):
+    key = equation_key(app.config, latex)
+    if key not in _svgs:
+        try:
+            with open(os.path.join(cache_dir(app), key + '.svg'),
+                      encoding='utf-8') as f:
+                _svgs[key] = f.read()
+        except IOError:
+            _svgs[key] = None
+    return _svgs[key]
+
+
+def html_page_context(app, pagename, templatename, context, doctree):
+    """Add MathJax to a page with equations that have no SVG."""
+    if getattr(app.builder, 'math_renderer_name', None) != 'mathsvg':
+        return
+    equations = getattr(app.env, 'mathsvg_equations', {}).get(pagename, ())
+    if any(_load(app, latex) is None for latex in equations):
+        _use_mathjax(app)
+
+
+def html_visit_math(self, node):
+    svg = _load(self.builder.app, source(node))
+    self.body.append(self.starttag(node, 'span', '', CLASS='math'))
+    self.body.append(svg or r'\(%s\)' % self.encode(node.astext()))
+    self.body.append('</span>')
+    raise nodes.SkipNode
+
+
+def html_visit_displaymath(self, node):
+    svg = _load(self.builder.app, source(node))
+    self.body.append(self.starttag(node, 'div', CLASS='math'))
+    self.body.append('<p>')
+    if node['number']:
+        number = get_node_equation_number(self, node)
+        self.body.append('<span class="eqno">(%s)' % number)
+        self.add_permalink_ref(node, _('Permalink to this equation'))
+        self.body.append('</span>')
+    # MathJax typesets the equation* environment of source() as it is
+    self.body.append(svg or self.encode(source(node)))
+    self.body.append('</p></div>\n')
+    raise nodes.SkipNode
+
+
+def setup(app):
+    app.add_html_math_renderer('mathsvg',
+                               (html_visit_math, None),
+                               (html_visit_displaymath, None))
+    app.add_config_value('mathsvg_latex', 'latex', 'html')
+    app.add_config_value('mathsvg_dvisvgm', 'dvisvgm', 'html')
+    app.add_config_value('mathsvg_preamble', '', 'html')
+    app.add_config_value('mathsvg_fontsize', 12, 'html')
+    app.add_config_value('mathsvg_batch', 200, 'html')
+    app.add_config_value('mathsvg_cache', None, 'html')
+    app.connect('builder-inited', builder_inited)
+    app.connect('doctree-read', doctree_read)
+    app.connect('env-purge-doc', env_purge_doc)
+    app.connect('env-merge-info', env_merge_info)
+    app.connect('env-updated', env_updated)
+    app.connect('html-page-context', html_page_context)
+    return {'parallel_read_safe': True, 'parallel_write_safe': True}
@@ -1,11 +1,14 @@
 """ Tabbed views for Sphinx, with HTML builder """
 
 import base64
+import hashlib
 import json
 import posixpath
 import os
+import textwrap
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
+from docutils.statemachine import StringList
 from pkg_resources import resource_filename
 from pygments.lexers import get_all_lexers
 from sphinx.util.osutil import copyfile
@@ -37,6 +40,22 @@ def get_compatible_builders(app):
     return builders
 
 
+def _tabs_state(env):
+    """ Return the state of the tabs directives of the current document
+
+    The state lives in ``env.temp_data``, which Sphinx resets for every
+    document, so nothing is shared between documents and parallel reads have
+    nothing to merge.
+    """
+    return env.temp_data.setdefault('sphinx_tabs', {'stack': [], 'seen': {}})
+
+
+def _content_id(*parts):
+    """ Return a short, stable id derived from text """
+    text = '\0'.join(parts).encode('utf-8')
+    return hashlib.sha1(text).hexdigest()[:10]
+
+
 class TabsDirective(Directive):
     """ Top-level tabs directive """
 
@@ -50,22 +69,27 @@ class TabsDirective(Directive):
         node = nodes.container()
         node['classes'] = ['sphinx-tabs']
 
-        if 'next_tabs_id' not in env.temp_data:
-            env.temp_data['next_tabs_id'] = 0
-        if 'tabs_stack' not in env.temp_data:
-            env.temp_data['tabs_stack'] = []
-
-        tabs_id = env.temp_data['next_tabs_id']
-        tabs_key = 'tabs_%d' % tabs_id
-        env.temp_data['next_tabs_id'] += 1
-        env.temp_data['tabs_stack'].append(tabs_id)
-
-        env.temp_data[tabs_key] = {}
-        env.temp_data[tabs_key]['tab_ids'] = []
-        env.temp_data[tabs_key]['tab_titles'] = []
-        env.temp_data[tabs_key]['is_first_tab'] = True
-
-        self.state.nested_parse(self.content, self.content_offset, node)
+        # the id is derived from the document and the content, so it is the
+        # same in every build whatever the order documents are read in;
+        # only identical tabs in one document are numbered in order
+        state = _tabs_state(env)
+        tabs_id = _content_id(env.docname, '\n'.join(self.content))
+        count = state['seen'].get(tabs_id, 0)
+        state['seen'][tabs_id] = count + 1
+        if count:
+            tabs_id = '%s-%d' % (tabs_id, count)
+
+        tabs = {
+            'id': tabs_id,
+            'tab_ids': [],
+            'tab_titles': [],
+            'is_first_tab': True,
+        }
+        state['stack'].append(tabs)
+        try:
+            self.state.nested_parse(self.content, self.content_offset, node)
+        finally:
+            state['stack'].pop()
 
         if env.app.builder.name in get_compatible_builders(env.app):
             tabs_node = nodes.container()
@@ -74,7 +98,7 @@ class TabsDirective(Directive):
             classes = 'ui top attached tabular menu sphinx-menu'
             tabs_node['classes'] = classes.split(' ')
 
-            tab_titles = env.temp_data[tabs_key]['tab_titles']
+            tab_titles = tabs['tab_titles']
             for idx, [data_tab, tab_name] in enumerate(tab_titles):
                 tab = nodes.container()
                 tab.tagname = 'a'
@@ -85,7 +109,6 @@ class TabsDirective(Directive):
 
             node.children.insert(0, tabs_node)
 
-        env.temp_data['tabs_stack'].pop()
         return [node]
 
 
@@ -97,10 +120,6 @@ class TabDirective(Directive):
     def run(self):
         """ Parse a tab directive """
         self.assert_has_content()
-        env = self.state.document.settings.env
-
-        tabs_id = env.temp_data['tabs_stack'][-1]
-        tabs_key = 'tabs_%d' % tabs_id
 
         args = self.content[0].strip()
         if args.startswith('{'):
@@ -115,27 +134,38 @@ class TabDirective(Directive):
         tab_name = nodes.container()
         self.state.nested_parse(
             self.content[:1], self.content_offset, tab_name)
+
+        def fill(node):
+            self.state.nested_parse(
+                self.content[2:], self.content_offset, node)
+        return self.make_tab(args, tab_name, '\n'.join(self.content), fill)
+
+    def make_tab(self, args, tab_name, text, fill):
+        """ Return the nodes of a tab titled ``tab_name``, its body added
+        by ``fill(node)`` """
+        env = self.state.document.settings.env
+
+        tabs = _tabs_state(env)['stack'][-1]
+
         args['tab_name'] = tab_name
 
         include_tabs_id_in_data_tab = False
         if 'tab_id' not in args:
-            args['tab_id'] = env.new_serialno(tabs_key)
+            args['tab_id'] = _content_id(text)
             include_tabs_id_in_data_tab = True
         i = 1
-        while args['tab_id'] in env.temp_data[tabs_key]['tab_ids']:
+        while args['tab_id'] in tabs['tab_ids']:
             args['tab_id'] = '%s-%d' % (args['tab_id'], i)
             i += 1
-        env.temp_data[tabs_key]['tab_ids'].append(args['tab_id'])
+        tabs['tab_ids'].append(args['tab_id'])
 
         data_tab = str(args['tab_id'])
         if include_tabs_id_in_data_tab:
-            data_tab = '%d-%s' % (tabs_id, data_tab)
+            data_tab = '%s-%s' % (tabs['id'], data_tab)
         data_tab = "sphinx-data-tab-{}".format(data_tab)
 
-        env.temp_data[tabs_key]['tab_titles'].append(
-            (data_tab, args['tab_name']))
+        tabs['tab_titles'].append((data_tab, args['tab_name']))
 
-        text = '\n'.join(self.content)
         node = nodes.container(text)
 
         classes = 'ui bottom attached sphinx-tab tab segment'
@@ -143,11 +173,11 @@ class TabDirective(Directive):
         node['classes'].extend(args.get('classes', []))
         node['classes'].append(data_tab)
 
-        if env.temp_data[tabs_key]['is_first_tab']:
+        if tabs['is_first_tab']:
             node['classes'].append('active')
-            env.temp_data[tabs_key]['is_first_tab'] = False
+            tabs['is_first_tab'] = False
 
-        self.state.nested_parse(self.content[2:], self.content_offset, node)
+        fill(node)
 
         if env.app.builder.name not in get_compatible_builders(env.app):
             outer_node = nodes.container()
@@ -163,7 +193,7 @@ class TabDirective(Directive):
         return [node]
 
 
-class GroupTabDirective(Directive):
+class GroupTabDirective(TabDirective):
     """ Tab directive that toggles with same tab names across page"""
 
     has_content = True
@@ -173,10 +203,6 @@ class GroupTabDirective(Directive):
         self.assert_has_content()
 
         group_name = self.content[0]
-        self.content.trim_start(2)
-
-        for idx, line in enumerate(self.content.data):
-            self.content.data[idx] = '   ' + line
 
         tab_args = {
             'tab_id': base64.b64encode(
@@ -184,22 +210,19 @@ class GroupTabDirective(Directive):
             'group_tab': True
         }
 
-        new_content = [
-            '.. tab:: {}'.format(json.dumps(tab_args)),
-            '   {}'.format(group_name),
-            '',
-        ]
-
-        for idx, line in enumerate(new_content):
-            self.content.data.insert(idx, line)
-            self.content.items.insert(idx, (None, idx))
+        tab_name = nodes.container()
+        self.state.nested_parse(
+            self.content[:1], self.content_offset, tab_name)
 
-        node = nodes.container()
-        self.state.nested_parse(self.content, self.content_offset, node)
-        return node.children
+        # the body is parsed in place, with its own source lines
+        def fill(node):
+            self.state.nested_parse(
+                self.content[2:], self.content_offset, node)
+        return self.make_tab(tab_args, tab_name, '\n'.join(self.content),
+                             fill)
 
 
-class CodeTabDirective(Directive):
+class CodeTabDirective(TabDirective):
     """ Tab directive with a codeblock as its content"""
 
     has_content = True
@@ -212,39 +235,41 @@ class CodeTabDirective(Directive):
         self.assert_has_content()
 
         args = self.content[0].strip().split()
-        self.content.trim_start(2)
+        code = self.content[2:]
+        while len(code) and not code[0].strip():
+            code = code[1:]
 
         lang = args[0]
         tab_name = ' '.join(args[1:]) if len(args) > 1 else LEXER_MAP[lang]
 
-        for idx, line in enumerate(self.content.data):
-            self.content.data[idx] = '      ' + line
-
         tab_args = {
             'tab_id': base64.b64encode(
                 tab_name.encode('utf-8')).decode('utf-8'),
             'classes': ['code-tab'],
         }
 
-        new_content = [
-            '.. tab:: {}'.format(json.dumps(tab_args)),
-            '   {}'.format(tab_name),
-            '',
-            '   .. code-block:: {}'.format(lang),
-        ]
-
-        if 'linenos' in self.options:
-            new_content.append('      :linenos:')
-
-        new_content.append('')
-
-        for idx, line in enumerate(new_content):
-            self.content.data.insert(idx, line)
-            self.content.items.insert(idx, (None, idx))
-
-        node = nodes.container()
-        self.state.nested_parse(self.content, self.content_offset, node)
-        return node.children
+        title = nodes.container()
+        self.state.nested_parse(
+            StringList([tab_name], items=[self.content.info(0)]),
+            self.content_offset, title)
+
+        # the literal block of a code-block directive, without writing the
+        # directive out and parsing it again
+        def fill(node):
+            # indented as the content of a code-block would be
+            text = textwrap.dedent('\n'.join(code))
+            literal = nodes.literal_block(text, text)
+            literal['language'] = lang
+            if 'linenos' in self.options:
+                literal['linenos'] = True
+            if len(code):
+                literal.source, line = code.info(0)
+                literal.line = line + 1
+            else:
+                literal.source, literal.line = \
+                    self.state_machine.get_source_and_line(self.lineno)
+            node += literal
+        return self.make_tab(tab_args, title, '\n'.join(self.content), fill)
 
 
 class _FindTabsDirectiveVisitor(nodes.NodeVisitor):
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+    zhsearch
+    ~~~~~~~~
+
+    Sharded full-text search index for the Chinese tutorials.
+
+    Sphinx's own index is built for ``language = 'en'``: Chinese text is not
+    segmented at all and everything goes into one ``searchindex.js`` that
+    every search downloads. This extension indexes
+
+    * Chinese as overlapping character bigrams (the usual segmentation-free
+      scheme for CJK, no dictionary needed) plus the last character of each
+      run on its own, so that every character starts some term and a one
+      character query is a prefix search;
+    * identifiers as the whole word and its camelCase/underscore parts, so
+      ``pimpleFoam`` is found by ``pimplefoam``, ``pimple`` and ``foam`` and
+      ``fvSchemes`` by ``fvschemes`` and ``schemes``.
+
+    Terms are extracted when a document is read and kept in the environment,
+    so only the changed documents are processed again. At the end of an HTML
+    build the postings are written to ``_zhsearch/<shard>.js``, one shard per
+    first character (ASCII) or per block of 64 code points (CJK), plus
+    ``_zhsearch/docs.js`` with the titles; only the shards whose content
+    changed are rewritten. The search page (``_static/zhsearch.js``) applies
+    the same segmentation to the query and loads just the shards of its
+    terms.
+
+    The default search index is not built while this extension is enabled.
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import json
+import os
+import re
+from collections import defaultdict
+
+from docutils import nodes
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = '_zhsearch'
+# score of a term occurrence in the title, in the body it is 1
+TITLE_WEIGHT = 20
+SUMMARY_LENGTH = 120
+
+_TOKEN = re.compile(r'[A-Za-z][A-Za-z0-9_]*|'
+                    r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_CAMEL = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+_SKIP = (nodes.comment, nodes.raw, nodes.substitution_definition)
+
+
+def terms(text):
+    """Yield the index terms of ``text``."""
+    for token in _TOKEN.findall(text):
+        if token[0] > '\x7f':
+            # the only character that starts no bigram
+            yield token[-1]
+            for i in range(len(token) - 1):
+                yield token[i:i + 2]
+            continue
+        word = token.lower()
+        if len(word) > 1:
+            yield word
+        parts = [part.lower() for part in _CAMEL.findall(token)]
+        if len(parts) > 1:
+            for part in parts:
+                if len(part) > 1:
+                    yield part
+
+
+def shard_key(term):
+    """Shard of a term, ``zhsearch.js`` computes the same."""
+    if term[0] > '\x7f':
+        return 'u%x' % (ord(term[0]) >> 6)
+    return term[0]
+
+
+def _text(doctree):
+    parts = []
+    for node in doctree.traverse(nodes.Text):
+        parent = node.parent
+        while parent is not None and not isinstance(parent, _SKIP):
+            parent = parent.parent
+        if parent is None:
+            parts.append(node.astext())
+    return ' '.join(parts)
+
+
+def doctree_read(app, doctree):
+    env = app.env
+    if not hasattr(env, 'zhsearch_docs'):
+        env.zhsearch_docs = {}
+    titles = doctree.traverse(nodes.title)
+    title = titles[0].astext() if titles else env.docname
+    scores = defaultdict(int)
+    text = _text(doctree)
+    for term in terms(text):
+        scores[term] += 1
+    for term in terms(title):
+        scores[term] += TITLE_WEIGHT
+    summary = ' '.join(text.split())
+    if summary.startswith(title):
+        summary = summary[len(title):].lstrip()
+    env.zhsearch_docs[env.docname] = {
+        'title': title,
+        'summary': summary[:SUMMARY_LENGTH],
+        'scores': dict(scores),
+    }
+
+
+def env_purge_doc(app, env, docname):
+    getattr(env, 'zhsearch_docs', {}).pop(docname, None)
+
+
+def env_merge_info(app, env, docnames, other):
+    if not hasattr(env, 'zhsearch_docs'):
+        env.zhsearch_docs = {}
+    env.zhsearch_docs.update(getattr(other, 'zhsearch_docs', {}))
+
+
+def env_updated(app, env):
+    # stable document ids: adding a document only changes the shards of
+    # its own terms
+    ids = env.__dict__.setdefault('zhsearch_ids', {})
+    for docname in list(ids):
+        if docname not in env.found_docs:
+            del ids[docname]
+    for docname in sorted(getattr(env, 'zhsearch_docs', {})):
+        if docname not in ids:
+            ids[docname] = max(ids.values()) + 1 if ids else 0
+
+
+def builder_inited(app):
+    builder = app.builder
+    if builder.format != 'html' or not hasattr(builder, 'search'):
+        return
+    prepare_writing = builder.prepare_writing
+
+    def wrapper(docnames):
+        prepare_writing(docnames)
+        # replaced by the shards: keep search.html, skip searchindex.js
+        builder.indexer = None
+    builder.prepare_writing = wrapper
+
+
+def page_context(app, pagename, templatename, context, doctree):
+    if pagename == 'search':
+        context['zhsearch'] = INDEX_DIR
+
+
+def _write(filename, content):
+    """Write ``content`` unless the file already holds it."""
+    data = content.encode('utf-8')
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            if f.read() == data:
+                return False
+    with open(filename, 'wb') as f:
+        f.write(data)
+    return True
+
+
+def build_finished(app, exception):
+    if exception is not None or app.builder.format != 'html':
+        return
+    docs = getattr(app.env, 'zhsearch_docs', {})
+    ids = getattr(app.env, 'zhsearch_ids', {})
+    docnames = sorted(docs, key=ids.get)
+    shards = defaultdict(lambda: defaultdict(list))
+    for docname in docnames:
+        for term, score in docs[docname]['scores'].items():
+            shards[shard_key(term)][term].append([ids[docname], score])
+
+    path = os.path.join(app.outdir, INDEX_DIR)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    entries = [None] * (max(ids.values()) + 1 if ids else 0)
+    for docname in docnames:
+        entries[ids[docname]] = [app.builder.get_target_uri(docname),
+                                 docs[docname]['title'],
+                                 docs[docname]['summary']]
+    written = int(_write(os.path.join(path, 'docs.js'),
+                         'ZhSearch.setDocs(%s);\n' % json.dumps(
+                             entries, ensure_ascii=False,
+                             separators=(',', ':'))))
+    keep = {'docs.js'}
+    for key, postings in shards.items():
+        for term in postings:
+            postings[term].sort(key=lambda posting: -posting[1])
+        name = key + '.js'
+        keep.add(name)
+        written += _write(os.path.join(path, name),
+                          'ZhSearch.setShard(%s,%s);\n' % (
+                              json.dumps(key), json.dumps(
+                                  postings, ensure_ascii=False,
+                                  sort_keys=True, separators=(',', ':'))))
+    for name in os.listdir(path):
+        if name not in keep:
+            os.remove(os.path.join(path, name))
+    logger.info('zhsearch: %d documents, %d shards, %d written'
+                % (len(docnames), len(shards), written))
+
+
+def setup(app):
+    app.connect('builder-inited', builder_inited)
+    app.connect('doctree-read', doctree_read)
+    app.connect('env-purge-doc', env_purge_doc)
+    app.connect('env-merge-info', env_merge_info)
+    app.connect('env-updated', env_updated)
+    app.connect('html-page-context', page_context)
+    app.connect('build-finished', build_finished)
+    # terms of the documents kept in the environment: bump when they change
+    return {'env_version': 1, 'parallel_read_safe': True,
+            'parallel_write_safe': True}
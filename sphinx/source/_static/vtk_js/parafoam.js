@@ -2708,7 +2708,7 @@ eval("/* WEBPACK VAR INJECTION */(function(global) {/**\n * @license\n * webvr-p
 /***/ (function(module, __webpack_exports__, __webpack_require__) {
 
 "use strict";
-eval("__webpack_require__.r(__webpack_exports__);\n/* harmony import */ var vtk_js_Sources_favicon__WEBPACK_IMPORTED_MODULE_0__ = __webpack_require__(/*! vtk.js/Sources/favicon */ \"./node_modules/vtk.js/Sources/favicon.js\");\n/* harmony import */ var vtk_js_Sources_favicon__WEBPACK_IMPORTED_MODULE_0___default = /*#__PURE__*/__webpack_require__.n(vtk_js_Sources_favicon__WEBPACK_IMPORTED_MODULE_0__);\n/* harmony import */ var vtk_js_Sources_Rendering_Misc_FullScreenRenderWindow__WEBPACK_IMPORTED_MODULE_1__ = __webpack_require__(/*! vtk.js/Sources/Rendering/Misc/FullScreenRenderWindow */ \"./node_modules/vtk.js/Sources/Rendering/Misc/FullScreenRenderWindow/index.js\");\n/* harmony import */ var vtk_js_Sources_IO_Core_HttpSceneLoader__WEBPACK_IMPORTED_MODULE_2__ = __webpack_require__(/*! vtk.js/Sources/IO/Core/HttpSceneLoader */ \"./node_modules/vtk.js/Sources/IO/Core/HttpSceneLoader/index.js\");\n/* harmony import */ var vtk_js_Sources_IO_Core_DataAccessHelper__WEBPACK_IMPORTED_MODULE_3__ = __webpack_require__(/*! vtk.js/Sources/IO/Core/DataAccessHelper */ \"./node_modules/vtk.js/Sources/IO/Core/DataAccessHelper/index.js\");\n/* harmony import */ var vtk_js_Sources_IO_Core_DataAccessHelper_HttpDataAccessHelper__WEBPACK_IMPORTED_MODULE_4__ = __webpack_require__(/*! vtk.js/Sources/IO/Core/DataAccessHelper/HttpDataAccessHelper */ \"./node_modules/vtk.js/Sources/IO/Core/DataAccessHelper/HttpDataAccessHelper.js\");\n/* harmony import */ var vtk_js_Sources_Common_Core_URLExtract__WEBPACK_IMPORTED_MODULE_5__ = __webpack_require__(/*! vtk.js/Sources/Common/Core/URLExtract */ \"./node_modules/vtk.js/Sources/Common/Core/URLExtract/index.js\");\n\n\n\n\n\n\n\n\nfunction showScene(option) {\n    // ----------------------------------------------------------------------------\n    // Standard rendering code setup\n    // ----------------------------------------------------------------------------\n\n    const fullScreenRenderer = vtk_js_Sources_Rendering_Misc_FullScreenRenderWindow__WEBPACK_IMPORTED_MODULE_1__[\"default\"].newInstance();\n    const renderer = fullScreenRenderer.getRenderer();\n    const renderWindow = fullScreenRenderer.getRenderWindow();\n\n    // --------------------------------------------------------------------------------------------\n    // load data and display. Actually .vtkjs is a zip file just with extentation name of vtkjs\n    // --------------------------------------------------------------------------------------------\n    vtk_js_Sources_IO_Core_DataAccessHelper_HttpDataAccessHelper__WEBPACK_IMPORTED_MODULE_4__[\"default\"].fetchBinary(option.fileURL).then((zipContent) => {\n        // container.removeChild(progressContainer);\n        const dataAccessHelper = vtk_js_Sources_IO_Core_DataAccessHelper__WEBPACK_IMPORTED_MODULE_3__[\"default\"].get('zip', {\n            zipContent,\n            callback: (zip) => {\n                const sceneImporter = vtk_js_Sources_IO_Core_HttpSceneLoader__WEBPACK_IMPORTED_MODULE_2__[\"default\"].newInstance({\n                    renderer,\n                    dataAccessHelper,\n                });\n                sceneImporter.setUrl('index.json');\n                sceneImporter.onReady(() => {\n                    renderWindow.render();\n                });\n            },\n        });\n    });\n}\n\n// showScene();\n\nconst userParams = vtk_js_Sources_Common_Core_URLExtract__WEBPACK_IMPORTED_MODULE_5__[\"default\"].extractURLParameters();\nif (userParams.url || userParams.fileURL) {\n    showScene(userParams);\n}\n\n\n\n//# sourceURL=webpack:///./src/index.js?");
+eval("__webpack_require__.r(__webpack_exports__);\n/* harmony import */ var vtk_js_Sources_favicon__WEBPACK_IMPORTED_MODULE_0__ = __webpack_require__(/*! vtk.js/Sources/favicon */ \"./node_modules/vtk.js/Sources/favicon.js\");\n/* harmony import */ var vtk_js_Sources_favicon__WEBPACK_IMPORTED_MODULE_0___default = /*#__PURE__*/__webpack_require__.n(vtk_js_Sources_favicon__WEBPACK_IMPORTED_MODULE_0__);\n/* harmony import */ var vtk_js_Sources_Rendering_Misc_FullScreenRenderWindow__WEBPACK_IMPORTED_MODULE_1__ = __webpack_require__(/*! vtk.js/Sources/Rendering/Misc/FullScreenRenderWindow */ \"./node_modules/vtk.js/Sources/Rendering/Misc/FullScreenRenderWindow/index.js\");\n/* harmony import */ var vtk_js_Sources_IO_Core_HttpSceneLoader__WEBPACK_IMPORTED_MODULE_2__ = __webpack_require__(/*! vtk.js/Sources/IO/Core/HttpSceneLoader */ \"./node_modules/vtk.js/Sources/IO/Core/HttpSceneLoader/index.js\");\n/* harmony import */ var vtk_js_Sources_IO_Core_DataAccessHelper__WEBPACK_IMPORTED_MODULE_3__ = __webpack_require__(/*! vtk.js/Sources/IO/Core/DataAccessHelper */ \"./node_modules/vtk.js/Sources/IO/Core/DataAccessHelper/index.js\");\n/* harmony import */ var vtk_js_Sources_IO_Core_DataAccessHelper_HttpDataAccessHelper__WEBPACK_IMPORTED_MODULE_4__ = __webpack_require__(/*! vtk.js/Sources/IO/Core/DataAccessHelper/HttpDataAccessHelper */ \"./node_modules/vtk.js/Sources/IO/Core/DataAccessHelper/HttpDataAccessHelper.js\");\n/* harmony import */ var vtk_js_Sources_Common_Core_URLExtract__WEBPACK_IMPORTED_MODULE_5__ = __webpack_require__(/*! vtk.js/Sources/Common/Core/URLExtract */ \"./node_modules/vtk.js/Sources/Common/Core/URLExtract/index.js\");\n\n\n\n\n\n\n\n\nfunction showScene(option) {\n    // ----------------------------------------------------------------------------\n    // Standard rendering code setup\n    // ----------------------------------------------------------------------------\n\n    const fullScreenRenderer = vtk_js_Sources_Rendering_Misc_FullScreenRenderWindow__WEBPACK_IMPORTED_MODULE_1__[\"default\"].newInstance();\n    const renderer = fullScreenRenderer.getRenderer();\n    const renderWindow = fullScreenRenderer.getRenderWindow();\n\n    // --------------------------------------------------------------------------------------------\n    // scene directory (url=...): the arrays are fetched one by one, so the ones shared between\n    // the time steps of a case (geometry) are downloaded once and then cached by the browser\n    // --------------------------------------------------------------------------------------------\n    if (option.url) {\n        const sceneImporter = vtk_js_Sources_IO_Core_HttpSceneLoader__WEBPACK_IMPORTED_MODULE_2__[\"default\"].newInstance({\n            renderer,\n        });\n        sceneImporter.setUrl(option.url);\n        sceneImporter.onReady(() => {\n            renderWindow.render();\n        });\n        return;\n    }\n\n    // --------------------------------------------------------------------------------------------\n    // load data and display. Actually .vtkjs is a zip file just with extentation name of vtkjs\n    // --------------------------------------------------------------------------------------------\n    vtk_js_Sources_IO_Core_DataAccessHelper_HttpDataAccessHelper__WEBPACK_IMPORTED_MODULE_4__[\"default\"].fetchBinary(option.fileURL).then((zipContent) => {\n        // container.removeChild(progressContainer);\n        const dataAccessHelper = vtk_js_Sources_IO_Core_DataAccessHelper__WEBPACK_IMPORTED_MODULE_3__[\"default\"].get('zip', {\n            zipContent,\n            callback: (zip) => {\n                const sceneImporter = vtk_js_Sources_IO_Core_HttpSceneLoader__WEBPACK_IMPORTED_MODULE_2__[\"default\"].newInstance({\n                    renderer,\n                    dataAccessHelper,\n                });\n                sceneImporter.setUrl('index.json');\n                sceneImporter.onReady(() => {\n                    renderWindow.render();\n                });\n            },\n        });\n    });\n}\n\n// showScene();\n\nconst userParams = vtk_js_Sources_Common_Core_URLExtract__WEBPACK_IMPORTED_MODULE_5__[\"default\"].extractURLParameters();\nif (userParams.url || userParams.fileURL) {\n    showScene(userParams);\n}\n\n\n\n//# sourceURL=webpack:///./src/index.js?");
 
 /***/ }),
 
@@ -0,0 +1,196 @@
+/*
+ * zhsearch.js
+ * ~~~~~~~~~~~
+ *
+ * Search page of the sharded index written by the zhsearch extension
+ * (_extensions/zhsearch.py). The query is segmented exactly like the
+ * documents: Chinese as character bigrams, identifiers as the whole word
+ * and its camelCase parts. Only the shards of the query terms are loaded,
+ * with script tags so that it also works from file://.
+ *
+ * :copyright: Copyright 2020-2020 by the Zhikui Guo.
+ * :license: BSD, see LICENSE for details.
+ */
+
+var ZhSearch = (function () {
+  var TOKEN = /[A-Za-z][A-Za-z0-9_]*|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+/g;
+  var CAMEL = /[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+/g;
+  var root = '';
+  var docs = null;
+  var shards = {};
+  var requested = {};
+  var current = null;
+
+  function terms(text) {
+    var out = [];
+    var tokens = text.match(TOKEN) || [];
+    for (var i = 0; i < tokens.length; i++) {
+      var token = tokens[i];
+      if (token.charCodeAt(0) > 127) {
+        // the only character that starts no bigram
+        out.push(token.charAt(token.length - 1));
+        for (var j = 0; j < token.length - 1; j++) {
+          out.push(token.substr(j, 2));
+        }
+        continue;
+      }
+      if (token.length > 1) {
+        out.push(token.toLowerCase());
+      }
+      var parts = token.match(CAMEL) || [];
+      if (parts.length > 1) {
+        for (var k = 0; k < parts.length; k++) {
+          if (parts[k].length > 1) {
+            out.push(parts[k].toLowerCase());
+          }
+        }
+      }
+    }
+    // unique, in order
+    return out.filter(function (term, index) {
+      return out.indexOf(term) === index;
+    });
+  }
+
+  function shardKey(term) {
+    var code = term.charCodeAt(0);
+    return code > 127 ? 'u' + (code >> 6).toString(16) : term.charAt(0);
+  }
+
+  function load(name) {
+    if (requested[name]) {
+      return;
+    }
+    requested[name] = true;
+    var script = document.createElement('script');
+    script.src = root + name + '.js';
+    script.onerror = function () {
+      // no term of the documents starts in this shard
+      ZhSearch.setShard(name, {});
+    };
+    document.getElementsByTagName('head')[0].appendChild(script);
+  }
+
+  function postings(term) {
+    var shard = shards[shardKey(term)];
+    var single = term.length === 1 && term.charCodeAt(0) > 127;
+    if (shard[term] && !single) {
+      return shard[term];
+    }
+    // prefix match: "pimp", or a single character: the bigrams it starts and
+    // the character itself, indexed where it ends a run
+    var merged = {};
+    for (var key in shard) {
+      if (key.indexOf(term) === 0) {
+        shard[key].forEach(function (posting) {
+          merged[posting[0]] = (merged[posting[0]] || 0) + posting[1];
+        });
+      }
+    }
+    return Object.keys(merged).map(function (doc) {
+      return [Number(doc), merged[doc]];
+    });
+  }
+
+  function ready() {
+    if (current === null || docs === null) {
+      return false;
+    }
+    for (var i = 0; i < current.length; i++) {
+      if (!shards[shardKey(current[i])]) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  function escape(text) {
+    return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;')
+      .replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+  }
+
+  function run() {
+    if (!ready()) {
+      return;
+    }
+    var scores = null;
+    current.forEach(function (term) {
+      var found = {};
+      postings(term).forEach(function (posting) {
+        found[posting[0]] = posting[1];
+      });
+      if (scores === null) {
+        scores = found;
+        return;
+      }
+      // all the terms must match
+      for (var doc in scores) {
+        if (doc in found) {
+          scores[doc] += found[doc];
+        } else {
+          delete scores[doc];
+        }
+      }
+    });
+    var results = Object.keys(scores || {}).filter(function (doc) {
+      return docs[doc];
+    }).sort(function (a, b) {
+      return scores[b] - scores[a];
+    });
+    var urlRoot = window.DOCUMENTATION_OPTIONS ? DOCUMENTATION_OPTIONS.URL_ROOT : '';
+    var html = '<h2>Search Results</h2>';
+    if (!results.length) {
+      html += '<p>Your search did not match any documents.</p>';
+    } else {
+      html += '<p>' + results.length + ' page(s) found.</p><ul class="search">';
+      results.forEach(function (doc) {
+        var entry = docs[doc];
+        html += '<li><a href="' + escape(urlRoot + entry[0]) + '">' +
+          escape(entry[1]) + '</a><p class="context">' + escape(entry[2]) +
+          '</p></li>';
+      });
+      html += '</ul>';
+    }
+    document.getElementById('search-results').innerHTML = html;
+    current = null;
+  }
+
+  return {
+    terms: terms,
+    shardKey: shardKey,
+
+    init: function (indexRoot) {
+      root = indexRoot;
+      var match = /[?&]q=([^&]*)/.exec(window.location.search);
+      var query = match ? decodeURIComponent(match[1].replace(/\+/g, ' ')) : '';
+      var input = document.querySelector('form input[name="q"]');
+      if (input) {
+        input.value = query;
+      }
+      this.query(query);
+    },
+
+    query: function (text) {
+      current = terms(text);
+      if (!current.length) {
+        current = null;
+        return;
+      }
+      load('docs');
+      current.forEach(function (term) {
+        load(shardKey(term));
+      });
+      run();
+    },
+
+    setDocs: function (entries) {
+      docs = entries;
+      run();
+    },
+
+    setShard: function (name, postings) {
+      shards[name] = postings;
+      run();
+    }
+  };
+})();
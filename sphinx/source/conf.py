@@ -45,8 +45,15 @@ extensions = ['sphinx.ext.mathjax',
               'sphinx.ext.ifconfig',
               'sphinx.ext.todo',
               'sphinx_sitemap',
-              'sphinx_inline_tabs' #tab view extension
+              'sphinx_inline_tabs', #tab view extension
+              'zhsearch', # sharded Chinese search index
+              'mathsvg', # math pre-rendered as inline SVG
+              'lazymedia' # lazy-loading, responsive images and videos
               ]
+# build-time profiling: SPHINX_BUILDPROFILE=1 make html
+# 输出 build/html/buildprofile.json 和 buildprofile.folded（火焰图）
+if os.environ.get('SPHINX_BUILDPROFILE'):
+    extensions.append('buildprofile')
 sphinx_tabs_nowarn=True
 graphviz_output_format='svg'
 source_encoding = 'utf-8-sig'
@@ -154,6 +161,9 @@ numfig_secnum_depth = 1
 imgmath_latex = 'dvilualatex'
 imgmath_image_format = 'svg'
 imgmath_dvipng_args = ['-gamma', '1.5', '-bg', 'Transparent']
+# html: equations typeset at build time (cached), no MathJax in the browser
+html_math_renderer = 'mathsvg'
+mathsvg_latex = imgmath_latex
 # Grouping the document tree into LaTeX files. List of tuples
 # (source start file, target name, title,
 #  author, documentclass [howto, manual, or own class]).
@@ -161,6 +171,36 @@ latex_documents = [
     (master_doc, html_context['latex_main']+'.tex', 'OpenFOAM算例详解 Manual',
      '成员姓名+主要贡献者姓名', 'manual'),
 ]
+# latexchapters.py: one LaTeX unit per category, compiled in parallel, and
+# a back matter unit (changelog), merged into the full book afterwards.
+# Every unit carries the bibliography as an appendix so that its citations
+# resolve, and records in its .aux the pages of its title and table of
+# contents and the page before the appendix, so that the merge takes only
+# the body of the chapters.
+# SPHINX_LATEX_CHAPTERS='[["incompressible", "不可压缩流"], ...]'
+if os.environ.get('SPHINX_LATEX_CHAPTERS'):
+    import json
+    latex_documents = []
+    for chapter, title in json.loads(os.environ['SPHINX_LATEX_CHAPTERS']):
+        latex_documents.append(
+            (chapter+'/index', html_context['latex_main']+'_'+chapter+'.tex',
+             title, '成员姓名+主要贡献者姓名', 'manual'))
+    latex_documents.append(
+        ('changelog', html_context['latex_main']+'_backmatter.tex',
+         'Change Log', '成员姓名+主要贡献者姓名', 'manual'))
+    latex_appendices = ['refs']
+    latex_elements['preamble'] += r'''
+\makeatletter
+\ifdefined\ReadonlyShipoutCounter
+\g@addto@macro\sphinxtableofcontents{\immediate\write\@auxout{%
+  \@percentchar latexchapters front \the\ReadonlyShipoutCounter}}
+\let\latexchapters@appendix\appendix
+\renewcommand\appendix{\clearpage\immediate\write\@auxout{%
+  \@percentchar latexchapters body \the\ReadonlyShipoutCounter}%
+  \latexchapters@appendix}
+\fi
+\makeatother
+'''
 
 
 # -- Options for manual page output ------------------------------------------
@@ -189,6 +229,9 @@ def setup(app):
     # app.add_javascript("js/custom.js")
     app.add_javascript(
         "https://cdn.jsdelivr.net/npm/clipboard@1/dist/clipboard.min.js")
+    app.connect('doctree-read', _bibcache_handoff)
+    app.connect('env-merge-info', _merge_bibcache)
+    app.connect('build-finished', _save_bibcache)
     
 # new defined cite style
 from pybtex.style.formatting.unsrt import Style as UnsrtStyle
@@ -258,5 +301,123 @@ class APAStyle(UnsrtStyle):
 
     default_label_style = APALabelStyle
 
+    def format_entry(self, label, entry):
+        """Format an entry, reusing the cached result of unchanged citations."""
+        formatted = _bibcache_formatted()
+        key = (entry.key, label, _bib_digest)
+        if key not in formatted:
+            formatted[key] = super().format_entry(label, entry)
+            _bibcache_dirty[0] = True
+            if os.getpid() != _bibcache_pid:
+                _bibcache_new[key] = formatted[key]
+        return formatted[key]
+
 register_plugin('pybtex.style.formatting', 'apa', APAStyle)
+
+# cache of parsed and formatted bibliography
+# 参考文献缓存：解析结果以bib文件的哈希为键，格式化结果以全部bib文件的哈希和style为键。
+# bib文件没有改动时，pybtex不再重新解析，已引用过的条目也不再重新格式化。
+import hashlib
+import pickle
+
+_bibcache_dir = os.path.abspath('.bibcache')
+
+def _file_digest(filenames):
+    sha = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+_bib_digest = _file_digest(bibtex_bibfiles)
+
+def _bibcache_path(digest, kind):
+    return os.path.join(_bibcache_dir, '{}-{}.pickle'.format(digest, kind))
+
+def _load_bibcache(digest, kind, default):
+    try:
+        with open(_bibcache_path(digest, kind), 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return default
+
+def _dump_bibcache(digest, kind, data):
+    """Atomically write a cache file, so parallel readers never see half of it."""
+    if not os.path.isdir(_bibcache_dir):
+        os.makedirs(_bibcache_dir)
+    path = _bibcache_path(digest, kind)
+    tmp = '{}.{}'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def _prune_bibcache():
+    """Remove cache files of bib contents that no longer exist."""
+    if not os.path.isdir(_bibcache_dir):
+        return
+    digests = set(_file_digest([f]) for f in bibtex_bibfiles)
+    digests.add(_bib_digest)
+    for name in os.listdir(_bibcache_dir):
+        if name.split('-', 1)[0] not in digests:
+            os.remove(os.path.join(_bibcache_dir, name))
+
+_prune_bibcache()
+
+# formatted entries of this build, loaded on first use, saved when it ends
+_bibcache = {}
+_bibcache_dirty = [False]
+# with -j N, entries formatted by a read worker (e.g. footcite) reach the
+# main process through the environment the worker sends back
+_bibcache_pid = os.getpid()
+_bibcache_new = {}
+
+def _bibcache_formatted():
+    if 'apa' not in _bibcache:
+        _bibcache['apa'] = _load_bibcache(_bib_digest, 'apa', {})
+    return _bibcache['apa']
+
+def _bibcache_handoff(app, doctree):
+    if _bibcache_new:
+        app.env.__dict__.setdefault('bibcache_new', {}).update(_bibcache_new)
+        _bibcache_new.clear()
+
+def _merge_bibcache(app, env, docnames, other):
+    new = other.__dict__.pop('bibcache_new', None)
+    if new:
+        _bibcache_formatted().update(new)
+        _bibcache_dirty[0] = True
+
+def _save_bibcache(app, exception):
+    if _bibcache_dirty[0] and exception is None:
+        _dump_bibcache(_bib_digest, 'apa', _bibcache['apa'])
+        _bibcache_dirty[0] = False
+
+try:
+    import sphinxcontrib.bibtex.bibfile as _bibfile
+except ImportError:
+    _bibfile = None
+
+# sphinxcontrib-bibtex 2.x parses all the bib files in parse_bibdata, called
+# by process_bibdata through the module global
+if _bibfile is not None and hasattr(_bibfile, 'parse_bibdata'):
+    _parse_bibdata = _bibfile.parse_bibdata
+
+    def _cached_parse_bibdata(bibfilenames, encoding):
+        if not all(os.path.isfile(f) for f in bibfilenames):
+            # let sphinxcontrib-bibtex warn about the missing file
+            return _parse_bibdata(bibfilenames, encoding)
+        digest = _file_digest(bibfilenames)
+        names = [str(f) for f in bibfilenames]
+        cached = _load_bibcache(digest, 'parsed', None)
+        if cached is None or cached[:2] != (names, encoding):
+            bibdata = _parse_bibdata(bibfilenames, encoding)
+            _dump_bibcache(digest, 'parsed', (names, encoding, bibdata))
+            return bibdata
+        bibdata = cached[2]
+        # same contents, the files may have been touched since
+        return bibdata._replace(bibfiles={
+            f: bibfile._replace(mtime=_bibfile.get_mtime(f))
+            for f, bibfile in bibdata.bibfiles.items()})
+
+    _bibfile.parse_bibdata = _cached_parse_bibdata
 # # ====================================================================
\ No newline at end of file
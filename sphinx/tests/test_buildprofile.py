@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+    test_buildprofile
+    ~~~~~~~~~~~~~~~~~
+
+    Nested timers of the build profiler::
+
+        python -m pytest sphinx/tests
+
+    :copyright: Copyright 2020-2020 by the Zhikui Guo.
+    :license: BSD, see LICENSE for details.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'source', '_extensions'))
+
+import buildprofile  # noqa: E402
+
+
+def test_nested_timers(tmp_path):
+    profiler = buildprofile.Profiler()
+    profiler.docname = 'index'
+    profiler.enter('event', 'doctree-read')
+    profiler.enter('directive', 'JinjaDirective')
+    profiler.enter('highlight', 'python')
+    profiler.leave()
+    profiler.leave()
+    profiler.enter('highlight', 'cpp')
+    profiler.leave()
+    profiler.leave()
+
+    assert not profiler.stack
+    assert sorted(profiler.folded) == [
+        ('index', 'event:doctree-read'),
+        ('index', 'event:doctree-read', 'directive:JinjaDirective'),
+        ('index', 'event:doctree-read', 'directive:JinjaDirective',
+         'highlight:python'),
+        ('index', 'event:doctree-read', 'highlight:cpp'),
+    ]
+    assert profiler.totals[('index', 'event', 'doctree-read')][0] == 1
+    # self times add up to the time of the outermost timer
+    assert abs(sum(profiler.folded.values())
+               - profiler.totals[('index', 'event', 'doctree-read')][1]) \
+        < 1e-9
+
+    path = str(tmp_path / '1.json')
+    profiler.flush(path)
+    totals, folded = buildprofile._merge(str(tmp_path))
+    assert all(isinstance(name, str) for stack in folded for name in stack)
+    assert len(totals) == 4
+    with open(path) as f:
+        assert json.loads(f.readline())['pid'] == os.getpid()